@@ -101,9 +101,33 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Espera el bloqueo en vez de fallar de inmediato
+            'timeout': 20,
+            # Toma el bloqueo de escritura al iniciar la transacción (evita "database is locked" al escalar)
+            'transaction_mode': 'IMMEDIATE',
+            # WAL: las lecturas no bloquean a quien escribe
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
+# Coalescer los guardados de asistencia en un escritor por proceso, y entre
+# procesos (workers de gunicorn) serializarlos con un bloqueo de archivo
+# (ver usuarios/cola_asistencia.py). Solo tiene sentido con SQLite.
+ASISTENCIA_COALESCER_ESCRITURAS = DATABASES['default']['ENGINE'].endswith('sqlite3')
+
+# Caché en disco de los informes PDF ya generados (ver usuarios/reportes_pdf.py).
+# Al superar el tope se borran los menos usados.
+INFORMES_CACHE_DIR = BASE_DIR / 'cache' / 'informes'
+INFORMES_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Cola de tareas en segundo plano (ver usuarios/tareas.py). Con True, los PDF
+# pesados y las eliminaciones en cascada se encolan y los ejecuta
+# `python manage.py procesar_tareas`; con False se hacen dentro de la petición.
+TAREAS_ASINCRONAS = os.environ.get("TAREAS_ASINCRONAS") == "true"
+TAREAS_DIR = BASE_DIR / 'cache' / 'tareas'
+
 # ============================
 # VALIDADORES CONTRASEÑAS
 # ============================
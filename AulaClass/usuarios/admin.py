@@ -6,8 +6,10 @@ from django.shortcuts import render, get_object_or_404
 from django.db.models import F
 from .models import (
     Usuario, Alumno, Asignatura, Curso,
-    Asistencia, Anotacion, DocenteCurso, Nota
+    Asistencia, Anotacion, DocenteCurso, Evaluacion, HistorialNota, Nota, Tarea
 )
+from .servicios_asistencia import resincronizar_alumnos, totales_asistencia
+from .servicios_notas import actualizar_promedios, entrada_historial
 
 # =========================================================
 # FILTROS PERSONALIZADOS (Mejora de Búsqueda)
@@ -27,11 +29,11 @@ class RangoNotaFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'rojas':
-            return queryset.filter(valor__lt=4.0)
+            return queryset.filter(decimas__lt=40)
         if self.value() == 'azules':
-            return queryset.filter(valor__gte=4.0)
+            return queryset.filter(decimas__gte=40)
         if self.value() == 'criticas':
-            return queryset.filter(valor__lt=3.0)
+            return queryset.filter(decimas__lt=30)
         return queryset
 
 class CursoAnoFilter(admin.SimpleListFilter):
@@ -56,6 +58,31 @@ class CursoAnoFilter(admin.SimpleListFilter):
 # =========================================================
 # FORMULARIO PERSONALIZADO
 # =========================================================
+class NotaAdminForm(forms.ModelForm):
+    """Se edita la nota en escala 1.0–7.0; en la base queda en décimas."""
+    valor = forms.DecimalField(label="Nota", min_value=1, max_value=7, decimal_places=1, max_digits=2)
+
+    class Meta:
+        model = Nota
+        # asignatura se toma de la evaluación
+        exclude = ("decimas", "asignatura")
+
+    # (alumno_id, asignatura_id, decimas) antes de editar; None al crear
+    original = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial["valor"] = self.instance.valor
+            # La instancia ya viene leída: el historial y los promedios no vuelven a consultarla
+            self.original = (self.instance.alumno_id, self.instance.asignatura_id, self.instance.decimas)
+
+    def save(self, commit=True):
+        self.instance.valor = self.cleaned_data["valor"]
+        self.instance.asignatura_id = self.instance.evaluacion.asignatura_id
+        return super().save(commit)
+
+
 class AsistenciaForm(forms.ModelForm):
     class Meta:
         model = Asistencia
@@ -110,6 +137,27 @@ class AsistenciaAdmin(admin.ModelAdmin):
         )
     ver_historial_link.short_description = "Acciones"
 
+    # ----------- Mantener tablas derivadas al editar desde el admin -----------
+    def save_model(self, request, obj, form, change):
+        alumnos = {obj.alumno_id}
+        fechas = {obj.fecha}
+        if change and "alumno" in form.changed_data:
+            alumnos.add(form.initial.get("alumno"))
+        if change and "fecha" in form.changed_data:
+            fechas.add(form.initial.get("fecha"))
+        super().save_model(request, obj, form, change)
+        resincronizar_alumnos(alumnos, fechas)
+
+    def delete_model(self, request, obj):
+        alumno_id, fecha = obj.alumno_id, obj.fecha
+        super().delete_model(request, obj)
+        resincronizar_alumnos([alumno_id], [fecha])
+
+    def delete_queryset(self, request, queryset):
+        pares = set(queryset.values_list("alumno_id", "fecha"))
+        super().delete_queryset(request, queryset)
+        resincronizar_alumnos({a for a, _ in pares}, {f for _, f in pares})
+
     # ----------- Vistas Personalizadas -----------
     def get_urls(self):
         urls = super().get_urls()
@@ -126,9 +174,11 @@ class AsistenciaAdmin(admin.ModelAdmin):
         alumno = get_object_or_404(Alumno, pk=alumno_id)
         asistencias = Asistencia.objects.filter(alumno=alumno).select_related('curso').order_by("-fecha")
         
-        presentes = asistencias.filter(estado="Presente").count()
-        total = asistencias.count()
-        porcentaje = round(presentes / total * 100, 1) if total else 0
+        # Contadores desnormalizados: no se recuentan los registros diarios
+        totales = totales_asistencia(alumno)
+        presentes = totales["presentes"]
+        total = totales["total"]
+        porcentaje = totales["porcentaje"]
 
         context = dict(
             self.admin_site.each_context(request),
@@ -199,8 +249,16 @@ class AlumnoAdmin(admin.ModelAdmin):
 # =========================================================
 # ASIGNATURAS
 # =========================================================
+class EvaluacionInline(admin.TabularInline):
+    model = Evaluacion
+    fields = ("numero", "nombre", "fecha", "ponderacion")
+    ordering = ("numero",)
+    extra = 0
+
+
 @admin.register(Asignatura)
 class AsignaturaAdmin(admin.ModelAdmin):
+    inlines = [EvaluacionInline]
     list_select_related = ('curso', 'profesor')
     list_display = ("nombre", "curso_info", "profesor")
     search_fields = ("nombre", "curso__nombre", "profesor__username")
@@ -211,19 +269,56 @@ class AsignaturaAdmin(admin.ModelAdmin):
     def curso_info(self, obj):
         return f"{obj.curso.nombre} ({obj.curso.año})"
 
+    def save_related(self, request, form, formsets, change):
+        # Ponderaciones o evaluaciones editadas en el inline cambian los promedios
+        super().save_related(request, form, formsets, change)
+        if any(f.has_changed() for f in formsets):
+            actualizar_promedios([form.instance.id])
+
+# =========================================================
+# EVALUACIONES
+# =========================================================
+@admin.register(Evaluacion)
+class EvaluacionAdmin(admin.ModelAdmin):
+    list_select_related = ('asignatura', 'asignatura__curso')
+    list_display = ("asignatura", "numero", "nombre", "fecha", "ponderacion")
+    list_filter = (CursoAnoFilter, "asignatura__nombre")
+    search_fields = ("nombre", "asignatura__nombre", "asignatura__curso__nombre")
+    autocomplete_fields = ("asignatura",)
+    ordering = ("asignatura__curso__nombre", "asignatura__nombre", "numero")
+
+    # ----------- Promedios materializados -----------
+    def save_model(self, request, obj, form, change):
+        asignaturas = {obj.asignatura_id}
+        if change and "asignatura" in form.changed_data:
+            asignaturas.add(form.initial.get("asignatura"))
+        super().save_model(request, obj, form, change)
+        actualizar_promedios(asignaturas)
+
+    def delete_model(self, request, obj):
+        asignatura_id = obj.asignatura_id
+        super().delete_model(request, obj)
+        actualizar_promedios([asignatura_id])
+
+    def delete_queryset(self, request, queryset):
+        asignaturas = set(queryset.values_list("asignatura_id", flat=True))
+        super().delete_queryset(request, queryset)
+        actualizar_promedios(asignaturas)
+
 # =========================================================
 # NOTAS (OPTIMIZADO Y CORREGIDO)
 # =========================================================
 @admin.register(Nota)
 class NotaAdmin(admin.ModelAdmin):
+    form = NotaAdminForm
     # Optimización crucial para no matar la base de datos cargando notas
-    list_select_related = ('alumno', 'asignatura', 'asignatura__curso', 'profesor')
+    list_select_related = ('alumno', 'asignatura', 'asignatura__curso', 'evaluacion', 'profesor')
     
     list_display = (
         'alumno_full_name', 
         'asignatura_nombre', 
         'curso_info', 
-        'numero', 
+        'evaluacion_info', 
         'valor_badge', 
         'profesor'
     )
@@ -240,7 +335,7 @@ class NotaAdmin(admin.ModelAdmin):
         'asignatura__nombre', 'asignatura__curso__nombre'
     )
     
-    autocomplete_fields = ("alumno", "asignatura", "profesor")
+    autocomplete_fields = ("alumno", "evaluacion", "profesor")
     ordering = ("-asignatura__curso__año", "asignatura__curso__nombre", "alumno__apellidos")
     list_per_page = 25
 
@@ -256,10 +351,47 @@ class NotaAdmin(admin.ModelAdmin):
     def curso_info(self, obj):
         return f"{obj.asignatura.curso.año} | {obj.asignatura.curso.nombre}"
 
+    # ----------- Promedios materializados -----------
+    def save_model(self, request, obj, form, change):
+        pares = {(obj.alumno_id, obj.asignatura_id)}
+        anterior = None
+        if change and form.original:
+            alumno_id, asignatura_id, anterior = form.original
+            pares.add((alumno_id, asignatura_id))
+        super().save_model(request, obj, form, change)
+        if anterior != obj.decimas:
+            entrada_historial(obj, anterior, obj.decimas, request.user, HistorialNota.ORIGEN_ADMIN).save()
+        for alumno_id, asignatura_id in pares:
+            actualizar_promedios([asignatura_id], [alumno_id])
+
+    # ----------- Historial de las notas eliminadas -----------
+    # Se registra antes de borrar: al eliminar la nota, el historial queda con nota = NULL
+    def _historial_eliminadas(self, request, notas):
+        HistorialNota.objects.bulk_create([
+            entrada_historial(n, n.decimas, None, request.user, HistorialNota.ORIGEN_ADMIN) for n in notas
+        ])
+
+    def delete_model(self, request, obj):
+        alumno_id, asignatura_id = obj.alumno_id, obj.asignatura_id
+        self._historial_eliminadas(request, [obj])
+        super().delete_model(request, obj)
+        actualizar_promedios([asignatura_id], [alumno_id])
+
+    def delete_queryset(self, request, queryset):
+        notas = list(queryset.only("alumno_id", "asignatura_id", "evaluacion_id", "decimas"))
+        self._historial_eliminadas(request, notas)
+        super().delete_queryset(request, queryset)
+        for alumno_id, asignatura_id in {(n.alumno_id, n.asignatura_id) for n in notas}:
+            actualizar_promedios([asignatura_id], [alumno_id])
+
+    @admin.display(description='Evaluación', ordering='evaluacion__numero')
+    def evaluacion_info(self, obj):
+        return f"N{obj.evaluacion.numero} {obj.evaluacion.nombre} (pond. {obj.evaluacion.ponderacion})"
+
     def valor_badge(self, obj):
         # Estilo Badge igual que Asistencia
-        bg = "#dcfce7" if obj.valor >= 4 else "#fee2e2"
-        text = "#166534" if obj.valor >= 4 else "#991b1b"
+        bg = "#dcfce7" if obj.decimas >= 40 else "#fee2e2"
+        text = "#166534" if obj.decimas >= 40 else "#991b1b"
         
         # FORZAR PUNTO EN VEZ DE COMA
         valor_final = f"{obj.valor:.1f}".replace(",", ".")
@@ -270,7 +402,46 @@ class NotaAdmin(admin.ModelAdmin):
             f"{valor_final}</span>"
         )
     valor_badge.short_description = "Nota"
-    valor_badge.admin_order_field = 'valor'
+    valor_badge.admin_order_field = 'decimas'
+
+# =========================================================
+# HISTORIAL DE NOTAS (solo lectura)
+# =========================================================
+@admin.register(HistorialNota)
+class HistorialNotaAdmin(admin.ModelAdmin):
+    list_select_related = ('alumno', 'asignatura', 'asignatura__curso', 'evaluacion', 'usuario')
+    list_display = ("fecha", "alumno_full_name", "asignatura_info", "evaluacion_info", "cambio", "usuario", "origen")
+    list_filter = ("origen", "asignatura__nombre", "fecha")
+    search_fields = ("alumno__nombres", "alumno__apellidos", "alumno__rut", "asignatura__nombre")
+    date_hierarchy = "fecha"
+    list_per_page = 50
+
+    @admin.display(description='Alumno', ordering='alumno__apellidos')
+    def alumno_full_name(self, obj):
+        return f"{obj.alumno.apellidos}, {obj.alumno.nombres}"
+
+    @admin.display(description='Asignatura', ordering='asignatura__nombre')
+    def asignatura_info(self, obj):
+        return f"{obj.asignatura.nombre} ({obj.asignatura.curso.nombre})"
+
+    @admin.display(description='Evaluación', ordering='evaluacion__numero')
+    def evaluacion_info(self, obj):
+        return f"N{obj.evaluacion.numero} {obj.evaluacion.nombre}"
+
+    @admin.display(description='Cambio')
+    def cambio(self, obj):
+        anterior = "-" if obj.valor_anterior is None else f"{obj.valor_anterior:.1f}"
+        nuevo = "-" if obj.valor_nuevo is None else f"{obj.valor_nuevo:.1f}"
+        return f"{anterior} → {nuevo}"
+
+    # Solo inserción: nadie lo crea ni lo edita a mano. El borrado queda
+    # permitido porque el admin lo exige para borrar en cascada alumnos,
+    # evaluaciones, asignaturas y cursos con historial.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 # =========================================================
 # ANOTACIONES
@@ -301,4 +472,22 @@ class DocenteCursoAdmin(admin.ModelAdmin):
 
     def curso_full(self, obj):
         return f"{obj.curso.nombre} ({obj.curso.año})"
-    curso_full.short_description = "Curso Asignado"
\ No newline at end of file
+    curso_full.short_description = "Curso Asignado"
+
+# =========================================================
+# TAREAS EN SEGUNDO PLANO
+# =========================================================
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_select_related = ('usuario',)
+    list_display = ("id", "tipo", "estado", "progreso", "intentos", "usuario", "trabajador", "creada", "terminada")
+    list_filter = ("estado", "tipo")
+    search_fields = ("usuario__username", "trabajador", "error")
+    date_hierarchy = "creada"
+
+    # Las crea y actualiza la cola (usuarios/tareas.py); aquí solo se consultan o se borran
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
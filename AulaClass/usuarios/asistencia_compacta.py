@@ -0,0 +1,183 @@
+# =========================================================
+# Asistencia compacta (2 bits por día, una fila por mes)
+# =========================================================
+"""
+Cada AsistenciaMensual guarda el mes de un alumno en 8 bytes:
+el día d ocupa los bits 2*(d-1) y 2*(d-1)+1 de un entero little-endian.
+
+Códigos: 0 = sin registro, 1 = Presente, 2 = Ausente, 3 = Justificado.
+"""
+from datetime import date
+
+from django.db import transaction
+
+from .models import Asistencia, AsistenciaMensual
+
+BYTES_POR_MES = 8
+CODIGOS = {"Presente": 1, "Ausente": 2, "Justificado": 3}
+ESTADOS_POR_CODIGO = {codigo: estado for estado, codigo in CODIGOS.items()}
+
+# Bit bajo de cada día (0b0101...01 sobre 31 días)
+_MASCARA_BAJA = sum(1 << (2 * i) for i in range(31))
+
+
+# =========================================================
+# Codificación / decodificación
+# =========================================================
+def empaquetar_mes(estados_por_dia):
+    """{dia: estado} -> bytes empaquetados."""
+    valor = 0
+    for dia, estado in estados_por_dia.items():
+        valor |= CODIGOS[estado] << (2 * (dia - 1))
+    return valor.to_bytes(BYTES_POR_MES, "little")
+
+
+def desempaquetar_mes(datos):
+    """bytes empaquetados -> {dia: estado} (solo días con registro)."""
+    valor = int.from_bytes(bytes(datos), "little")
+    estados = {}
+    for dia in range(1, 32):
+        codigo = (valor >> (2 * (dia - 1))) & 0b11
+        if codigo:
+            estados[dia] = ESTADOS_POR_CODIGO[codigo]
+    return estados
+
+
+def fijar_dia(datos, dia, estado):
+    """Devuelve una copia de los bytes con el estado de un día reemplazado."""
+    valor = int.from_bytes(bytes(datos or b""), "little")
+    desplazamiento = 2 * (dia - 1)
+    valor &= ~(0b11 << desplazamiento)
+    valor |= CODIGOS[estado] << desplazamiento
+    return valor.to_bytes(BYTES_POR_MES, "little")
+
+
+def contar_estados(datos):
+    """
+    Cuenta presentes, ausentes y justificados sin recorrer día a día:
+    se separan los bits alto y bajo de cada par y se cuentan con bit_count().
+    """
+    valor = int.from_bytes(bytes(datos), "little")
+    bajo = valor & _MASCARA_BAJA
+    alto = (valor >> 1) & _MASCARA_BAJA
+    return {
+        "presentes": (bajo & ~alto).bit_count(),
+        "ausentes": (alto & ~bajo).bit_count(),
+        "justificados": (alto & bajo).bit_count(),
+    }
+
+
+# =========================================================
+# Mantención de la tabla compacta
+# =========================================================
+def sincronizar_compacta(registros):
+    """
+    Aplica cambios de asistencia sobre la tabla compacta.
+    registros: iterable de tuplas (alumno_id, curso_id, fecha, estado).
+    1 query de lectura + 1 upsert masivo; debe llamarse dentro de la misma transacción.
+    """
+    por_mes = {}
+    for alumno_id, curso_id, fecha, estado in registros:
+        por_mes.setdefault((alumno_id, curso_id, fecha.year, fecha.month), []).append((fecha.day, estado))
+    if not por_mes:
+        return
+
+    actuales = {
+        (a, c, y, m): datos
+        for a, c, y, m, datos in AsistenciaMensual.objects.filter(
+            alumno_id__in={k[0] for k in por_mes},
+            curso_id__in={k[1] for k in por_mes},
+            anio__in={k[2] for k in por_mes},
+            mes__in={k[3] for k in por_mes},
+        ).values_list("alumno_id", "curso_id", "anio", "mes", "estados")
+    }
+
+    filas = []
+    for (alumno_id, curso_id, anio, mes), cambios in por_mes.items():
+        datos = actuales.get((alumno_id, curso_id, anio, mes), bytes(BYTES_POR_MES))
+        for dia, estado in cambios:
+            datos = fijar_dia(datos, dia, estado)
+        filas.append(AsistenciaMensual(
+            alumno_id=alumno_id, curso_id=curso_id, anio=anio, mes=mes, estados=datos
+        ))
+
+    AsistenciaMensual.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=["alumno", "curso", "anio", "mes"],
+        update_fields=["estados"],
+    )
+
+
+def reconstruir_compacta(alumno_ids=None, tamano_lote=2000):
+    """
+    Reconstruye la tabla compacta desde Asistencia (todo o solo algunos alumnos).
+    Recorre los registros con iterator() para no cargarlos todos en memoria.
+    Devuelve la cantidad de filas mensuales resultantes.
+    """
+    asistencias = Asistencia.objects.filter(estado__in=CODIGOS.keys())
+    compactas = AsistenciaMensual.objects.all()
+    if alumno_ids is not None:
+        asistencias = asistencias.filter(alumno_id__in=alumno_ids)
+        compactas = compactas.filter(alumno_id__in=alumno_ids)
+
+    with transaction.atomic():
+        compactas.delete()
+
+        # Un mismo mes puede quedar repartido en dos lotes: sincronizar_compacta lo fusiona
+        lote = []
+        for registro in asistencias.values_list(
+            "alumno_id", "curso_id", "fecha", "estado"
+        ).iterator(chunk_size=tamano_lote):
+            lote.append(registro)
+            if len(lote) >= tamano_lote:
+                sincronizar_compacta(lote)
+                lote = []
+        sincronizar_compacta(lote)
+
+    return compactas.count()
+
+
+# =========================================================
+# Lectura: porcentajes mensuales y anuales
+# =========================================================
+def resumen_asistencia_compacta(alumno_id, curso_id=None, anio=None):
+    """
+    Totales de asistencia de un alumno desde los bytes empaquetados (1 fila por mes).
+    Devuelve {"meses": [...], "presentes", "ausentes", "justificados", "total", "porcentaje"}.
+    """
+    qs = AsistenciaMensual.objects.filter(alumno_id=alumno_id)
+    if curso_id is not None:
+        qs = qs.filter(curso_id=curso_id)
+    if anio is not None:
+        qs = qs.filter(anio=anio)
+
+    por_mes = {}
+    for anio_mes, mes, datos in qs.values_list("anio", "mes", "estados"):
+        conteo = contar_estados(datos)
+        acumulado = por_mes.setdefault((anio_mes, mes), {"presentes": 0, "ausentes": 0, "justificados": 0})
+        for clave, valor in conteo.items():
+            acumulado[clave] += valor
+
+    meses = []
+    totales = {"presentes": 0, "ausentes": 0, "justificados": 0}
+    for (anio_mes, mes), conteo in sorted(por_mes.items()):
+        total = sum(conteo.values())
+        meses.append({
+            "anio": anio_mes,
+            "mes": mes,
+            "inicio": date(anio_mes, mes, 1),
+            **conteo,
+            "total": total,
+            "porcentaje": round(conteo["presentes"] / total * 100, 1) if total else 0.0,
+        })
+        for clave, valor in conteo.items():
+            totales[clave] += valor
+
+    total = sum(totales.values())
+    return {
+        "meses": meses,
+        **totales,
+        "total": total,
+        "porcentaje": round(totales["presentes"] / total * 100, 1) if total else 0.0,
+    }
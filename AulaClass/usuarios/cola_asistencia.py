@@ -0,0 +1,176 @@
+# =========================================================
+# Cola de escritura de asistencia (coalescencia para SQLite)
+# =========================================================
+"""
+En SQLite todas las escrituras compiten por un único bloqueo de la base.
+A las 8:15 decenas de cursos guardan asistencia a la vez y algunas
+peticiones terminan en "database is locked".
+
+Esta cola junta los envíos de un proceso y los escribe desde un solo hilo:
+cada lote es UNA transacción (un bloqueo y un commit) con un savepoint por
+envío, así un envío con error no arrastra a los demás. Pasan por ella tanto
+los formularios de asistencia como los lotes de la sincronización offline
+(con su token de idempotencia, que se inserta en el mismo savepoint). La petición recibe
+su resultado recién después del COMMIT, por lo que lo confirmado al usuario
+ya quedó guardado en disco.
+
+Con varios workers de gunicorn hay un escritor por proceso; para que no
+compitan entre ellos por el bloqueo de SQLite, cada lote se escribe
+tomando antes un bloqueo de archivo (flock) compartido por todos los
+procesos que usan la misma base. Así los lotes de todo el servidor pasan
+de a uno. En Windows (sin fcntl) solo se serializa dentro del proceso.
+"""
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .servicios_asistencia import guardar_asistencia_curso, sincronizar_lote_asistencia
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def ruta_bloqueo_escritura():
+    """
+    Archivo de bloqueo de los escritores de asistencia. Por defecto, uno por
+    base de datos en el directorio temporal (fuera del repositorio);
+    ASISTENCIA_BLOQUEO_ESCRITURA permite fijarlo.
+    """
+    ruta = getattr(settings, "ASISTENCIA_BLOQUEO_ESCRITURA", None)
+    if ruta:
+        return str(ruta)
+    base = os.path.abspath(str(connection.settings_dict["NAME"]))
+    huella = hashlib.sha1(base.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"aulaclass-asistencia-{huella}.lock")
+
+
+@contextmanager
+def bloqueo_entre_procesos(ruta):
+    """Exclusión mutua entre procesos mientras dura el bloque (flock exclusivo)."""
+    if fcntl is None:
+        yield
+        return
+    with open(ruta, "a") as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+class _Envio:
+    __slots__ = ("funcion", "argumentos", "listo", "resultado", "error")
+
+    def __init__(self, funcion, *argumentos):
+        self.funcion = funcion
+        self.argumentos = argumentos
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class ColaEscrituraAsistencia:
+    def __init__(self, max_lote=50, espera_lote=0.02):
+        self.max_lote = max_lote
+        self.espera_lote = espera_lote
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------
+    # Lado de la petición
+    # -----------------------------------------------------
+    def guardar(self, curso, fecha, estados, timeout=30):
+        """Encola un guardado y espera a que su lote quede confirmado."""
+        return self._esperar(_Envio(guardar_asistencia_curso, curso, fecha, estados), timeout)
+
+    def sincronizar(self, usuario, token, registros, timeout=30):
+        """Encola un lote de la sincronización offline; devuelve (respuesta, repetido)."""
+        return self._esperar(_Envio(sincronizar_lote_asistencia, usuario, token, registros), timeout)
+
+    def _esperar(self, envio, timeout):
+        self._asegurar_hilo()
+        self._cola.put(envio)
+        if not envio.listo.wait(timeout):
+            raise TimeoutError("La cola de asistencia no respondió a tiempo.")
+        if envio.error is not None:
+            raise envio.error
+        return envio.resultado
+
+    def _asegurar_hilo(self):
+        # Se inicia de forma perezosa: cada worker (post-fork) tiene su propio escritor
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._bucle, name="escritor-asistencia", daemon=True
+                )
+                self._hilo.start()
+
+    # -----------------------------------------------------
+    # Lado del escritor
+    # -----------------------------------------------------
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            # Espera unos milisegundos a que lleguen más envíos del mismo "pico"
+            limite = time.monotonic() + self.espera_lote
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._procesar(lote)
+
+    def _procesar(self, lote):
+        close_old_connections()
+        try:
+            # El bloqueo de archivo se toma antes del BEGIN y se suelta después del COMMIT
+            with bloqueo_entre_procesos(ruta_bloqueo_escritura()), transaction.atomic():
+                for envio in lote:
+                    try:
+                        # Cada servicio abre su propio atomic() -> savepoint por envío
+                        envio.resultado = envio.funcion(*envio.argumentos)
+                    except Exception as e:
+                        envio.error = e
+        except Exception as e:
+            # Falló el COMMIT: ningún envío del lote quedó guardado
+            for envio in lote:
+                envio.resultado = None
+                envio.error = e
+        finally:
+            for envio in lote:
+                envio.listo.set()
+
+
+cola_asistencia = ColaEscrituraAsistencia()
+
+
+def guardar_asistencia(curso, fecha, estados):
+    """
+    Punto de entrada de las vistas: usa la cola si ASISTENCIA_COALESCER_ESCRITURAS
+    está activo (por defecto, solo con SQLite) y si no escribe directamente.
+    """
+    if getattr(settings, "ASISTENCIA_COALESCER_ESCRITURAS", False):
+        return cola_asistencia.guardar(curso, fecha, estados)
+    return guardar_asistencia_curso(curso, fecha, estados)
+
+
+def sincronizar_asistencia(usuario, token, registros):
+    """Igual que guardar_asistencia, para los lotes de la sincronización offline."""
+    if getattr(settings, "ASISTENCIA_COALESCER_ESCRITURAS", False):
+        return cola_asistencia.sincronizar(usuario, token, registros)
+    return sincronizar_lote_asistencia(usuario, token, registros)
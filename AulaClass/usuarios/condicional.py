@@ -0,0 +1,122 @@
+# =========================================================
+# GET condicional (ETag / Last-Modified)
+# =========================================================
+"""
+Huellas baratas de las páginas que los docentes abren muchas veces al día
+sin que nada cambie (libro de notas, ficha del alumno). Con
+django.views.decorators.http.condition, si el navegador ya tiene la
+versión vigente se responde 304 sin ejecutar la vista ni renderizar.
+
+La huella incluye, además de los datos, al usuario (la página depende de
+sus permisos) y la cookie CSRF (la página trae el token en sus
+formularios).
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Alumno, Anotacion, Asignatura, Evaluacion, Nota, PromedioAlumnoAsignatura, ResumenAsistencia
+
+
+def huella_condicional(calcular):
+    """
+    A partir de calcular(request, *args, **kwargs) -> (partes, ultima_modificacion) | None
+    arma el par (etag_func, last_modified_func) para condition().
+    Se calcula una sola vez por petición y solo en GET/HEAD.
+    """
+    atributo = f"_huella_{calcular.__name__}"
+
+    def huella(request, *args, **kwargs):
+        if not hasattr(request, atributo):
+            valor = None
+            if request.method in ("GET", "HEAD"):
+                calculado = calcular(request, *args, **kwargs)
+                if calculado is not None:
+                    partes, ultima = calculado
+                    firma = repr((
+                        partes,
+                        request.user.pk,
+                        getattr(request.user, "role", None),
+                        request.user.is_superuser,
+                        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+                    ))
+                    valor = (hashlib.sha1(firma.encode()).hexdigest(), ultima)
+            setattr(request, atributo, valor)
+        return getattr(request, atributo)
+
+    def etag(request, *args, **kwargs):
+        valor = huella(request, *args, **kwargs)
+        return valor[0] if valor else None
+
+    def ultima_modificacion(request, *args, **kwargs):
+        valor = huella(request, *args, **kwargs)
+        return valor[1] if valor else None
+
+    return etag, ultima_modificacion
+
+
+# =========================================================
+# Huellas por página
+# =========================================================
+def version_libro_notas(request, curso_id, asignatura_id):
+    """
+    Libro de notas: encabezado de la asignatura, evaluaciones, lista de
+    alumnos y la última modificación/cantidad de notas (4 queries chicas).
+    Los promedios se derivan de notas y ponderaciones, así que no hace falta leerlos.
+    """
+    asignatura = (
+        Asignatura.objects.filter(id=asignatura_id, curso_id=curso_id)
+        .values_list("nombre", "profesor_id", "curso__nombre", "curso__año", "curso__profesor_jefe_id")
+        .first()
+    )
+    if asignatura is None:
+        return None
+    notas = Nota.objects.filter(asignatura_id=asignatura_id).aggregate(
+        ultima=Max("ultima_actualizacion"), cantidad=Count("id")
+    )
+    evaluaciones = list(
+        Evaluacion.objects.filter(asignatura_id=asignatura_id)
+        .order_by("numero")
+        .values_list("id", "numero", "nombre", "fecha", "ponderacion")
+    )
+    alumnos = list(
+        Alumno.objects.filter(curso_id=curso_id)
+        .order_by("apellidos", "nombres")
+        .values_list("id", "apellidos", "nombres")
+    )
+    return (asignatura, notas["cantidad"], notas["ultima"], evaluaciones, alumnos), notas["ultima"]
+
+
+def version_anotaciones_alumno(request, alumno_id):
+    """
+    Ficha del alumno: sus datos, sus promedios materializados con el nombre
+    de cada asignatura, la última actualización de su resumen de asistencia
+    (que se actualiza junto a la asistencia mensual) y sus anotaciones
+    completas (id, fecha, profesor y texto), así editar el texto de una
+    anotación o renombrar una asignatura cambia la huella.
+    """
+    alumno = (
+        Alumno.objects.filter(id=alumno_id)
+        .values_list("rut", "nombres", "apellidos", "fecha_nacimiento", "contacto_emergencia",
+                     "curso_id", "curso__nombre", "curso__año")
+        .first()
+    )
+    if alumno is None:
+        return None
+    promedios = list(
+        PromedioAlumnoAsignatura.objects.filter(alumno_id=alumno_id)
+        .order_by("asignatura_id")
+        .values_list("asignatura_id", "asignatura__nombre", "decimas", "cantidad", "actualizado")
+    )
+    asistencia = ResumenAsistencia.objects.filter(alumno_id=alumno_id).aggregate(
+        ultima=Max("actualizado"), cantidad=Count("id")
+    )
+    anotaciones = list(
+        Anotacion.objects.filter(alumno_id=alumno_id)
+        .order_by("id")
+        .values_list("id", "fecha", "profesor__first_name", "profesor__last_name", "texto")
+    )
+    fechas = [f for f in (max((p[-1] for p in promedios), default=None), asistencia["ultima"]) if f is not None]
+    partes = (alumno, tuple(promedios), tuple(asistencia.values()), tuple(anotaciones))
+    return partes, max(fechas, default=None)
@@ -0,0 +1,275 @@
+# =========================================================
+# Exportación de asistencia (CSV / XLSX en streaming)
+# =========================================================
+"""
+Las exportaciones se generan fila a fila mientras se envían:
+se procesa un curso a la vez (una query con iterator() por curso), así que
+la memoria depende del tamaño de un curso y no del colegio completo.
+
+El XLSX se arma a mano (SpreadsheetML mínimo con cadenas en línea) sobre un
+zipfile que escribe a un flujo no posicionable, sin archivo temporal.
+"""
+import csv
+import zipfile
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+from .models import Alumno, Asistencia, Curso
+from .servicios_asistencia import CODIGOS_ESTADO
+
+# Se envía al cliente cada vez que se juntan ~64 KB
+TAMANO_TROZO = 64 * 1024
+
+CONTENT_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# =========================================================
+# Filas (independientes del formato)
+# =========================================================
+def columnas_dias(desde, hasta, curso=None):
+    """Días hábiles del rango más cualquier día con registros (1 query)."""
+    registros = Asistencia.objects.filter(fecha__range=(desde, hasta))
+    if curso is not None:
+        registros = registros.filter(curso=curso)
+    con_registro = set(registros.dates("fecha", "day"))
+
+    dias = []
+    dia = desde
+    while dia <= hasta:
+        if dia.weekday() < 5 or dia in con_registro:
+            dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+
+def filas_asistencia(desde, hasta, curso=None):
+    """
+    Genera el encabezado y luego una fila por alumno y curso:
+    curso, RUT, apellidos, nombres, un código por día (P/A/J) y totales.
+    Sin curso exporta todo el colegio, un curso a la vez.
+    """
+    dias = columnas_dias(desde, hasta, curso)
+    indice_dia = {d: i for i, d in enumerate(dias)}
+
+    yield [
+        "Curso", "RUT", "Apellidos", "Nombres",
+        *(d.strftime("%d/%m/%Y") for d in dias),
+        "Presentes", "Ausentes", "Justificados", "% Asistencia",
+    ]
+
+    cursos = [curso] if curso is not None else Curso.objects.order_by("año", "nombre").iterator()
+    for c in cursos:
+        nombre_curso = f"{c.año} {c.nombre}"
+
+        celdas = {}
+        for alumno_id, fecha, estado in (
+            Asistencia.objects
+            .filter(curso=c, fecha__range=(desde, hasta))
+            .values_list("alumno_id", "fecha", "estado")
+            .iterator(chunk_size=2000)
+        ):
+            celdas.setdefault(alumno_id, [""] * len(dias))[indice_dia[fecha]] = CODIGOS_ESTADO.get(estado, "")
+
+        # Alumnos actuales del curso y los que tienen registros en él (p. ej. trasladados)
+        alumnos = (
+            Alumno.objects
+            .filter(Q(curso=c) | Q(id__in=list(celdas)))
+            .only("rut", "apellidos", "nombres")
+            .order_by("apellidos", "nombres")
+        )
+        for alumno in alumnos:
+            fila = celdas.get(alumno.id) or [""] * len(dias)
+            presentes, ausentes, justificados = fila.count("P"), fila.count("A"), fila.count("J")
+            registrados = presentes + ausentes + justificados
+            yield [
+                nombre_curso, alumno.rut, alumno.apellidos, alumno.nombres,
+                *fila,
+                presentes, ausentes, justificados,
+                round(presentes / registrados * 100, 1) if registrados else "",
+            ]
+
+
+# =========================================================
+# CSV
+# =========================================================
+class _Eco:
+    """Pseudo-archivo: csv.writer devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def flujo_csv(filas):
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel reconozca UTF-8 (tildes y ñ)
+    trozo, tamano = ["\ufeff"], 0
+    for fila in filas:
+        linea = escritor.writerow(fila)
+        trozo.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_TROZO:
+            yield "".join(trozo)
+            trozo, tamano = [], 0
+    yield "".join(trozo)
+
+
+# =========================================================
+# XLSX
+# =========================================================
+class _Buffer:
+    """Destino del zip: acumula bytes hasta que el generador los envía."""
+    def __init__(self):
+        self._partes = []
+        self.tamano = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self.tamano += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes, self.tamano = [], 0
+        return datos
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Asistencia" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+_HOJA_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    # Encabezado fijo al desplazarse
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+_HOJA_FIN = '</sheetData></worksheet>'
+
+
+def _letra_columna(n):
+    """0 -> A, 25 -> Z, 26 -> AA ..."""
+    letras = ""
+    n += 1
+    while n:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _fila_xml(numero, valores, letras):
+    celdas = []
+    for letra, valor in zip(letras, valores):
+        ref = f"{letra}{numero}"
+        if valor == "" or valor is None:
+            continue
+        if isinstance(valor, (int, float)):
+            celdas.append(f'<c r="{ref}"><v>{valor}</v></c>')
+        else:
+            celdas.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>')
+    return f'<row r="{numero}">{"".join(celdas)}</row>'
+
+
+def flujo_xlsx(filas):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        libro.writestr("_rels/.rels", _RELS)
+        libro.writestr("xl/workbook.xml", _WORKBOOK)
+        libro.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+
+        with libro.open("xl/worksheets/sheet1.xml", "w") as hoja:
+            hoja.write(_HOJA_INICIO.encode())
+            letras = []
+            for numero, valores in enumerate(filas, start=1):
+                if len(letras) < len(valores):
+                    letras = [_letra_columna(i) for i in range(len(valores))]
+                hoja.write(_fila_xml(numero, valores, letras).encode())
+                if buffer.tamano >= TAMANO_TROZO:
+                    yield buffer.vaciar()
+            hoja.write(_HOJA_FIN.encode())
+    yield buffer.vaciar()
+
+
+# =========================================================
+# ZIP de archivos ya generados
+# =========================================================
+def flujo_zip(archivos):
+    """
+    ZIP armado en flujo a partir de pares (nombre, bytes): cada archivo se
+    envía apenas llega, sin esperar a los siguientes. Sin compresión: los
+    PDF ya vienen comprimidos.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as paquete:
+        for nombre, datos in archivos:
+            paquete.writestr(nombre, datos)
+            yield buffer.vaciar()
+    yield buffer.vaciar()
+
+
+# =========================================================
+# Respuesta HTTP
+# =========================================================
+async def _iterar_async(generador):
+    # Cada trozo se produce en el hilo de Django (misma conexión a la base)
+    siguiente = sync_to_async(next, thread_sensitive=True)
+    fin = object()
+    while (trozo := await siguiente(generador, fin)) is not fin:
+        yield trozo
+
+
+def respuesta_en_flujo(request, trozos, content_type, nombre_archivo):
+    """
+    StreamingHttpResponse que sirve los trozos a medida que se generan.
+    Bajo ASGI se entrega un iterador asíncrono: Django consumiría entero uno síncrono.
+    """
+    if isinstance(request, ASGIRequest):
+        trozos = _iterar_async(trozos)
+    respuesta = StreamingHttpResponse(trozos, content_type=content_type)
+    respuesta["Content-Disposition"] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
@@ -9,7 +9,8 @@ from django.db.models import Q
 from django.db.models.functions import Lower
 
 # Modelos
-from .models import Curso, Asignatura, Usuario, Alumno, DocenteCurso
+from .models import Curso, Asignatura, Usuario, Alumno, DocenteCurso, Evaluacion
+from .importacion_notas import EXTENSIONES_IMPORTACION, MAX_TAMANO_IMPORTACION
 
 Usuario = get_user_model()
 
@@ -276,6 +277,41 @@ class AlumnoForm(forms.ModelForm):
             'curso': forms.Select(attrs={'class': 'form-select input-aula'}),
         }
 
+# =========================================================
+# 6) Evaluación (columna del libro de notas)
+# =========================================================
+
+class EvaluacionForm(forms.ModelForm):
+    class Meta:
+        model = Evaluacion
+        fields = ['nombre', 'fecha', 'ponderacion']
+        labels = {
+            'nombre': 'Evaluación',
+            'fecha': 'Fecha',
+            'ponderacion': 'Ponderación',
+        }
+        widgets = {
+            'nombre': forms.TextInput(attrs={'class': 'form-control input-aula', 'maxlength': '100', 'placeholder': 'Ej: Prueba 1'}),
+            'fecha': forms.DateInput(attrs={'type': 'date', 'class': 'form-control input-aula'}),
+            'ponderacion': forms.NumberInput(attrs={'class': 'form-control input-aula', 'min': '1', 'max': '100'}),
+        }
+
+class ImportarNotasForm(forms.Form):
+    archivo = forms.FileField(
+        label="Planilla (CSV o XLSX)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control input-aula', 'accept': '.csv,.xlsx'})
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith(EXTENSIONES_IMPORTACION):
+            raise forms.ValidationError("El archivo debe ser .csv o .xlsx.")
+        if archivo.size > MAX_TAMANO_IMPORTACION:
+            raise forms.ValidationError(
+                f"El archivo supera el máximo de {MAX_TAMANO_IMPORTACION // (1024 * 1024)} MB."
+            )
+        return archivo
+
 class AsignarAsignaturasForm(forms.Form):
     # Inicialmente queryset vacío, lo llenamos en el __init__
     asignaturas = forms.ModelMultipleChoiceField(
@@ -0,0 +1,211 @@
+# =========================================================
+# Importación de notas (CSV / XLSX)
+# =========================================================
+"""
+Planilla esperada: una fila de encabezado con una columna "RUT" y una
+columna por evaluación, cuyo encabezado es su número ("1", "N1", "Nota 1",
+"Evaluación 1"). Las demás columnas (apellidos, nombres, promedio...) se
+ignoran, igual que las celdas vacías: importar nunca borra notas.
+
+Todo se valida en una pasada y se informan todos los errores juntos (con
+su fila de la planilla); si hay alguno no se importa nada.
+
+El XLSX se lee a mano (zipfile + ElementTree), como se escribe en
+exportacion.py, sin dependencias extra.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from .models import Nota
+
+EXTENSIONES_IMPORTACION = (".csv", ".xlsx")
+MAX_TAMANO_IMPORTACION = 2 * 1024 * 1024
+# Tope del XML descomprimido de la hoja (evita bombas zip)
+MAX_TAMANO_HOJA = 20 * 1024 * 1024
+
+_ENCABEZADO_EVALUACION = re.compile(r"^(?:n|nota|ev|evaluaci[oó]n)?\s*\.?\s*(\d{1,3})$", re.IGNORECASE)
+
+_NS_HOJA = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL_DOC = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_REL_PAQ = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+class ErrorImportacion(Exception):
+    """La planilla no se pudo leer (formato dañado o no soportado)."""
+
+
+def normalizar_rut(rut):
+    """'12.345.678-k ' -> '12345678-K' (para comparar sin puntos ni mayúsculas)."""
+    return re.sub(r"[.\s]", "", str(rut)).upper()
+
+
+# =========================================================
+# Lectura de archivos
+# =========================================================
+def leer_planilla(nombre, datos):
+    """Lista de filas (listas de str) desde los bytes de un .csv o .xlsx."""
+    if nombre.lower().endswith(".xlsx"):
+        return _filas_xlsx(datos)
+    return _filas_csv(datos)
+
+
+def _filas_csv(datos):
+    try:
+        texto = datos.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Excel en Windows guarda CSV en Latin-1
+        texto = datos.decode("latin-1")
+    try:
+        # Excel en español separa con punto y coma
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    return [[valor.strip() for valor in fila] for fila in csv.reader(io.StringIO(texto), dialecto)]
+
+
+def _indice_columna(referencia):
+    """'B7' -> 1, 'AA3' -> 26."""
+    indice = 0
+    for letra in referencia:
+        if not letra.isalpha():
+            break
+        indice = indice * 26 + (ord(letra.upper()) - 64)
+    return indice - 1
+
+
+def _ruta_primera_hoja(libro):
+    """Ruta dentro del zip de la primera hoja del libro (según workbook.xml y sus relaciones)."""
+    workbook = ElementTree.fromstring(libro.read("xl/workbook.xml"))
+    hoja = workbook.find(f"{_NS_HOJA}sheets/{_NS_HOJA}sheet")
+    if hoja is None:
+        raise ErrorImportacion("El libro no tiene hojas.")
+    rel_id = hoja.get(f"{_NS_REL_DOC}id")
+    relaciones = ElementTree.fromstring(libro.read("xl/_rels/workbook.xml.rels"))
+    for rel in relaciones.iter(f"{_NS_REL_PAQ}Relationship"):
+        if rel.get("Id") == rel_id:
+            destino = rel.get("Target").lstrip("/")
+            return destino if destino.startswith("xl/") else f"xl/{destino}"
+    raise ErrorImportacion("No se encontró la primera hoja del libro.")
+
+
+def _filas_xlsx(datos):
+    try:
+        with zipfile.ZipFile(io.BytesIO(datos)) as libro:
+            compartidas = []
+            if "xl/sharedStrings.xml" in libro.namelist():
+                for si in ElementTree.fromstring(libro.read("xl/sharedStrings.xml")).iter(f"{_NS_HOJA}si"):
+                    compartidas.append("".join(t.text or "" for t in si.iter(f"{_NS_HOJA}t")))
+
+            ruta = _ruta_primera_hoja(libro)
+            if libro.getinfo(ruta).file_size > MAX_TAMANO_HOJA:
+                raise ErrorImportacion("La hoja es demasiado grande.")
+
+            filas = []
+            with libro.open(ruta) as hoja:
+                for _, elemento in ElementTree.iterparse(hoja):
+                    if elemento.tag != f"{_NS_HOJA}row":
+                        continue
+                    numero = int(elemento.get("r", len(filas) + 1))
+                    # Las filas vacías no vienen en el XML: se rellenan para conservar la numeración
+                    while len(filas) < numero - 1:
+                        filas.append([])
+                    fila = []
+                    for celda in elemento.iter(f"{_NS_HOJA}c"):
+                        columna = _indice_columna(celda.get("r", "")) if celda.get("r") else len(fila)
+                        fila.extend([""] * (columna - len(fila) + 1))
+                        fila[columna] = _valor_celda(celda, compartidas).strip()
+                    filas.append(fila)
+                    elemento.clear()
+            return filas
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError, ValueError, IndexError):
+        raise ErrorImportacion("El archivo XLSX está dañado o no es un libro de Excel.")
+
+
+def _valor_celda(celda, compartidas):
+    tipo = celda.get("t")
+    if tipo == "inlineStr":
+        return "".join(t.text or "" for t in celda.iter(f"{_NS_HOJA}t"))
+    valor = celda.find(f"{_NS_HOJA}v")
+    if valor is None or valor.text is None:
+        return ""
+    if tipo == "s":
+        return compartidas[int(valor.text)]
+    return valor.text
+
+
+# =========================================================
+# Validación
+# =========================================================
+def validar_planilla(filas, alumnos, evaluaciones):
+    """
+    Valida la planilla completa contra los alumnos del curso y las
+    evaluaciones de la asignatura.
+    Devuelve (celdas, errores): celdas {(alumno_id, evaluacion_id): decimas}
+    y errores una lista de mensajes; si hay errores, celdas no se debe usar.
+    """
+    errores = []
+    numeradas = [(n, fila) for n, fila in enumerate(filas, start=1) if any(fila)]
+    if not numeradas:
+        return {}, ["La planilla está vacía."]
+
+    fila_encabezado, encabezado = numeradas[0]
+    columnas_rut = [i for i, valor in enumerate(encabezado) if normalizar_rut(valor) == "RUT"]
+    if len(columnas_rut) != 1:
+        errores.append(f"Fila {fila_encabezado}: el encabezado debe tener exactamente una columna 'RUT'.")
+
+    por_numero = {e.numero: e for e in evaluaciones}
+    columnas = {}
+    for i, valor in enumerate(encabezado):
+        coincide = _ENCABEZADO_EVALUACION.match(valor)
+        if not coincide:
+            continue
+        numero = int(coincide.group(1))
+        if numero not in por_numero:
+            errores.append(f"Columna '{valor}': la evaluación N{numero} no existe en esta asignatura.")
+        elif numero in columnas.values():
+            errores.append(f"Columna '{valor}': la evaluación N{numero} está repetida.")
+        else:
+            columnas[i] = numero
+    if not columnas and not errores:
+        errores.append(f"Fila {fila_encabezado}: no hay columnas de evaluación (por ejemplo 'N1', 'Nota 2').")
+    if len(columnas_rut) != 1 or not columnas:
+        return {}, errores
+
+    columna_rut = columnas_rut[0]
+    por_rut = {normalizar_rut(a.rut): a for a in alumnos}
+    vistos = {}
+    celdas = {}
+    for numero_fila, fila in numeradas[1:]:
+        rut = fila[columna_rut] if columna_rut < len(fila) else ""
+        if not rut:
+            errores.append(f"Fila {numero_fila}: falta el RUT.")
+            continue
+        alumno = por_rut.get(normalizar_rut(rut))
+        if alumno is None:
+            errores.append(f"Fila {numero_fila}: el RUT {rut} no corresponde a un alumno del curso.")
+            continue
+        if alumno.id in vistos:
+            errores.append(f"Fila {numero_fila}: el RUT {rut} está repetido (ya aparece en la fila {vistos[alumno.id]}).")
+            continue
+        vistos[alumno.id] = numero_fila
+
+        for i, numero in columnas.items():
+            valor = fila[i] if i < len(fila) else ""
+            if not valor:
+                continue
+            try:
+                decimas = Nota.a_decimas(valor.replace(",", "."))
+            except (ValueError, OverflowError):
+                errores.append(f"Fila {numero_fila}, N{numero}: '{valor}' no es una nota.")
+                continue
+            if not (Nota.DECIMAS_MINIMA <= decimas <= Nota.DECIMAS_MAXIMA):
+                errores.append(f"Fila {numero_fila}, N{numero}: {valor} está fuera de rango (1.0 a 7.0).")
+                continue
+            celdas[(alumno.id, por_numero[numero].id)] = decimas
+
+    if not errores and not celdas:
+        errores.append("La planilla no trae ninguna nota.")
+    return ({} if errores else celdas), errores
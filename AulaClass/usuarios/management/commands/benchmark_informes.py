@@ -0,0 +1,111 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.exportacion import flujo_zip
+from usuarios.matriz_notas import promedio_decimas
+from usuarios.models import Curso
+from usuarios.reportes_pdf import generar_informe_pdf, informes_en_paralelo, procesos_informes
+from usuarios.servicios_notas import datos_informes
+
+ASIGNATURAS = (
+    "Artes Visuales", "Ciencias Naturales", "Educación Física", "Historia", "Inglés",
+    "Lenguaje", "Matemáticas", "Música", "Orientación", "Tecnología",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el tiempo de generar los informes PDF de un curso completo en serie "
+        "y en el pool de procesos (incluido el armado del ZIP). Sin --curso usa un "
+        "curso sintético, sin tocar la base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--curso", type=int, help="Id de un curso real (lee sus datos de la base).")
+        parser.add_argument("--alumnos", type=int, default=45, help="Alumnos del curso sintético.")
+        parser.add_argument("--procesos", type=int, help="Tamaño del pool (por defecto, un proceso por núcleo).")
+        parser.add_argument("--rondas", type=int, default=3, help="Rondas por modo (se informa la mediana).")
+
+    def handle(self, *args, **options):
+        if options["curso"]:
+            try:
+                curso = Curso.objects.select_related("profesor_jefe").get(id=options["curso"])
+            except Curso.DoesNotExist:
+                raise CommandError(f"No existe el curso {options['curso']}.")
+            informes = datos_informes(curso)
+            origen = f"{curso.nombre} {curso.año}"
+        else:
+            informes = self._sinteticos(options["alumnos"])
+            origen = "curso sintético"
+        if not informes:
+            raise CommandError("El curso no tiene alumnos.")
+
+        procesos = options["procesos"] or procesos_informes()
+        self.stdout.write(f"{len(informes)} informes ({origen}), pool de {procesos} procesos\n")
+
+        modos = [
+            ("serie", lambda: ((datos, generar_informe_pdf(datos)) for datos in informes)),
+            ("paralelo", lambda: informes_en_paralelo(informes, procesos)),
+        ]
+        medianas = {}
+        for nombre, generar in modos:
+            tiempos = []
+            for _ in range(options["rondas"]):
+                inicio = time.perf_counter()
+                primero = None
+                tamano = 0
+                archivos = ((f"{datos['rut']}.pdf", pdf) for datos, pdf in generar())
+                for trozo in flujo_zip(archivos):
+                    if primero is None and trozo:
+                        primero = time.perf_counter() - inicio
+                    tamano += len(trozo)
+                tiempos.append((time.perf_counter() - inicio, primero))
+            total = statistics.median(t for t, _ in tiempos)
+            medianas[nombre] = total
+            self.stdout.write(
+                f"[{nombre:8}] total={total:7.2f} s  primer trozo={statistics.median(p for _, p in tiempos) * 1000:7.1f} ms  "
+                f"por informe={total / len(informes) * 1000:6.1f} ms  zip={tamano / 1024:8.1f} KB"
+            )
+        self.stdout.write(f"Aceleración: {medianas['serie'] / medianas['paralelo']:.2f}x")
+
+    # -----------------------------------------------------
+    def _sinteticos(self, n_alumnos):
+        """Datos con la forma de datos_informes: 10 asignaturas × 8 notas y algunas anotaciones."""
+        azar = random.Random(0)
+        informes = []
+        for k in range(n_alumnos):
+            asignaturas = []
+            for nombre in ASIGNATURAS:
+                notas = [azar.randint(20, 70) for _ in range(8)]
+                puesto = azar.randint(1, n_alumnos)
+                asignaturas.append({
+                    "nombre": nombre,
+                    "notas": notas,
+                    "promedio": promedio_decimas(sum(notas), len(notas)),
+                    "posicion": {
+                        "puesto_curso": puesto, "total_curso": n_alumnos, "percentil_curso": 50,
+                        "puesto_nivel": puesto * 2, "total_nivel": n_alumnos * 2, "percentil_nivel": 50,
+                    },
+                })
+            informes.append({
+                "rut": f"{10000000 + k}-{k % 10}",
+                "alumno": f"Apellido{k} Apellido, Nombre{k}",
+                "apellidos": f"Apellido{k} Apellido",
+                "curso": "7° Básico A - 2025",
+                "profesor_jefe": "Profesor Jefe",
+                "columnas": 8,
+                "asignaturas": asignaturas,
+                "promedio_general": promedio_decimas(sum(a["promedio"] for a in asignaturas), len(asignaturas)),
+                "asistencia": round(azar.uniform(70, 100), 1),
+                "posicion": asignaturas[0]["posicion"],
+                "anotaciones": [
+                    ("01/04/2025", "Profesor Jefe", "Participa activamente en clases.")
+                    for _ in range(azar.randint(0, 4))
+                ],
+                "generado": "01/07/2025 10:00",
+                "fecha": "01/07/2025",
+            })
+        return informes
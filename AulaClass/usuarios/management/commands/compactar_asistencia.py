@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.asistencia_compacta import reconstruir_compacta
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la tabla compacta de asistencia (2 bits por día) desde Asistencia."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alumno", type=int, action="append", dest="alumnos",
+            help="Reconstruir solo este alumno (se puede repetir).",
+        )
+
+    def handle(self, *args, **options):
+        filas = reconstruir_compacta(alumno_ids=options["alumnos"])
+        self.stdout.write(self.style.SUCCESS(f"Asistencia compactada: {filas} filas mensuales."))
@@ -0,0 +1,215 @@
+import math
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+# Los procesos hijos (spawn) importan este módulo antes de django.setup():
+# los modelos y servicios se importan dentro de las funciones.
+
+# OPTIONS de DATABASES antes de la cola: sin timeout propio (5 s de sqlite3),
+# BEGIN diferido y journal DELETE.
+OPCIONES_ORIGINALES = {}
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de estrés del guardado de asistencia: dispara N envíos de curso "
+        "simultáneos repartidos entre varios procesos (como los workers de "
+        "gunicorn) sobre una base de prueba desechable y reporta p95 y errores. "
+        "Compara la configuración original de la base, la actual escribiendo "
+        "directo y la actual con la cola de escritura. Los envíos pueden ser "
+        "del formulario, lotes de la sincronización offline o mezclados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cursos", type=int, default=60, help="Envíos simultáneos (uno por curso).")
+        parser.add_argument("--alumnos", type=int, default=40, help="Alumnos por curso.")
+        parser.add_argument("--procesos", type=int, default=4, help="Procesos entre los que se reparten los envíos.")
+        parser.add_argument("--rondas", type=int, default=3, help="Rondas por modo.")
+        parser.add_argument(
+            "--envio", choices=("formulario", "sincronizacion", "mixto"), default="mixto",
+            help="Tipo de envío: formulario del curso, lote de sincronización o mitad y mitad.",
+        )
+
+    def handle(self, *args, **options):
+        if options["procesos"] < 1 or options["procesos"] > options["cursos"]:
+            raise CommandError("--procesos debe estar entre 1 y --cursos.")
+
+        # Base de prueba aparte: nunca se escribe en la base real
+        creation = connection.creation
+        sqlite = connection.vendor == "sqlite"
+        if sqlite:
+            # SQLite en memoria no reproduce el bloqueo de archivo: usar un archivo temporal
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = "estres_asistencia.sqlite3"
+        nombre_original = connection.settings_dict["NAME"]
+        opciones_actuales = dict(connection.settings_dict.get("OPTIONS", {}))
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cursos = self._poblar(options["cursos"], options["alumnos"])
+            base = connection.settings_dict["NAME"]
+            self.stdout.write(
+                f"{len(cursos)} cursos × {options['alumnos']} alumnos en {options['procesos']} procesos, "
+                f"{options['rondas']} rondas por modo, envío {options['envio']}\n"
+            )
+
+            modos = [
+                ("directo", opciones_actuales, False),
+                ("cola", opciones_actuales, True),
+            ]
+            if sqlite:
+                modos.insert(0, ("original", OPCIONES_ORIGINALES, False))
+            contexto = multiprocessing.get_context("spawn")
+            dia = date(2000, 1, 3)
+            for nombre, opciones_bd, cola in modos:
+                if sqlite:
+                    # El modo de journal queda grabado en el archivo: fijarlo antes de cada modo
+                    with connection.cursor() as cursor:
+                        cursor.execute(opciones_bd.get("init_command", "PRAGMA journal_mode=DELETE"))
+                connections.close_all()
+                latencias, errores = [], []
+                for _ in range(options["rondas"]):
+                    dia += timedelta(days=1)
+                    l, e = self._ronda(
+                        contexto, cursos, options["procesos"], base, opciones_bd, cola, options["envio"], dia
+                    )
+                    latencias += l
+                    errores += e
+                self._reportar(nombre, latencias, errores)
+        finally:
+            connections.close_all()
+            nombre_prueba = connection.settings_dict["NAME"]
+            creation.destroy_test_db(nombre_original, verbosity=0)
+            if sqlite:
+                # Archivos auxiliares del modo WAL
+                for sufijo in ("-wal", "-shm"):
+                    if os.path.exists(f"{nombre_prueba}{sufijo}"):
+                        os.remove(f"{nombre_prueba}{sufijo}")
+
+    # -----------------------------------------------------
+    def _poblar(self, n_cursos, n_alumnos):
+        from usuarios.models import Alumno, Curso, Usuario
+
+        profesor = Usuario.objects.create(
+            username="estres", rut="1.111.111-1", role=Usuario.ROLE_DOCENTE
+        )
+        Curso.objects.bulk_create([
+            Curso(año="2000", nombre=f"Curso {i}", sala=f"S{i}", profesor_jefe=profesor)
+            for i in range(n_cursos)
+        ])
+        cursos = list(Curso.objects.values_list("id", flat=True))
+        Alumno.objects.bulk_create([
+            Alumno(
+                rut=f"{c}.{k:03d}.000-0", nombres=f"N{k}", apellidos=f"A{k}",
+                fecha_nacimiento=date(2010, 1, 1), contacto_emergencia="+56900000000", curso_id=c,
+            )
+            for c in cursos for k in range(n_alumnos)
+        ])
+        ids = {}
+        for alumno_id, curso_id in Alumno.objects.values_list("id", "curso_id"):
+            ids.setdefault(curso_id, []).append(alumno_id)
+        return [(c, ids[c]) for c in cursos]
+
+    def _ronda(self, contexto, cursos, n_procesos, base, opciones_bd, cola, envio, dia):
+        # Todos los procesos parten al mismo tiempo (el "8:15")
+        barrera = contexto.Barrier(n_procesos)
+        resultados = contexto.Queue()
+        procesos = [
+            contexto.Process(
+                target=_proceso_envios,
+                args=(base, opciones_bd, cola, envio, cursos[i::n_procesos], dia, barrera, resultados),
+            )
+            for i in range(n_procesos)
+        ]
+        for p in procesos:
+            p.start()
+        latencias, errores = [], []
+        for _ in procesos:
+            l, e = resultados.get(timeout=300)
+            latencias += l
+            errores += e
+        for p in procesos:
+            p.join()
+        return latencias, errores
+
+    def _reportar(self, nombre, latencias, errores):
+        if latencias:
+            ordenadas = sorted(latencias)
+            p95 = ordenadas[math.ceil(len(ordenadas) * 0.95) - 1]
+            self.stdout.write(
+                f"[{nombre:8}] ok={len(latencias):4d}  errores={len(errores):3d}  "
+                f"p50={statistics.median(ordenadas) * 1000:8.1f} ms  "
+                f"p95={p95 * 1000:8.1f} ms  max={ordenadas[-1] * 1000:8.1f} ms"
+            )
+        else:
+            self.stdout.write(f"[{nombre:8}] ok=   0  errores={len(errores):3d}")
+        for error in sorted(set(errores))[:3]:
+            self.stdout.write(f"           {error}")
+
+
+def _proceso_envios(base, opciones_bd, cola, envio, cursos, dia, barrera, resultados):
+    """
+    Un "worker": sus cursos envían a la vez desde hilos, directo o por la cola.
+    Con envio="mixto" los cursos impares usan la sincronización offline.
+    """
+    import django
+
+    django.setup()
+    from django.db import connection
+
+    from usuarios.cola_asistencia import ColaEscrituraAsistencia
+    from usuarios.models import Curso, Usuario
+    from usuarios.servicios_asistencia import guardar_asistencia_curso, sincronizar_lote_asistencia
+
+    connection.settings_dict["NAME"] = base
+    connection.settings_dict["OPTIONS"] = dict(opciones_bd)
+    if cola:
+        escritor = ColaEscrituraAsistencia()
+        guardar, sincronizar = escritor.guardar, escritor.sincronizar
+    else:
+        guardar, sincronizar = guardar_asistencia_curso, sincronizar_lote_asistencia
+    por_id = Curso.objects.in_bulk([c for c, _ in cursos])
+    usuario = Usuario.objects.get(username="estres")
+    connection.close()
+
+    latencias, errores = [], []
+    lock = threading.Lock()
+    salida = threading.Barrier(len(cursos))
+
+    def enviar(curso, alumno_ids):
+        estados = {a: ("Presente" if a % 7 else "Ausente") for a in alumno_ids}
+        por_lote = envio == "sincronizacion" or (envio == "mixto" and curso.id % 2)
+        registros = [
+            {"curso": curso.id, "alumno": a, "fecha": dia.isoformat(), "estado": e}
+            for a, e in estados.items()
+        ]
+        try:
+            salida.wait()
+            inicio = time.perf_counter()
+            if por_lote:
+                respuesta, _ = sincronizar(usuario, uuid.uuid4().hex, registros)
+                if respuesta["rechazados"]:
+                    raise RuntimeError(f"{respuesta['rechazados']} registros rechazados")
+            else:
+                guardar(curso, dia, estados)
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+        except Exception as e:
+            with lock:
+                errores.append(repr(e))
+        finally:
+            connection.close()
+
+    hilos = [threading.Thread(target=enviar, args=(por_id[c], alumnos)) for c, alumnos in cursos]
+    barrera.wait()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    resultados.put((latencias, errores))
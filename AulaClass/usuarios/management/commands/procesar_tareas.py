@@ -0,0 +1,85 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from usuarios.tareas import ejecutar_tarea, purgar_tareas, reclamar_tarea
+
+# Cada cuánto se borran las tareas terminadas antiguas
+INTERVALO_PURGA = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Trabajador de la cola de tareas en segundo plano (tabla Tarea): reserva "
+        "tareas pendientes y las ejecuta. Se puede correr más de uno a la vez; "
+        "cada tarea la toma un solo trabajador. Requiere TAREAS_ASINCRONAS=true "
+        "en el servidor web para que las vistas encolen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=1, help="Tareas en paralelo dentro de este proceso.")
+        parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos de espera cuando no hay tareas.")
+        parser.add_argument("--una-vez", action="store_true", help="Procesa lo pendiente y termina.")
+        parser.add_argument("--nombre", help="Identificador del trabajador (por defecto, host:pid).")
+        parser.add_argument("--dias-retencion", type=int, default=7, help="Días que se guardan las tareas terminadas.")
+
+    def handle(self, *args, **options):
+        if options["hilos"] < 1:
+            raise CommandError("--hilos debe ser al menos 1.")
+        nombre = options["nombre"] or f"{socket.gethostname()}:{os.getpid()}"
+        detener = threading.Event()
+
+        def al_recibir_senal(signum, frame):
+            self.stdout.write("Deteniendo: se termina la tarea en curso…")
+            detener.set()
+
+        signal.signal(signal.SIGINT, al_recibir_senal)
+        signal.signal(signal.SIGTERM, al_recibir_senal)
+
+        hilos = [
+            threading.Thread(
+                target=self._trabajar,
+                args=(f"{nombre}-{i}", detener, options["intervalo"], options["una_vez"]),
+                daemon=True,
+            )
+            for i in range(1, options["hilos"] + 1)
+        ]
+        self.stdout.write(f"Trabajador {nombre} con {len(hilos)} hilo(s)")
+        for hilo in hilos:
+            hilo.start()
+
+        ultima_purga = 0.0
+        while any(hilo.is_alive() for hilo in hilos):
+            if not options["una_vez"] and time.monotonic() - ultima_purga >= INTERVALO_PURGA:
+                borradas = purgar_tareas(options["dias_retencion"])
+                if borradas:
+                    self.stdout.write(f"Purgadas {borradas} tareas antiguas")
+                ultima_purga = time.monotonic()
+            detener.wait(1)
+            for hilo in hilos:
+                hilo.join(0)
+        connection.close()
+
+    # -----------------------------------------------------
+    def _trabajar(self, trabajador, detener, intervalo, una_vez):
+        """Bucle de un hilo: reservar, ejecutar; si no hay tareas, esperar (o salir con --una-vez)."""
+        try:
+            while not detener.is_set():
+                tarea = reclamar_tarea(trabajador)
+                if tarea is None:
+                    if una_vez:
+                        return
+                    detener.wait(intervalo)
+                    continue
+                inicio = time.perf_counter()
+                self.stdout.write(f"[{trabajador}] {tarea} (intento {tarea.intentos})")
+                exito = ejecutar_tarea(tarea)
+                estado = "completada" if exito else "con error"
+                self.stdout.write(f"[{trabajador}] {tarea} {estado} en {time.perf_counter() - inicio:.1f} s")
+        finally:
+            connection.close()
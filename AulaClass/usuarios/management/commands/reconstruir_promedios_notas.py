@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.servicios_notas import reconstruir_promedios
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los promedios por alumno y asignatura (PromedioAlumnoAsignatura)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alumno", type=int, action="append", dest="alumnos",
+            help="Recalcular solo este alumno (se puede repetir).",
+        )
+
+    def handle(self, *args, **options):
+        escritos = reconstruir_promedios(alumno_ids=options["alumnos"])
+        self.stdout.write(self.style.SUCCESS(f"Promedios reconstruidos: {escritos}."))
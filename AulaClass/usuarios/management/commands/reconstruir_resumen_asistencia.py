@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.servicios_asistencia import reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los contadores de asistencia por alumno y curso (ResumenAsistencia)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alumno", type=int, action="append", dest="alumnos",
+            help="Recalcular solo este alumno (se puede repetir).",
+        )
+
+    def handle(self, *args, **options):
+        escritos = reconstruir_resumenes(alumno_ids=options["alumnos"])
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes de asistencia reconstruidos: {escritos}."))
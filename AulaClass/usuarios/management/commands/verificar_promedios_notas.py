@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.servicios_notas import reconstruir_promedios, verificar_promedios
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los promedios guardados (PromedioAlumnoAsignatura) con los calculados desde las notas. "
+        "Termina con error si hay diferencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alumno", type=int, action="append", dest="alumnos",
+            help="Verificar solo este alumno (se puede repetir).",
+        )
+        parser.add_argument(
+            "--reparar", action="store_true",
+            help="Reconstruye los promedios de los alumnos con diferencias.",
+        )
+
+    def handle(self, *args, **options):
+        diferencias = verificar_promedios(alumno_ids=options["alumnos"])
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Promedios consistentes."))
+            return
+
+        for d in diferencias:
+            self.stdout.write(
+                f"alumno={d['alumno']} asignatura={d['asignatura']} "
+                f"guardado={d['guardado']} calculado={d['calculado']}"
+            )
+
+        if options["reparar"]:
+            alumnos = sorted({d["alumno"] for d in diferencias})
+            reconstruir_promedios(alumno_ids=alumnos)
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(diferencias)} diferencias reparadas ({len(alumnos)} alumnos)."
+            ))
+            return
+
+        raise CommandError(f"{len(diferencias)} promedios no coinciden con las notas (use --reparar).")
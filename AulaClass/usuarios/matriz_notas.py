@@ -0,0 +1,111 @@
+# =========================================================
+# Matriz de notas (NumPy)
+# =========================================================
+"""
+Las notas de uno o varios alumnos se cargan en un arreglo entero
+alumnos × asignaturas × evaluaciones de décimas (0 = sin nota). Cada
+asignatura tiene sus propias evaluaciones; las que tienen menos se
+completan con columnas de ponderación 0.
+
+La matriz solo entrega las celdas (notas y su versión) del libro de
+notas y de los informes PDF. Los promedios no salen de aquí: se
+guardan materializados en PromedioAlumnoAsignatura (ver
+servicios_notas.actualizar_promedios); promedio_decimas es la regla de
+redondeo del colegio (x.x5 hacia arriba) que comparten todos.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from .models import Alumno, Asignatura, Evaluacion, Nota
+
+
+def promedio_decimas(suma, cantidad):
+    """Promedio en décimas redondeado x.x5 hacia arriba, sin flotantes: (2·suma + n) // (2·n)."""
+    return (2 * suma + cantidad) // (2 * cantidad)
+
+
+def a_lista(arreglo):
+    """Arreglo 1D de décimas -> lista de float/None (para plantillas y JSON)."""
+    return [int(d) / 10 if d else None for d in arreglo]
+
+
+def a_valor(d):
+    return int(d) / 10 if d else None
+
+
+class MatrizNotas:
+    def __init__(self, alumnos, asignaturas, evaluaciones, decimas, pesos, versiones=None):
+        self.alumnos = list(alumnos)
+        self.asignaturas = list(asignaturas)
+        # evaluaciones[j]: evaluaciones de la asignatura j, en orden de número
+        self.evaluaciones = evaluaciones
+        self.decimas = decimas
+        # asignaturas × evaluaciones (0 en las columnas de relleno)
+        self.pesos = pesos
+        self.versiones = versiones or {}
+
+    # -----------------------------------------------------
+    # Carga
+    # -----------------------------------------------------
+    @classmethod
+    def cargar(cls, alumnos, asignaturas, con_versiones=False):
+        """
+        Arma la matriz con 2 queries (evaluaciones y notas).
+        con_versiones: guarda también ultima_actualizacion de cada celda
+        (clave (alumno_id, evaluacion_id)) para el autoguardado.
+        """
+        alumnos, asignaturas = list(alumnos), list(asignaturas)
+        fila = {a.id: i for i, a in enumerate(alumnos)}
+        columna = {a.id: j for j, a in enumerate(asignaturas)}
+
+        por_asignatura = defaultdict(list)
+        if asignaturas:
+            for evaluacion in Evaluacion.objects.filter(asignatura_id__in=columna).order_by("numero"):
+                por_asignatura[evaluacion.asignatura_id].append(evaluacion)
+        evaluaciones = [por_asignatura[a.id] for a in asignaturas]
+
+        capas = max((len(e) for e in evaluaciones), default=0)
+        pesos = np.zeros((len(asignaturas), capas), dtype=np.int64)
+        posicion = {}
+        for j, lista in enumerate(evaluaciones):
+            for k, evaluacion in enumerate(lista):
+                pesos[j, k] = evaluacion.ponderacion
+                posicion[evaluacion.id] = (j, k)
+
+        decimas = np.zeros((len(alumnos), len(asignaturas), capas), dtype=np.int16)
+        versiones = {}
+        if alumnos and posicion:
+            campos = ["alumno_id", "evaluacion_id", "decimas"]
+            if con_versiones:
+                campos.append("ultima_actualizacion")
+            registros = list(
+                Nota.objects.filter(
+                    alumno_id__in=fila, evaluacion_id__in=posicion
+                ).values_list(*campos)
+            )
+            if registros:
+                i = np.fromiter((fila[r[0]] for r in registros), dtype=np.intp, count=len(registros))
+                jk = np.array([posicion[r[1]] for r in registros], dtype=np.intp)
+                decimas[i, jk[:, 0], jk[:, 1]] = np.fromiter(
+                    (r[2] for r in registros), dtype=np.int16, count=len(registros)
+                )
+            if con_versiones:
+                versiones = {(r[0], r[1]): r[3].isoformat() for r in registros}
+
+        return cls(alumnos, asignaturas, evaluaciones, decimas, pesos, versiones)
+
+    @classmethod
+    def de_curso(cls, curso, asignaturas=None, con_versiones=False):
+        """Alumnos del curso (orden de lista) × asignaturas del curso (o las indicadas)."""
+        if asignaturas is None:
+            asignaturas = Asignatura.objects.filter(curso=curso).order_by("nombre")
+        alumnos = Alumno.objects.filter(curso=curso).order_by("apellidos", "nombres")
+        return cls.cargar(alumnos, asignaturas, con_versiones=con_versiones)
+
+    # -----------------------------------------------------
+    # Acceso
+    # -----------------------------------------------------
+    def notas(self, i, j):
+        """Notas del alumno i en la asignatura j (solo sus evaluaciones, sin relleno)."""
+        return a_lista(self.decimas[i, j, :len(self.evaluaciones[j])])
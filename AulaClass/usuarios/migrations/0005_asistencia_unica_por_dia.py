@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:13
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def eliminar_duplicados(apps, schema_editor):
+    # Antes de crear la restricción, conservamos solo el último registro de cada alumno/curso/día
+    Asistencia = apps.get_model('usuarios', 'Asistencia')
+    duplicados = (
+        Asistencia.objects
+        .values('alumno_id', 'curso_id', 'fecha')
+        .annotate(n=Count('id'), ultimo=Max('id'))
+        .filter(n__gt=1)
+    )
+    for d in duplicados:
+        Asistencia.objects.filter(
+            alumno_id=d['alumno_id'], curso_id=d['curso_id'], fecha=d['fecha']
+        ).exclude(id=d['ultimo']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_alter_asistencia_estado'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='asistencia',
+            constraint=models.UniqueConstraint(fields=('alumno', 'curso', 'fecha'), name='uniq_asistencia_alumno_curso_fecha'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CODIGOS = {'Presente': 1, 'Ausente': 2, 'Justificado': 3}
+
+
+def poblar_asistencia_mensual(apps, schema_editor):
+    # Empaqueta los registros existentes: 2 bits por día, 8 bytes por mes
+    Asistencia = apps.get_model('usuarios', 'Asistencia')
+    AsistenciaMensual = apps.get_model('usuarios', 'AsistenciaMensual')
+
+    meses = {}
+    for alumno_id, curso_id, fecha, estado in (
+        Asistencia.objects
+        .filter(estado__in=CODIGOS.keys())
+        .values_list('alumno_id', 'curso_id', 'fecha', 'estado')
+        .iterator(chunk_size=2000)
+    ):
+        clave = (alumno_id, curso_id, fecha.year, fecha.month)
+        meses[clave] = meses.get(clave, 0) | (CODIGOS[estado] << (2 * (fecha.day - 1)))
+
+    AsistenciaMensual.objects.bulk_create(
+        [
+            AsistenciaMensual(
+                alumno_id=alumno_id, curso_id=curso_id, anio=anio, mes=mes,
+                estados=valor.to_bytes(8, 'little'),
+            )
+            for (alumno_id, curso_id, anio, mes), valor in meses.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_asistencia_unica_por_dia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsistenciaMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('estados', models.BinaryField(max_length=8)),
+                ('alumno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.alumno')),
+                ('curso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.curso')),
+            ],
+            options={
+                'verbose_name': 'Asistencia mensual',
+                'verbose_name_plural': 'Asistencias mensuales',
+                'constraints': [models.UniqueConstraint(fields=('alumno', 'curso', 'anio', 'mes'), name='uniq_asistencia_mensual')],
+            },
+        ),
+        migrations.RunPython(poblar_asistencia_mensual, migrations.RunPython.noop),
+    ]
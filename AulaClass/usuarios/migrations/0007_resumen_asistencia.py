@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+def poblar_resumenes(apps, schema_editor):
+    # Un GROUP BY (alumno, curso) sobre los registros existentes
+    Asistencia = apps.get_model('usuarios', 'Asistencia')
+    ResumenAsistencia = apps.get_model('usuarios', 'ResumenAsistencia')
+    ResumenAsistencia.objects.bulk_create(
+        [
+            ResumenAsistencia(
+                alumno_id=fila['alumno_id'],
+                curso_id=fila['curso_id'],
+                presentes=fila['presentes'],
+                ausentes=fila['ausentes'],
+                justificados=fila['justificados'],
+                primera_fecha=fila['primera'],
+                ultima_fecha=fila['ultima'],
+            )
+            for fila in Asistencia.objects.values('alumno_id', 'curso_id').annotate(
+                presentes=Count('id', filter=Q(estado='Presente')),
+                ausentes=Count('id', filter=Q(estado='Ausente')),
+                justificados=Count('id', filter=Q(estado='Justificado')),
+                primera=Min('fecha'),
+                ultima=Max('fecha'),
+            ).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_asistencia_mensual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('presentes', models.PositiveIntegerField(default=0)),
+                ('ausentes', models.PositiveIntegerField(default=0)),
+                ('justificados', models.PositiveIntegerField(default=0)),
+                ('primera_fecha', models.DateField(blank=True, null=True)),
+                ('ultima_fecha', models.DateField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('alumno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_asistencia', to='usuarios.alumno')),
+                ('curso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.curso')),
+            ],
+            options={
+                'verbose_name': 'Resumen de asistencia',
+                'verbose_name_plural': 'Resúmenes de asistencia',
+                'constraints': [models.UniqueConstraint(fields=('alumno', 'curso'), name='uniq_resumen_asistencia_alumno_curso')],
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
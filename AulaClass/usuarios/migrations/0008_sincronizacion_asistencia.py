@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0007_resumen_asistencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SincronizacionAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('respuesta', models.JSONField()),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sincronización de asistencia',
+                'verbose_name_plural': 'Sincronizaciones de asistencia',
+            },
+        ),
+    ]
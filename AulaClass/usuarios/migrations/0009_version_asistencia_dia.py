@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0008_sincronizacion_asistencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionAsistenciaDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
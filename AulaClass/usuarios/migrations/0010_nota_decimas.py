@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:10
+
+import math
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def valor_a_decimas(apps, schema_editor):
+    Nota = apps.get_model('usuarios', 'Nota')
+    lote = []
+    for nota in Nota.objects.only('id', 'valor').iterator(chunk_size=2000):
+        # Misma regla del colegio: x.x5 hacia arriba, dentro de 1.0–7.0
+        nota.decimas = min(70, max(10, math.floor(nota.valor * 10 + 0.5 + 1e-9)))
+        lote.append(nota)
+        if len(lote) >= 2000:
+            Nota.objects.bulk_update(lote, ['decimas'])
+            lote = []
+    if lote:
+        Nota.objects.bulk_update(lote, ['decimas'])
+
+
+def decimas_a_valor(apps, schema_editor):
+    Nota = apps.get_model('usuarios', 'Nota')
+    Nota.objects.update(valor=models.F('decimas') / 10.0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0009_version_asistencia_dia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nota',
+            name='decimas',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='nota',
+            name='valor',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(valor_a_decimas, decimas_a_valor),
+        migrations.AlterField(
+            model_name='nota',
+            name='decimas',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(10), django.core.validators.MaxValueValidator(70)]),
+        ),
+        migrations.RemoveField(
+            model_name='nota',
+            name='valor',
+        ),
+        migrations.AddConstraint(
+            model_name='nota',
+            constraint=models.CheckConstraint(condition=models.Q(('decimas__gte', 10), ('decimas__lte', 70)), name='nota_decimas_entre_10_y_70'),
+        ),
+    ]
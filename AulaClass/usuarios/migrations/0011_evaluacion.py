@@ -0,0 +1,67 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Evaluaciones ponderadas, en tres pasos para que cada uno corra en su propia
+# transacción (en PostgreSQL las FK son DEFERRABLE INITIALLY DEFERRED y no se
+# puede alterar la tabla con triggers pendientes del mismo UPDATE):
+#
+# - 0011: tabla Evaluacion y Nota.evaluacion nullable.
+# - 0012: datos (una Evaluacion por cada (asignatura, numero) con notas).
+# - 0013: NOT NULL, unicidad nueva y borrado de las columnas antiguas.
+#
+# Las asignaturas sin notas quedan sin evaluaciones: el libro muestra el
+# aviso para agregar la primera (ya no hay columnas fijas 1-10).
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0010_nota_decimas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Evaluacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveSmallIntegerField()),
+                ('nombre', models.CharField(max_length=100)),
+                ('fecha', models.DateField(blank=True, null=True)),
+                ('ponderacion', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)])),
+                ('asignatura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evaluaciones', to='usuarios.asignatura')),
+            ],
+            options={
+                'verbose_name': 'Evaluación',
+                'verbose_name_plural': 'Evaluaciones',
+                'ordering': ['asignatura', 'numero'],
+                'constraints': [
+                    models.UniqueConstraint(fields=('asignatura', 'numero'), name='uniq_evaluacion_asignatura_numero'),
+                    models.CheckConstraint(condition=models.Q(('ponderacion__gte', 1)), name='evaluacion_ponderacion_positiva'),
+                ],
+            },
+        ),
+        migrations.RenameField(
+            model_name='nota',
+            old_name='evaluacion',
+            new_name='nombre_evaluacion',
+        ),
+        migrations.AlterField(
+            model_name='nota',
+            name='nombre_evaluacion',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='nota',
+            name='numero',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nota',
+            name='evaluacion',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notas', to='usuarios.evaluacion'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+def crear_evaluaciones(apps, schema_editor):
+    """Una Evaluacion por cada (asignatura, numero) con notas; las notas pasan a apuntarla."""
+    Evaluacion = apps.get_model('usuarios', 'Evaluacion')
+    Nota = apps.get_model('usuarios', 'Nota')
+
+    nombres = {}
+    for asignatura_id, numero, nombre in (
+        Nota.objects.order_by('asignatura_id', 'numero', 'id')
+        .values_list('asignatura_id', 'numero', 'nombre_evaluacion')
+        .iterator(chunk_size=2000)
+    ):
+        nombres.setdefault((asignatura_id, numero), nombre or f"Evaluación {numero}")
+
+    Evaluacion.objects.bulk_create(
+        [
+            Evaluacion(asignatura_id=asignatura_id, numero=numero, nombre=nombre[:100])
+            for (asignatura_id, numero), nombre in nombres.items()
+        ],
+        batch_size=1000,
+    )
+
+    for evaluacion in Evaluacion.objects.only('id', 'asignatura_id', 'numero').iterator(chunk_size=2000):
+        Nota.objects.filter(
+            asignatura_id=evaluacion.asignatura_id, numero=evaluacion.numero
+        ).update(evaluacion=evaluacion.id)
+
+
+def restaurar_numeros(apps, schema_editor):
+    Evaluacion = apps.get_model('usuarios', 'Evaluacion')
+    Nota = apps.get_model('usuarios', 'Nota')
+    for evaluacion in Evaluacion.objects.only('id', 'numero', 'nombre').iterator(chunk_size=2000):
+        Nota.objects.filter(evaluacion=evaluacion.id).update(
+            numero=evaluacion.numero, nombre_evaluacion=evaluacion.nombre
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0011_evaluacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_evaluaciones, restaurar_numeros),
+    ]
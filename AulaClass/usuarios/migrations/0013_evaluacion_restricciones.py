@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_evaluacion_datos'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='nota',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='nota',
+            name='evaluacion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notas', to='usuarios.evaluacion'),
+        ),
+        migrations.RemoveField(
+            model_name='nota',
+            name='nombre_evaluacion',
+        ),
+        migrations.RemoveField(
+            model_name='nota',
+            name='numero',
+        ),
+        migrations.AddConstraint(
+            model_name='nota',
+            constraint=models.UniqueConstraint(fields=('alumno', 'evaluacion'), name='uniq_nota_alumno_evaluacion'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def poblar_promedios(apps, schema_editor):
+    # Un GROUP BY (alumno, asignatura) sobre las notas existentes
+    Nota = apps.get_model('usuarios', 'Nota')
+    PromedioAlumnoAsignatura = apps.get_model('usuarios', 'PromedioAlumnoAsignatura')
+    PromedioAlumnoAsignatura.objects.bulk_create(
+        [
+            PromedioAlumnoAsignatura(
+                alumno_id=fila['alumno_id'],
+                asignatura_id=fila['asignatura_id'],
+                suma=fila['suma'],
+                peso=fila['peso'],
+                cantidad=fila['cantidad'],
+                decimas=(2 * fila['suma'] + fila['peso']) // (2 * fila['peso']),
+            )
+            for fila in Nota.objects.values('alumno_id', 'asignatura_id').annotate(
+                suma=Sum(F('decimas') * F('evaluacion__ponderacion')),
+                peso=Sum('evaluacion__ponderacion'),
+                cantidad=Count('id'),
+            ).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0013_evaluacion_restricciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromedioAlumnoAsignatura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suma', models.PositiveIntegerField(default=0)),
+                ('peso', models.PositiveIntegerField(default=0)),
+                ('cantidad', models.PositiveSmallIntegerField(default=0)),
+                ('decimas', models.PositiveSmallIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('alumno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promedios', to='usuarios.alumno')),
+                ('asignatura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promedios', to='usuarios.asignatura')),
+            ],
+            options={
+                'verbose_name': 'Promedio por asignatura',
+                'verbose_name_plural': 'Promedios por asignatura',
+                'indexes': [models.Index(fields=['asignatura', 'decimas'], name='idx_promedio_asig_decimas')],
+                'constraints': [models.UniqueConstraint(fields=('alumno', 'asignatura'), name='uniq_promedio_alumno_asignatura')],
+            },
+        ),
+        migrations.RunPython(poblar_promedios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0014_promedio_alumno_asignatura'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialNota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decimas_anteriores', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('decimas_nuevas', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('origen', models.CharField(choices=[('libro', 'Libro de notas'), ('autoguardado', 'Autoguardado'), ('importacion', 'Importación'), ('admin', 'Administración')], max_length=12)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('alumno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_notas', to='usuarios.alumno')),
+                ('asignatura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_notas', to='usuarios.asignatura')),
+                ('evaluacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial', to='usuarios.evaluacion')),
+                ('nota', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historial', to='usuarios.nota')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Historial de nota',
+                'verbose_name_plural': 'Historial de notas',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['alumno', '-fecha'], name='idx_historial_alumno_fecha'), models.Index(fields=['asignatura', '-fecha'], name='idx_historial_asig_fecha')],
+            },
+        ),
+    ]
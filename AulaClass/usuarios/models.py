@@ -1,9 +1,11 @@
 # =========================================================
 # Importaciones
 # =========================================================
+import math
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.core.validators import RegexValidator
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.db.models.functions import Lower
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -209,22 +211,74 @@ class DocenteCurso(models.Model):
         unique_together = ('docente', 'curso')
 
 
+# ---------------------------------------------------------
+# Modelo Evaluacion (columnas del libro de notas)
+# ---------------------------------------------------------
+class Evaluacion(models.Model):
+    asignatura = models.ForeignKey(Asignatura, on_delete=models.CASCADE, related_name="evaluaciones")
+    numero = models.PositiveSmallIntegerField()
+    nombre = models.CharField(max_length=100)
+    fecha = models.DateField(null=True, blank=True)
+    # Peso relativo en el promedio (p. ej. porcentajes 20/30/50, o 1 = todas iguales)
+    ponderacion = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1), MaxValueValidator(100)]
+    )
+
+    def __str__(self):
+        return f"{self.asignatura.nombre} - N{self.numero} {self.nombre}"
+
+    class Meta:
+        verbose_name = "Evaluación"
+        verbose_name_plural = "Evaluaciones"
+        ordering = ["asignatura", "numero"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['asignatura', 'numero'],
+                name='uniq_evaluacion_asignatura_numero'
+            ),
+            models.CheckConstraint(
+                condition=models.Q(ponderacion__gte=1),
+                name='evaluacion_ponderacion_positiva'
+            ),
+        ]
+
+
 # ---------------------------------------------------------
 # Modelo Nota
 # ---------------------------------------------------------
 class Nota(models.Model):
-    valor = models.FloatField()
+    # Décimas exactas: 10 = 1.0 ... 70 = 7.0 (sin errores de punto flotante)
+    DECIMAS_MINIMA = 10
+    DECIMAS_MAXIMA = 70
+
+    decimas = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(DECIMAS_MINIMA), MaxValueValidator(DECIMAS_MAXIMA)]
+    )
     fecha_registro = models.DateField(auto_now_add=True)
-    evaluacion = models.CharField(max_length=100) 
+    evaluacion = models.ForeignKey(Evaluacion, on_delete=models.CASCADE, related_name="notas")
     
     alumno = models.ForeignKey(Alumno, on_delete=models.CASCADE)
+    # Redundante con evaluacion.asignatura: se mantiene para filtrar sin JOIN
     asignatura = models.ForeignKey(Asignatura, on_delete=models.CASCADE)
     profesor = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     ultima_actualizacion = models.DateTimeField(auto_now=True)
-    numero = models.PositiveSmallIntegerField()
 
     def __str__(self):
-        return f"{self.evaluacion} - {self.valor} ({self.alumno})"
+        return f"{self.evaluacion} - {self.valor:.1f} ({self.alumno})"
+
+    @staticmethod
+    def a_decimas(valor):
+        """6.45 -> 65 (x.x5 hacia arriba). El margen absorbe 4.35 -> 43.4999..."""
+        return math.floor(float(valor) * 10 + 0.5 + 1e-9)
+
+    @property
+    def valor(self):
+        return None if self.decimas is None else self.decimas / 10
+
+    @valor.setter
+    def valor(self, valor):
+        self.decimas = None if valor is None else self.a_decimas(valor)
 
     def detalle_registro(self):
         prof = self.profesor.get_full_name() or self.profesor.username
@@ -236,7 +290,112 @@ class Nota(models.Model):
 
     class Meta:
         ordering = ["alumno", "asignatura", "evaluacion"]
-        unique_together = ("alumno", "asignatura", "numero")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['alumno', 'evaluacion'],
+                name='uniq_nota_alumno_evaluacion'
+            ),
+            models.CheckConstraint(
+                condition=models.Q(decimas__gte=10, decimas__lte=70),
+                name='nota_decimas_entre_10_y_70'
+            )
+        ]
+
+
+# ---------------------------------------------------------
+# Promedio por alumno y asignatura (materializado)
+# ---------------------------------------------------------
+class PromedioAlumnoAsignatura(models.Model):
+    """
+    Promedio ponderado de un alumno en una asignatura, actualizado en la
+    misma transacción en que se guardan sus notas.
+    promedio = (2·suma + peso) // (2·peso), en décimas (misma regla que MatrizNotas).
+    """
+    alumno = models.ForeignKey("Alumno", on_delete=models.CASCADE, related_name="promedios")
+    asignatura = models.ForeignKey("Asignatura", on_delete=models.CASCADE, related_name="promedios")
+    suma = models.PositiveIntegerField(default=0)  # Σ décimas × ponderación
+    peso = models.PositiveIntegerField(default=0)  # Σ ponderación de las evaluaciones con nota
+    cantidad = models.PositiveSmallIntegerField(default=0)
+    decimas = models.PositiveSmallIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    @property
+    def promedio(self):
+        return self.decimas / 10 if self.cantidad else None
+
+    def __str__(self):
+        return f"{self.alumno} - {self.asignatura.nombre} ({self.promedio})"
+
+    class Meta:
+        verbose_name = "Promedio por asignatura"
+        verbose_name_plural = "Promedios por asignatura"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['alumno', 'asignatura'],
+                name='uniq_promedio_alumno_asignatura'
+            )
+        ]
+        indexes = [
+            # Promedios de un curso/asignatura (libro de notas, rankings)
+            models.Index(fields=['asignatura', 'decimas'], name='idx_promedio_asig_decimas'),
+        ]
+
+
+# ---------------------------------------------------------
+# Historial de cambios de notas (solo inserción)
+# ---------------------------------------------------------
+class HistorialNota(models.Model):
+    """
+    Una fila por celda que cambió: valor anterior y nuevo en décimas
+    (anterior vacío = nota creada, nuevo vacío = nota eliminada).
+    Se escribe con un bulk_create por guardado y nunca se modifica.
+    alumno/asignatura/evaluacion se copian para consultar aunque la nota ya no exista.
+    """
+    ORIGEN_LIBRO = "libro"
+    ORIGEN_AUTOGUARDADO = "autoguardado"
+    ORIGEN_IMPORTACION = "importacion"
+    ORIGEN_ADMIN = "admin"
+    ORIGENES = [
+        (ORIGEN_LIBRO, "Libro de notas"),
+        (ORIGEN_AUTOGUARDADO, "Autoguardado"),
+        (ORIGEN_IMPORTACION, "Importación"),
+        (ORIGEN_ADMIN, "Administración"),
+    ]
+
+    nota = models.ForeignKey("Nota", on_delete=models.SET_NULL, null=True, blank=True, related_name="historial")
+    alumno = models.ForeignKey("Alumno", on_delete=models.CASCADE, related_name="historial_notas")
+    asignatura = models.ForeignKey("Asignatura", on_delete=models.CASCADE, related_name="historial_notas")
+    evaluacion = models.ForeignKey("Evaluacion", on_delete=models.CASCADE, related_name="historial")
+    decimas_anteriores = models.PositiveSmallIntegerField(null=True, blank=True)
+    decimas_nuevas = models.PositiveSmallIntegerField(null=True, blank=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    origen = models.CharField(max_length=12, choices=ORIGENES)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def valor_anterior(self):
+        return None if self.decimas_anteriores is None else self.decimas_anteriores / 10
+
+    @property
+    def valor_nuevo(self):
+        return None if self.decimas_nuevas is None else self.decimas_nuevas / 10
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("El historial de notas no se modifica.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.alumno} - {self.evaluacion}: {self.valor_anterior} -> {self.valor_nuevo}"
+
+    class Meta:
+        verbose_name = "Historial de nota"
+        verbose_name_plural = "Historial de notas"
+        ordering = ["-fecha"]
+        indexes = [
+            models.Index(fields=['alumno', '-fecha'], name='idx_historial_alumno_fecha'),
+            models.Index(fields=['asignatura', '-fecha'], name='idx_historial_asig_fecha'),
+        ]
 
 
 # ---------------------------------------------------------
@@ -261,6 +420,118 @@ class Asistencia(models.Model):
     def __str__(self):
         return f"{self.alumno} - {self.fecha} ({self.estado})"
 
+    class Meta:
+        constraints = [
+            # Un solo registro por alumno, curso y día (permite el upsert masivo)
+            models.UniqueConstraint(
+                fields=['alumno', 'curso', 'fecha'],
+                name='uniq_asistencia_alumno_curso_fecha'
+            )
+        ]
+
+
+# ---------------------------------------------------------
+# Modelo AsistenciaMensual (representación compacta)
+# ---------------------------------------------------------
+class AsistenciaMensual(models.Model):
+    """
+    Asistencia de un alumno en un mes, empaquetada a 2 bits por día (8 bytes).
+    Se mantiene junto a Asistencia; ver usuarios/asistencia_compacta.py.
+    """
+    alumno = models.ForeignKey("Alumno", on_delete=models.CASCADE)
+    curso = models.ForeignKey("Curso", on_delete=models.CASCADE)
+    anio = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    estados = models.BinaryField(max_length=8)
+
+    def __str__(self):
+        return f"{self.alumno} - {self.mes:02d}/{self.anio}"
+
+    class Meta:
+        verbose_name = "Asistencia mensual"
+        verbose_name_plural = "Asistencias mensuales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['alumno', 'curso', 'anio', 'mes'],
+                name='uniq_asistencia_mensual'
+            )
+        ]
+
+
+# ---------------------------------------------------------
+# Modelo ResumenAsistencia (contadores desnormalizados)
+# ---------------------------------------------------------
+class ResumenAsistencia(models.Model):
+    """
+    Totales de asistencia por alumno y curso, actualizados en la misma
+    transacción en que se guarda la asistencia.
+    """
+    alumno = models.ForeignKey("Alumno", on_delete=models.CASCADE, related_name="resumenes_asistencia")
+    curso = models.ForeignKey("Curso", on_delete=models.CASCADE)
+    presentes = models.PositiveIntegerField(default=0)
+    ausentes = models.PositiveIntegerField(default=0)
+    justificados = models.PositiveIntegerField(default=0)
+    primera_fecha = models.DateField(null=True, blank=True)
+    ultima_fecha = models.DateField(null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    @property
+    def total(self):
+        return self.presentes + self.ausentes + self.justificados
+
+    @property
+    def porcentaje(self):
+        return round(self.presentes / self.total * 100, 1) if self.total else 0.0
+
+    def __str__(self):
+        return f"{self.alumno} - {self.curso} ({self.porcentaje}%)"
+
+    class Meta:
+        verbose_name = "Resumen de asistencia"
+        verbose_name_plural = "Resúmenes de asistencia"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['alumno', 'curso'],
+                name='uniq_resumen_asistencia_alumno_curso'
+            )
+        ]
+
+
+# ---------------------------------------------------------
+# Modelo VersionAsistenciaDia (aviso de cambios por día)
+# ---------------------------------------------------------
+class VersionAsistenciaDia(models.Model):
+    """
+    Contador que sube cada vez que se escribe asistencia de una fecha.
+    El panel en vivo consulta solo esta fila para saber si debe recalcular.
+    """
+    fecha = models.DateField(unique=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} (v{self.version})"
+
+
+# ---------------------------------------------------------
+# Modelo SincronizacionAsistencia (idempotencia de lotes)
+# ---------------------------------------------------------
+class SincronizacionAsistencia(models.Model):
+    """
+    Lote de asistencia ya aplicado desde el endpoint de sincronización.
+    Si el cliente reenvía el mismo token se devuelve la respuesta guardada.
+    """
+    token = models.CharField(max_length=64, unique=True)
+    usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE)
+    creado = models.DateTimeField(auto_now_add=True)
+    respuesta = models.JSONField()
+
+    def __str__(self):
+        return f"{self.token} ({self.usuario})"
+
+    class Meta:
+        verbose_name = "Sincronización de asistencia"
+        verbose_name_plural = "Sincronizaciones de asistencia"
+
 
 # ---------------------------------------------------------
 # Modelo Anotacion
@@ -272,4 +543,70 @@ class Anotacion(models.Model):
     profesor = models.ForeignKey('Usuario', on_delete=models.CASCADE)
 
     def __str__(self):
-        return f"Anotación de {self.profesor} para {self.alumno} el {self.fecha}"
\ No newline at end of file
+        return f"Anotación de {self.profesor} para {self.alumno} el {self.fecha}"
+
+
+# ---------------------------------------------------------
+# Modelo Tarea (cola de trabajos en segundo plano)
+# ---------------------------------------------------------
+class Tarea(models.Model):
+    """
+    Trabajo pesado encolado desde una vista y ejecutado por
+    `manage.py procesar_tareas` (ver usuarios/tareas.py).
+    Un trabajador la toma con un UPDATE condicional (estado pendiente ->
+    en proceso) y la mantiene reservada hasta `reservada_hasta`; si muere,
+    otra la vuelve a tomar al vencer la reserva.
+    """
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    COMPLETADA = "completada"
+    FALLIDA = "fallida"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (EN_PROCESO, "En proceso"),
+        (COMPLETADA, "Completada"),
+        (FALLIDA, "Fallida"),
+    ]
+    # Cada tipo se implementa en usuarios/tareas.py
+    TIPOS = [
+        ("informe_alumno", "Informe de notas del alumno"),
+        ("historial_pdf", "Historial de acciones (PDF)"),
+        ("eliminar_curso", "Eliminación de curso"),
+    ]
+
+    tipo = models.CharField(max_length=40, choices=TIPOS)
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey('Usuario', on_delete=models.SET_NULL, null=True, blank=True, related_name="tareas")
+    estado = models.CharField(max_length=12, choices=ESTADOS, default=PENDIENTE)
+
+    progreso = models.PositiveSmallIntegerField(default=0)
+    mensaje = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    # Resultado descargable (ruta dentro de TAREAS_DIR)
+    archivo = models.CharField(max_length=255, blank=True)
+    nombre_archivo = models.CharField(max_length=150, blank=True)
+
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    trabajador = models.CharField(max_length=100, blank=True)
+    reservada_hasta = models.DateTimeField(null=True, blank=True)
+
+    creada = models.DateTimeField(auto_now_add=True)
+    iniciada = models.DateTimeField(null=True, blank=True)
+    terminada = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def terminal(self):
+        return self.estado in (self.COMPLETADA, self.FALLIDA)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ["-creada"]
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='idx_tarea_estado_disponible'),
+        ]
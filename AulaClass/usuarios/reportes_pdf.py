@@ -0,0 +1,513 @@
+# =========================================================
+# Informe de notas del alumno (PDF con ReportLab)
+# =========================================================
+"""
+generar_informe_pdf recibe los datos ya leídos de la base (un dict de
+tipos simples, ver servicios_notas.datos_informes) y devuelve los bytes
+del PDF. No toca la base ni importa modelos, así que se puede ejecutar en
+otro proceso: informes_en_paralelo reparte un curso completo en un pool
+del tamaño de los núcleos de la máquina. El pool se crea una vez por
+proceso web y sus procesos se inician con "spawn" (nunca fork: el proceso
+web tiene hilos y conexiones abiertas).
+
+Los PDF generados se guardan en disco bajo la huella de sus datos (más
+VERSION_INFORME): mientras nada de lo que muestra el informe cambie, se
+sirve el mismo archivo sin volver a renderizar.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+DECIMAS_APROBACION = 40
+
+# Subir al cambiar el diseño del informe: invalida los PDF guardados en caché
+VERSION_INFORME = 1
+
+
+def _nota(decimas):
+    """65 -> '6.5' (siempre con punto decimal)."""
+    return f"{decimas / 10:.1f}"
+
+
+# =========================================================
+# Render (sin base de datos)
+# =========================================================
+def generar_informe_pdf(datos):
+    """
+    datos: {"rut", "alumno", "curso", "profesor_jefe", "columnas",
+    "asignaturas": [{"nombre", "notas", "promedio", "posicion"}],
+    "promedio_general", "asistencia", "posicion", "anotaciones", "generado", "fecha"}.
+    Notas y promedios en décimas (0 = sin nota). Devuelve los bytes del PDF.
+    """
+    columnas = datos["columnas"]
+
+    # Estilos de párrafo para celdas
+    style_center = ParagraphStyle('center', alignment=TA_CENTER, fontName='Helvetica', fontSize=9)
+    style_left_bold = ParagraphStyle('left', alignment=TA_LEFT, fontName='Helvetica-Bold', fontSize=9)
+
+    table_data_notas = []
+    for asig in datos["asignaturas"]:
+        row = [Paragraph(escape(asig["nombre"].upper()), style_left_bold)]
+
+        # Una columna por evaluación; "-" en las vacías y en el relleno
+        notas_asig = asig["notas"]
+        for decimas in notas_asig + [0] * (columnas - len(notas_asig)):
+            if decimas:
+                # Rojo si es menor a 4.0
+                if decimas < DECIMAS_APROBACION:
+                    txt = f"<font color='#dc2626'><b>{_nota(decimas)}</b></font>"
+                else:
+                    txt = f"<font color='#1f2937'>{_nota(decimas)}</font>"
+                row.append(Paragraph(txt, style_center))
+            else:
+                row.append(Paragraph("-", style_center))
+
+        # Promedio Asignatura
+        promedio = asig["promedio"]
+        if promedio:
+            if promedio < DECIMAS_APROBACION:
+                txt = f"<font color='#dc2626'><b>{_nota(promedio)}</b></font>"
+            else:
+                txt = f"<font color='#1f2937'><b>{_nota(promedio)}</b></font>"
+            row.append(Paragraph(txt, style_center))
+        else:
+            row.append(Paragraph("-", style_center))
+
+        # Lugar en el curso y percentil en el nivel
+        posicion = asig["posicion"]
+        if posicion:
+            row.append(Paragraph(f"{posicion['puesto_curso']}° / {posicion['total_curso']}", style_center))
+            row.append(Paragraph(f"P{posicion['percentil_nivel']}", style_center))
+        else:
+            row += [Paragraph("-", style_center), Paragraph("-", style_center)]
+
+        table_data_notas.append(row)
+
+    buffer = io.BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        leftMargin=15 * mm,
+        rightMargin=15 * mm,
+        topMargin=15 * mm,
+        bottomMargin=15 * mm,
+        title=f"Informe_{datos['rut']}"
+    )
+
+    story = []
+    styles = getSampleStyleSheet()
+
+    # A. ENCABEZADO
+    header_data = [
+        [
+            Paragraph("<b>INFORME PARCIAL DE NOTAS</b>",
+                      ParagraphStyle('TitleInv', parent=styles['Heading1'], textColor=colors.white, fontSize=16)),
+            Paragraph(f"Generado: {datos['generado']}",
+                      ParagraphStyle('DateInv', parent=styles['Normal'], textColor=colors.white, alignment=TA_RIGHT))
+        ]
+    ]
+    t_header = Table(header_data, colWidths=[200*mm, 67*mm])
+    t_header.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,-1), colors.HexColor("#4f46e5")), # Azul Primario
+        ('TOPPADDING', (0,0), (-1,-1), 10),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 10),
+        ('LEFTPADDING', (0,0), (-1,-1), 15),
+        ('RIGHTPADDING', (0,0), (-1,-1), 15),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ]))
+    story.append(t_header)
+    story.append(Spacer(1, 10*mm))
+
+    # B. DATOS ALUMNO
+    info_data = [
+        [f"ALUMNO: {datos['alumno']}", f"RUT: {datos['rut']}"],
+        [f"CURSO: {datos['curso']}", f"PROF. JEFE: {datos['profesor_jefe']}"]
+    ]
+
+    t_info = Table(info_data, colWidths=[133*mm, 134*mm])
+    t_info.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,-1), colors.HexColor("#f3f4f6")),
+        ('TEXTCOLOR', (0,0), (-1,-1), colors.HexColor("#374151")),
+        ('FONTNAME', (0,0), (-1,-1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0,0), (-1,-1), 10),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 8),
+        ('TOPPADDING', (0,0), (-1,-1), 8),
+        ('LEFTPADDING', (0,0), (-1,-1), 12),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.white),
+    ]))
+    story.append(t_info)
+    story.append(Spacer(1, 8*mm))
+
+    # C. TABLA NOTAS
+    headers = [Paragraph("ASIGNATURA", style_center)]
+    for i in range(1, columnas + 1):
+        headers.append(Paragraph(f"N{i}", style_center))
+    headers.append(Paragraph("PROM", style_center))
+    headers.append(Paragraph("LUGAR CURSO", style_center))
+    headers.append(Paragraph("PERC. NIVEL", style_center))
+
+    final_table_data = [headers] + table_data_notas
+    # 150 mm para las notas: 15 mm cada una hasta 10, más angostas si hay más
+    col_widths = [57*mm] + [min(15, 150 / max(columnas, 1))*mm]*columnas + [20*mm]*3
+
+    t_notas = Table(final_table_data, colWidths=col_widths, repeatRows=1)
+    t_notas.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#1f2937")), # Cabecera oscura
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e5e7eb")),
+        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.HexColor("#f9fafb")]),
+        ('FONTSIZE', (0,0), (-1,-1), 9),
+        ('TOPPADDING', (0,0), (-1,-1), 6),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+        ('BACKGROUND', (-3,1), (-3,-1), colors.HexColor("#eff6ff")), # Columna Promedios Azul suave
+        ('BOX', (-3,0), (-3,-1), 1, colors.HexColor("#bfdbfe")),
+    ]))
+    story.append(t_notas)
+    story.append(Spacer(1, 10*mm))
+
+    # D. RESUMEN
+    promedio_general = datos["promedio_general"]
+    porc_asistencia = datos["asistencia"]
+    color_prom = "#dc2626" if promedio_general < DECIMAS_APROBACION else "#059669"
+    color_asist = "#dc2626" if porc_asistencia < 85.0 else "#2563eb"
+
+    posicion_general = datos["posicion"]
+    if posicion_general:
+        txt_lugar = (
+            f"<b><font size=14>{posicion_general['puesto_curso']}° de {posicion_general['total_curso']}</font></b>"
+            f"<br/><font size=8>Nivel: {posicion_general['puesto_nivel']}° de {posicion_general['total_nivel']}"
+            f" (percentil {posicion_general['percentil_nivel']})</font>"
+        )
+    else:
+        txt_lugar = "<b><font size=14>-</font></b>"
+
+    resumen_data = [
+        [Paragraph("PROMEDIO GENERAL", style_center), Paragraph("PORCENTAJE ASISTENCIA", style_center),
+         Paragraph("LUGAR EN EL CURSO", style_center)],
+        [
+            Paragraph(f"<b><font size=14 color='{color_prom}'>{_nota(promedio_general)}</font></b>", style_center),
+            Paragraph(f"<b><font size=14 color='{color_asist}'>{porc_asistencia:.1f}%</font></b>", style_center),
+            Paragraph(txt_lugar, ParagraphStyle('lugar', parent=style_center, leading=16)),
+        ]
+    ]
+    t_resumen = Table(resumen_data, colWidths=[60*mm, 60*mm, 60*mm])
+    t_resumen.setStyle(TableStyle([
+        ('BOX', (0,0), (0,-1), 2, colors.HexColor("#e5e7eb")),
+        ('BOX', (1,0), (1,-1), 2, colors.HexColor("#e5e7eb")),
+        ('BOX', (2,0), (2,-1), 2, colors.HexColor("#e5e7eb")),
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#f3f4f6")),
+        ('TOPPADDING', (0,0), (-1,-1), 10),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 10),
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ]))
+    t_resumen.hAlign = 'RIGHT'
+    story.append(t_resumen)
+    story.append(Spacer(1, 10*mm))
+
+    # E. ANOTACIONES
+    story.append(Paragraph("OBSERVACIONES / ANOTACIONES", styles['Heading3']))
+    story.append(Spacer(1, 2*mm))
+
+    if datos["anotaciones"]:
+        for fecha, profesor, texto in datos["anotaciones"]:
+            txt = f"<b>{fecha} - {escape(profesor)}:</b> {escape(texto)}"
+            story.append(Paragraph(txt, ParagraphStyle('anot', parent=styles['Normal'], fontSize=9, leading=12)))
+            story.append(Spacer(1, 2*mm))
+    else:
+        story.append(Paragraph("<i>No se registran anotaciones a la fecha.</i>", styles['Normal']))
+
+    # F. FIRMAS
+    story.append(Spacer(1, 25*mm))
+    firma_data = [
+        ["__________________________", "__________________________"],
+        ["Firma Apoderado", "Firma Profesor Jefe / Dirección"]
+    ]
+    t_firmas = Table(firma_data, colWidths=[90*mm, 90*mm])
+    t_firmas.setStyle(TableStyle([
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('fontName', (0,0), (-1,-1), 'Helvetica'),
+        ('fontSize', (0,0), (-1,-1), 10),
+    ]))
+    story.append(t_firmas)
+
+    # PIE DE PÁGINA
+    story.append(Spacer(1, 10*mm))
+    footer = Paragraph(
+        f"<font color='#9ca3af' size=8>Documento oficial AulaClass | {datos['rut']} | {datos['fecha']}</font>",
+        style_center
+    )
+    story.append(footer)
+
+    # GENERAR
+    doc.build(story)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+# =========================================================
+# Historial de acciones (PDF)
+# =========================================================
+def generar_historial_pdf(filas):
+    """
+    filas: (fecha, usuario, action_flag, modelo, objeto, detalle) ya
+    formateadas, en el orden en que se muestran. Devuelve los bytes del PDF.
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=landscape(A4),
+        leftMargin=15*mm, rightMargin=15*mm, topMargin=15*mm, bottomMargin=15*mm,
+        title="Historial_AulaClass"
+    )
+    styles = getSampleStyleSheet()
+    style_normal = ParagraphStyle("normal", fontSize=8, leading=10)
+    style_header = ParagraphStyle("header", parent=styles['Heading2'], alignment=1)
+
+    story = [Paragraph("Historial de Acciones - AulaClass", style_header), Spacer(1, 10)]
+
+    data = [["Fecha", "Usuario", "Acción", "Modelo", "Objeto", "Detalle"]]
+    for fecha, usuario, accion, modelo, objeto, detalle in filas:
+        if accion == 1: act = "<font color='#166534'><b>Creación</b></font>"
+        elif accion == 2: act = "<font color='#1e40af'><b>Edición</b></font>"
+        elif accion == 3: act = "<font color='#991b1b'><b>Eliminación</b></font>"
+        else: act = "Otro"
+
+        detalle = escape(detalle or "-").replace("\n", "<br/>")
+        data.append([
+            Paragraph(fecha, style_normal),
+            Paragraph(escape(usuario), style_normal),
+            Paragraph(act, style_normal),
+            Paragraph(escape(modelo), style_normal),
+            Paragraph(escape(objeto), style_normal),
+            Paragraph(f"<font color='#4b5563'>{detalle}</font>", style_normal),
+        ])
+
+    t = Table(data, repeatRows=1, colWidths=[28*mm, 35*mm, 22*mm, 25*mm, 50*mm, 105*mm])
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#f3f4f6")),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e5e7eb")),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0,0), (-1,0), 9),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('PADDING', (0,0), (-1,-1), 4),
+    ]))
+    story.append(t)
+    doc.build(story)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+# =========================================================
+# Lotes (pool de procesos)
+# =========================================================
+def procesos_informes():
+    """Tamaño del pool: un proceso por núcleo disponible."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Windows / macOS
+        return os.cpu_count() or 1
+
+
+# Un pool por tamaño, compartido por todas las peticiones del proceso
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def _pool_informes(procesos):
+    with _lock_pools:
+        pool = _pools.get(procesos)
+        if pool is None:
+            pool = _pools[procesos] = ProcessPoolExecutor(
+                max_workers=procesos, mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+def informes_en_paralelo(lista_datos, procesos=None):
+    """
+    Genera (datos, pdf) para cada elemento, en el mismo orden, renderizando
+    en el pool de procesos. Cada par se entrega apenas está listo (y los
+    anteriores también), mientras el resto sigue en cola: sirve para
+    enviarlos en flujo. Si el consumidor se detiene, se cancela lo pendiente.
+    """
+    lista_datos = list(lista_datos)
+    procesos = procesos or procesos_informes()
+    if procesos <= 1 or len(lista_datos) <= 1:
+        for datos in lista_datos:
+            yield datos, generar_informe_pdf(datos)
+        return
+
+    pool = _pool_informes(procesos)
+    futuros = []
+    try:
+        futuros = [pool.submit(generar_informe_pdf, datos) for datos in lista_datos]
+        for datos, futuro in zip(lista_datos, futuros):
+            yield datos, futuro.result()
+    except BrokenProcessPool:
+        # Murió un proceso del pool: se descarta y la próxima petición crea otro
+        with _lock_pools:
+            if _pools.get(procesos) is pool:
+                del _pools[procesos]
+        raise
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+
+
+# =========================================================
+# Caché en disco (direccionada por contenido, LRU por mtime)
+# =========================================================
+def clave_informe(datos):
+    """
+    Huella de todo lo que muestra el informe (notas, promedios, ranking,
+    asistencia, anotaciones) más la versión del diseño. Se excluyen las
+    fechas de generación: el PDF guardado conserva las de su primer render.
+    """
+    contenido = {k: v for k, v in datos.items() if k not in ("generado", "fecha")}
+    firma = json.dumps([VERSION_INFORME, contenido], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(firma.encode()).hexdigest()
+
+
+def _directorio_cache():
+    directorio = Path(settings.INFORMES_CACHE_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def _abrir_cacheado(ruta):
+    """El archivo abierto si está en caché (y lo marca como recién usado); None si no."""
+    try:
+        archivo = open(ruta, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+    return archivo
+
+
+# Tamaño de cada directorio de caché según este proceso: se mide al recortar
+# y se suma en cada escritura, así no se recorre el directorio por cada PDF.
+# Otros procesos también escriben; al pasar el tope se vuelve a medir.
+_tamano_cache = {}
+
+
+def _guardar(ruta, pdf, recortar=True):
+    """
+    Escritura atómica: archivo temporal en el mismo directorio y luego os.replace.
+    Con recortar=False no se revisa el tope (quien guarda un lote recorta al final).
+    """
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(pdf)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    clave = str(ruta.parent)
+    total = _tamano_cache.get(clave)
+    if total is not None:
+        _tamano_cache[clave] = total + len(pdf)
+    if recortar and (total is None or total + len(pdf) > settings.INFORMES_CACHE_MAX_BYTES):
+        recortar_cache(ruta.parent)
+
+
+def recortar_cache(directorio=None, maximo=None):
+    """Borra los PDF menos usados (mtime más antiguo) hasta que la caché quepa en el tope."""
+    directorio = Path(directorio or settings.INFORMES_CACHE_DIR)
+    maximo = settings.INFORMES_CACHE_MAX_BYTES if maximo is None else maximo
+    archivos, total = [], 0
+    for entrada in os.scandir(directorio):
+        if entrada.name.endswith(".pdf") and entrada.is_file():
+            info = entrada.stat()
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+            total += info.st_size
+    if total > maximo:
+        for _, tamano, ruta in sorted(archivos):
+            try:
+                os.remove(ruta)
+            except OSError:
+                # Otro proceso ya lo borró (o en Windows, lo tiene abierto)
+                continue
+            total -= tamano
+            if total <= maximo:
+                break
+    _tamano_cache[str(directorio)] = total
+
+
+def abrir_informe_cacheado(datos):
+    """El PDF del informe abierto si ya está en caché; None si habría que generarlo."""
+    return _abrir_cacheado(_directorio_cache() / f"{clave_informe(datos)}.pdf")
+
+
+def abrir_informe(datos):
+    """
+    Archivo abierto (binario) con el PDF del informe: el guardado en caché
+    si existe, o uno recién generado y guardado. Para FileResponse.
+    """
+    ruta = _directorio_cache() / f"{clave_informe(datos)}.pdf"
+    archivo = _abrir_cacheado(ruta)
+    if archivo is None:
+        _guardar(ruta, generar_informe_pdf(datos))
+        archivo = _abrir_cacheado(ruta)
+    return archivo
+
+
+def informes_con_cache(lista_datos, procesos=None):
+    """
+    Como informes_en_paralelo, pero los informes que ya están en caché se
+    leen del disco y solo los demás pasan por el pool (y quedan guardados).
+    """
+    lista_datos = list(lista_datos)
+    directorio = _directorio_cache()
+    rutas = [directorio / f"{clave_informe(datos)}.pdf" for datos in lista_datos]
+    guardados = []
+    for ruta in rutas:
+        archivo = _abrir_cacheado(ruta)
+        if archivo is not None:
+            with archivo:
+                guardados.append(archivo.read())
+        else:
+            guardados.append(None)
+
+    faltantes = informes_en_paralelo(
+        [datos for datos, pdf in zip(lista_datos, guardados) if pdf is None], procesos
+    )
+    try:
+        for datos, ruta, pdf in zip(lista_datos, rutas, guardados):
+            if pdf is None:
+                _, pdf = next(faltantes)
+                _guardar(ruta, pdf, recortar=False)
+            yield datos, pdf
+    finally:
+        faltantes.close()
+        # Un solo recorrido del directorio por lote, no uno por PDF nuevo
+        if any(pdf is None for pdf in guardados):
+            recortar_cache(directorio)
@@ -0,0 +1,525 @@
+# =========================================================
+# Servicios de Asistencia
+# =========================================================
+import calendar
+from datetime import date
+
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .asistencia_compacta import reconstruir_compacta, sincronizar_compacta
+from .models import (
+    Alumno, Asistencia, Curso, ResumenAsistencia, SincronizacionAsistencia, VersionAsistenciaDia
+)
+
+ESTADOS_VALIDOS = {valor for valor, _ in Asistencia.ESTADOS}
+
+# Campo de ResumenAsistencia que suma cada estado
+CONTADOR_POR_ESTADO = {"Presente": "presentes", "Ausente": "ausentes", "Justificado": "justificados"}
+
+# Tope de registros por lote del endpoint de sincronización
+MAX_REGISTROS_SINCRONIZACION = 2000
+
+# Código de una letra para la planilla mensual
+CODIGOS_ESTADO = {"Presente": "P", "Ausente": "A", "Justificado": "J"}
+
+
+# =========================================================
+# Guardado masivo (upsert)
+# =========================================================
+def guardar_registros_asistencia(registros, con_detalle=False):
+    """
+    Guarda un lote de asistencias con un único upsert masivo.
+    registros: iterable de tuplas (alumno_id, curso_id, fecha, estado).
+    Devuelve {"creados", "actualizados", "sin_cambios"}; con con_detalle=True
+    agrega "detalle": {(alumno_id, curso_id, fecha): "creado" | "actualizado" | "sin_cambios"}.
+    """
+    # Si un mismo alumno/curso/día viene repetido, gana el último valor
+    pendientes = {}
+    for alumno_id, curso_id, fecha, estado in registros:
+        if estado not in ESTADOS_VALIDOS:
+            raise ValueError(f"Estado de asistencia inválido: {estado!r}")
+        pendientes[(int(alumno_id), int(curso_id), fecha)] = estado
+
+    resultado = {"creados": 0, "actualizados": 0, "sin_cambios": 0}
+    detalle = {}
+    if con_detalle:
+        resultado["detalle"] = detalle
+    if not pendientes:
+        return resultado
+
+    alumno_ids = {a for a, _, _ in pendientes}
+    curso_ids = {c for _, c, _ in pendientes}
+    fechas = {f for _, _, f in pendientes}
+
+    with transaction.atomic():
+        # Bloquea los contadores de los alumnos del lote: dos guardados
+        # simultáneos del mismo curso se serializan y no duplican deltas
+        resumenes = _bloquear_resumenes({(a, c) for a, c, _ in pendientes})
+
+        # 1 query: estado actual de todo el lote
+        existentes = {
+            (a, c, f): e
+            for a, c, f, e in Asistencia.objects.filter(
+                alumno_id__in=alumno_ids,
+                curso_id__in=curso_ids,
+                fecha__in=fechas,
+            ).values_list("alumno_id", "curso_id", "fecha", "estado")
+        }
+
+        a_escribir = []
+        for (alumno_id, curso_id, fecha), estado in pendientes.items():
+            anterior = existentes.get((alumno_id, curso_id, fecha))
+            if anterior is None:
+                resultado["creados"] += 1
+                detalle[(alumno_id, curso_id, fecha)] = "creado"
+            elif anterior == estado:
+                resultado["sin_cambios"] += 1
+                detalle[(alumno_id, curso_id, fecha)] = "sin_cambios"
+                continue
+            else:
+                resultado["actualizados"] += 1
+                detalle[(alumno_id, curso_id, fecha)] = "actualizado"
+            a_escribir.append(
+                Asistencia(alumno_id=alumno_id, curso_id=curso_id, fecha=fecha, estado=estado)
+            )
+            _aplicar_delta(resumenes[(alumno_id, curso_id)], fecha, anterior, estado)
+
+        # 1 query: INSERT ... ON CONFLICT DO UPDATE solo con lo que cambió
+        if a_escribir:
+            Asistencia.objects.bulk_create(
+                a_escribir,
+                update_conflicts=True,
+                unique_fields=["alumno", "curso", "fecha"],
+                update_fields=["estado"],
+            )
+
+            # Misma transacción: representación compacta por mes y contadores
+            sincronizar_compacta(
+                (a.alumno_id, a.curso_id, a.fecha, a.estado) for a in a_escribir
+            )
+            ResumenAsistencia.objects.bulk_update(
+                {(a.alumno_id, a.curso_id): resumenes[(a.alumno_id, a.curso_id)] for a in a_escribir}.values(),
+                ["presentes", "ausentes", "justificados", "primera_fecha", "ultima_fecha", "actualizado"],
+            )
+            marcar_cambio_asistencia(a.fecha for a in a_escribir)
+
+    return resultado
+
+
+def guardar_asistencia_curso(curso, fecha, estados):
+    """
+    Guarda la asistencia de un curso para una fecha.
+    estados: dict {alumno_id: estado}.
+    """
+    return guardar_registros_asistencia(
+        (alumno_id, curso.id, fecha, estado) for alumno_id, estado in estados.items()
+    )
+
+
+# =========================================================
+# Sincronización por lotes (clientes con conexión inestable)
+# =========================================================
+def _validar_registro_sincronizacion(registro, hoy):
+    """Devuelve (alumno_id, curso_id, fecha, estado) o lanza ValueError con el motivo."""
+    if not isinstance(registro, dict):
+        raise ValueError("Registro con formato inválido.")
+    try:
+        alumno_id = int(registro.get("alumno"))
+        curso_id = int(registro.get("curso"))
+    except (TypeError, ValueError):
+        raise ValueError("Alumno o curso inválido.")
+    try:
+        fecha = date.fromisoformat(str(registro.get("fecha")))
+    except ValueError:
+        raise ValueError("Fecha inválida (formato AAAA-MM-DD).")
+    if fecha > hoy:
+        raise ValueError("No se puede registrar asistencia en una fecha futura.")
+    estado = registro.get("estado")
+    if estado not in ESTADOS_VALIDOS:
+        raise ValueError(f"Estado inválido: {estado!r}.")
+    return alumno_id, curso_id, fecha, estado
+
+
+def _respuesta_guardada(sincronizacion, usuario):
+    if sincronizacion.usuario_id != usuario.id:
+        raise PermissionDenied("El token de sincronización pertenece a otro usuario.")
+    return sincronizacion.respuesta, True
+
+
+def sincronizar_lote_asistencia(usuario, token, registros):
+    """
+    Aplica un lote de asistencia (varios cursos y fechas) con un único upsert.
+    registros: lista de dicts {"curso", "alumno", "fecha", "estado"}.
+    Idempotente por token: si el lote ya se aplicó se devuelve la respuesta guardada.
+    Devuelve (respuesta, repetido).
+    """
+    previa = SincronizacionAsistencia.objects.filter(token=token).first()
+    if previa is not None:
+        return _respuesta_guardada(previa, usuario)
+
+    hoy = timezone.localdate()
+    resultados = []
+    validos = []
+    for indice, registro in enumerate(registros):
+        try:
+            validos.append((indice, _validar_registro_sincronizacion(registro, hoy)))
+        except ValueError as e:
+            resultados.append({"indice": indice, "resultado": "rechazado", "error": str(e)})
+
+    # 1 query: curso actual de cada alumno del lote
+    curso_de = dict(
+        Alumno.objects
+        .filter(id__in={r[0] for _, r in validos})
+        .values_list("id", "curso_id")
+    )
+    aceptados = []
+    for indice, registro in validos:
+        if curso_de.get(registro[0]) != registro[1]:
+            resultados.append({
+                "indice": indice, "resultado": "rechazado",
+                "error": "El alumno no pertenece al curso.",
+            })
+        else:
+            aceptados.append((indice, registro))
+
+    try:
+        with transaction.atomic():
+            guardado = guardar_registros_asistencia(
+                (registro for _, registro in aceptados), con_detalle=True
+            )
+            for indice, (alumno_id, curso_id, fecha, _) in aceptados:
+                resultados.append({
+                    "indice": indice,
+                    "resultado": guardado["detalle"][(alumno_id, curso_id, fecha)],
+                })
+            resultados.sort(key=lambda r: r["indice"])
+
+            respuesta = {
+                "token": token,
+                "creados": guardado["creados"],
+                "actualizados": guardado["actualizados"],
+                "sin_cambios": guardado["sin_cambios"],
+                "rechazados": len(registros) - len(aceptados),
+                "resultados": resultados,
+            }
+            SincronizacionAsistencia.objects.create(token=token, usuario=usuario, respuesta=respuesta)
+    except IntegrityError:
+        # Un reenvío simultáneo con el mismo token se confirmó primero: este se descarta entero
+        return _respuesta_guardada(SincronizacionAsistencia.objects.get(token=token), usuario)
+
+    return respuesta, False
+
+
+# =========================================================
+# Contadores por alumno (ResumenAsistencia)
+# =========================================================
+def _bloquear_resumenes(pares):
+    """
+    Asegura que exista un ResumenAsistencia por (alumno_id, curso_id) y los
+    bloquea con SELECT ... FOR UPDATE. Devuelve {(alumno_id, curso_id): resumen}.
+    """
+    ResumenAsistencia.objects.bulk_create(
+        [ResumenAsistencia(alumno_id=a, curso_id=c) for a, c in pares],
+        ignore_conflicts=True,
+    )
+    bloqueados = ResumenAsistencia.objects.select_for_update().filter(
+        alumno_id__in={a for a, _ in pares},
+        curso_id__in={c for _, c in pares},
+    )
+    return {(r.alumno_id, r.curso_id): r for r in bloqueados}
+
+
+def _aplicar_delta(resumen, fecha, anterior, nuevo):
+    """Ajusta los contadores en memoria por un cambio de estado."""
+    if anterior in CONTADOR_POR_ESTADO:
+        campo = CONTADOR_POR_ESTADO[anterior]
+        setattr(resumen, campo, getattr(resumen, campo) - 1)
+    campo = CONTADOR_POR_ESTADO[nuevo]
+    setattr(resumen, campo, getattr(resumen, campo) + 1)
+
+    if resumen.primera_fecha is None or fecha < resumen.primera_fecha:
+        resumen.primera_fecha = fecha
+    if resumen.ultima_fecha is None or fecha > resumen.ultima_fecha:
+        resumen.ultima_fecha = fecha
+    # bulk_update no aplica auto_now
+    resumen.actualizado = timezone.now()
+
+
+def reconstruir_resumenes(alumno_ids=None):
+    """
+    Recalcula ResumenAsistencia desde cero con un GROUP BY (alumno, curso).
+    Devuelve la cantidad de resúmenes escritos.
+    """
+    asistencias = Asistencia.objects.all()
+    resumenes = ResumenAsistencia.objects.all()
+    if alumno_ids is not None:
+        asistencias = asistencias.filter(alumno_id__in=alumno_ids)
+        resumenes = resumenes.filter(alumno_id__in=alumno_ids)
+
+    filas = (
+        asistencias
+        .values("alumno_id", "curso_id")
+        .annotate(
+            presentes=Count("id", filter=Q(estado="Presente")),
+            ausentes=Count("id", filter=Q(estado="Ausente")),
+            justificados=Count("id", filter=Q(estado="Justificado")),
+            primera=Min("fecha"),
+            ultima=Max("fecha"),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        resumenes.delete()
+        creados = ResumenAsistencia.objects.bulk_create(
+            [
+                ResumenAsistencia(
+                    alumno_id=f["alumno_id"],
+                    curso_id=f["curso_id"],
+                    presentes=f["presentes"],
+                    ausentes=f["ausentes"],
+                    justificados=f["justificados"],
+                    primera_fecha=f["primera"],
+                    ultima_fecha=f["ultima"],
+                )
+                for f in filas
+            ],
+            batch_size=1000,
+        )
+    return len(creados)
+
+
+def resincronizar_alumnos(alumno_ids, fechas=()):
+    """
+    Recalcula las tablas derivadas de asistencia de algunos alumnos (ediciones desde el admin).
+    fechas: días tocados, para avisar al panel en vivo.
+    """
+    alumno_ids = [a for a in alumno_ids if a is not None]
+    with transaction.atomic():
+        reconstruir_compacta(alumno_ids=alumno_ids)
+        reconstruir_resumenes(alumno_ids=alumno_ids)
+        marcar_cambio_asistencia(f for f in fechas if f is not None)
+
+
+def totales_asistencia(alumno, curso=None):
+    """
+    Lee los contadores de un alumno (una fila por curso) sin tocar Asistencia.
+    Devuelve {"presentes", "ausentes", "justificados", "total", "porcentaje", "inicio", "fin"}.
+    """
+    qs = ResumenAsistencia.objects.filter(alumno=alumno)
+    if curso is not None:
+        qs = qs.filter(curso=curso)
+
+    totales = {"presentes": 0, "ausentes": 0, "justificados": 0, "inicio": None, "fin": None}
+    for r in qs:
+        totales["presentes"] += r.presentes
+        totales["ausentes"] += r.ausentes
+        totales["justificados"] += r.justificados
+        if r.primera_fecha and (totales["inicio"] is None or r.primera_fecha < totales["inicio"]):
+            totales["inicio"] = r.primera_fecha
+        if r.ultima_fecha and (totales["fin"] is None or r.ultima_fecha > totales["fin"]):
+            totales["fin"] = r.ultima_fecha
+
+    total = totales["presentes"] + totales["ausentes"] + totales["justificados"]
+    totales["total"] = total
+    totales["porcentaje"] = round(totales["presentes"] / total * 100, 1) if total else 0.0
+    return totales
+
+
+# =========================================================
+# Panel en vivo de inspectoría (versión por día)
+# =========================================================
+def marcar_cambio_asistencia(fechas):
+    """Sube la versión de cada fecha tocada; se llama dentro de la transacción del guardado."""
+    fechas = set(fechas)
+    if not fechas:
+        return
+    VersionAsistenciaDia.objects.bulk_create(
+        [VersionAsistenciaDia(fecha=f) for f in fechas], ignore_conflicts=True
+    )
+    VersionAsistenciaDia.objects.filter(fecha__in=fechas).update(version=F("version") + 1)
+
+
+def version_asistencia_dia(fecha):
+    return (
+        VersionAsistenciaDia.objects.filter(fecha=fecha).values_list("version", flat=True).first() or 0
+    )
+
+
+def avance_asistencia(fecha):
+    """
+    Estado de cada curso para una fecha con UNA query agregada:
+    alumnos del curso, alumnos con registro ese día y estado
+    "completo", "parcial" o "faltante". Omite cursos sin alumnos.
+    """
+    alumnos = (
+        Alumno.objects.filter(curso=OuterRef("pk"))
+        .order_by().values("curso").annotate(n=Count("id")).values("n")
+    )
+    registrados = (
+        Asistencia.objects.filter(curso=OuterRef("pk"), fecha=fecha, alumno__curso=OuterRef("pk"))
+        .order_by().values("curso").annotate(n=Count("id")).values("n")
+    )
+    cursos = (
+        Curso.objects
+        .annotate(
+            num_alumnos=Coalesce(Subquery(alumnos), 0),
+            registrados=Coalesce(Subquery(registrados), 0),
+        )
+        .filter(num_alumnos__gt=0)
+        .order_by("año", "nombre")
+        .values("id", "año", "nombre", "num_alumnos", "registrados")
+    )
+
+    filas = []
+    for c in cursos:
+        if c["registrados"] >= c["num_alumnos"]:
+            estado = "completo"
+        elif c["registrados"]:
+            estado = "parcial"
+        else:
+            estado = "faltante"
+        filas.append({
+            "id": c["id"],
+            "año": c["año"],
+            "nombre": c["nombre"],
+            "alumnos": c["num_alumnos"],
+            "registrados": c["registrados"],
+            "estado": estado,
+        })
+    return filas
+
+
+def avance_asistencia_cacheado(fecha, segundos=60):
+    """
+    avance_asistencia con caché corta. La clave incluye la versión del día:
+    cualquier guardado de asistencia la cambia y la entrada anterior deja de usarse.
+    """
+    version = version_asistencia_dia(fecha)
+    return cache.get_or_set(
+        f"avance_asistencia:{fecha.isoformat()}:{version}",
+        lambda: avance_asistencia(fecha),
+        segundos,
+    )
+
+
+def panel_ausencias(fecha, version=0):
+    """
+    Foto del día para inspectoría con 2 queries: avance de cada curso
+    y ausentes/justificados. Devuelve un dict serializable a JSON.
+    """
+    ausencias = {}
+    for a in (
+        Asistencia.objects
+        .filter(fecha=fecha, estado__in=["Ausente", "Justificado"])
+        .select_related("alumno")
+        .order_by("alumno__apellidos", "alumno__nombres")
+    ):
+        ausencias.setdefault(a.curso_id, []).append({
+            "nombre": f"{a.alumno.apellidos}, {a.alumno.nombres}",
+            "rut": a.alumno.rut,
+            "estado": a.estado,
+        })
+
+    filas, sin_asistencia = [], []
+    for curso in avance_asistencia(fecha):
+        fila = {**curso, "ausencias": ausencias.get(curso["id"], [])}
+        if curso["estado"] == "faltante":
+            sin_asistencia.append(fila)
+        else:
+            filas.append(fila)
+
+    return {
+        "fecha": fecha.isoformat(),
+        "version": version,
+        "generado": timezone.localtime().strftime("%H:%M:%S"),
+        "total_ausentes": sum(
+            1 for lista in ausencias.values() for a in lista if a["estado"] == "Ausente"
+        ),
+        "total_justificados": sum(
+            1 for lista in ausencias.values() for a in lista if a["estado"] == "Justificado"
+        ),
+        "cursos": filas,
+        "sin_asistencia": sin_asistencia,
+    }
+
+
+# =========================================================
+# Planilla mensual (alumnos × días)
+# =========================================================
+def construir_grilla_mensual(curso, anio, mes):
+    """
+    Arma la planilla mensual de un curso con UNA query sobre Asistencia.
+    Columnas: días hábiles del mes más cualquier día con registros.
+    Celdas: 'P', 'A', 'J' o '' (sin registro).
+    """
+    ultimo_dia = calendar.monthrange(anio, mes)[1]
+    inicio = date(anio, mes, 1)
+    fin = date(anio, mes, ultimo_dia)
+
+    registros = list(
+        Asistencia.objects
+        .filter(curso=curso, fecha__range=(inicio, fin))
+        .values_list("alumno_id", "fecha", "estado")
+    )
+
+    dias_con_registro = {fecha for _, fecha, _ in registros}
+    dias = [
+        date(anio, mes, d) for d in range(1, ultimo_dia + 1)
+        if date(anio, mes, d).weekday() < 5 or date(anio, mes, d) in dias_con_registro
+    ]
+    indice_dia = {d: i for i, d in enumerate(dias)}
+
+    # Pivot compacto: alumno_id -> lista de códigos por posición de día
+    celdas = {}
+    for alumno_id, fecha, estado in registros:
+        fila = celdas.setdefault(alumno_id, [""] * len(dias))
+        fila[indice_dia[fecha]] = CODIGOS_ESTADO.get(estado, "")
+
+    presentes_dia = [0] * len(dias)
+    registrados_dia = [0] * len(dias)
+
+    filas = []
+    for alumno in Alumno.objects.filter(curso=curso).order_by("apellidos", "nombres"):
+        fila = celdas.get(alumno.id, [""] * len(dias))
+        conteo = {"P": 0, "A": 0, "J": 0}
+        for i, codigo in enumerate(fila):
+            if codigo:
+                conteo[codigo] += 1
+                registrados_dia[i] += 1
+                if codigo == "P":
+                    presentes_dia[i] += 1
+        registrados = conteo["P"] + conteo["A"] + conteo["J"]
+        filas.append({
+            "alumno": alumno,
+            "celdas": fila,
+            "presentes": conteo["P"],
+            "ausentes": conteo["A"],
+            "justificados": conteo["J"],
+            "porcentaje": round(conteo["P"] / registrados * 100, 1) if registrados else None,
+        })
+
+    totales_dia = [
+        {
+            "presentes": presentes_dia[i],
+            "registrados": registrados_dia[i],
+            "porcentaje": round(presentes_dia[i] / registrados_dia[i] * 100, 1) if registrados_dia[i] else None,
+        }
+        for i in range(len(dias))
+    ]
+
+    total_presentes = sum(presentes_dia)
+    total_registrados = sum(registrados_dia)
+    return {
+        "dias": dias,
+        "filas": filas,
+        "totales_dia": totales_dia,
+        "total_presentes": total_presentes,
+        "total_registrados": total_registrados,
+        "porcentaje_mes": round(total_presentes / total_registrados * 100, 1) if total_registrados else None,
+    }
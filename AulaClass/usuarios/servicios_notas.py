@@ -0,0 +1,851 @@
+# =========================================================
+# Servicios de Notas
+# =========================================================
+import hashlib
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max, Q, Sum, Window
+from django.db.models.functions import PercentRank, Rank
+from django.utils import timezone
+
+from .matriz_notas import MatrizNotas, a_valor, promedio_decimas
+from .models import (
+    Alumno, Anotacion, Asignatura, Curso, Evaluacion, HistorialNota, Nota, PromedioAlumnoAsignatura,
+    ResumenAsistencia
+)
+
+NOTA_MINIMA = 1.0
+NOTA_MAXIMA = 7.0
+
+# Tope de celdas por petición de autoguardado
+MAX_CELDAS_AUTOGUARDADO = 50
+
+
+class ConflictoNotas(Exception):
+    """Una o más celdas cambiaron desde que el cliente las leyó."""
+    def __init__(self, conflictos):
+        super().__init__("Las notas fueron modificadas por otra persona.")
+        self.conflictos = conflictos
+
+
+def version_nota(nota):
+    """Token de versión de una celda: su ultima_actualizacion en ISO 8601."""
+    return nota.ultima_actualizacion.isoformat() if nota is not None else None
+
+
+def entrada_historial(nota, anterior, nueva, usuario, origen):
+    """
+    Fila de HistorialNota para una celda; cada guardado las inserta todas
+    juntas con un solo bulk_create.
+    """
+    return HistorialNota(
+        nota_id=nota.pk,
+        alumno_id=nota.alumno_id,
+        asignatura_id=nota.asignatura_id,
+        evaluacion_id=nota.evaluacion_id,
+        decimas_anteriores=anterior,
+        decimas_nuevas=nueva,
+        usuario=usuario,
+        origen=origen,
+    )
+
+
+# =========================================================
+# Promedios ponderados (SQL)
+# =========================================================
+def _agregado_promedios(notas):
+    """
+    GROUP BY (alumno, asignatura) con suma ponderada, peso, cantidad y promedio.
+    Misma regla entera que MatrizNotas: (2·Σ décimas·ponderación + Σ ponderación) / (2·Σ ponderación).
+    """
+    return (
+        notas.order_by()
+        .values("alumno_id", "asignatura_id")
+        .annotate(
+            suma=Sum(F("decimas") * F("evaluacion__ponderacion")),
+            peso=Sum("evaluacion__ponderacion"),
+            cantidad=Count("id"),
+        )
+        .annotate(promedio=ExpressionWrapper(
+            (2 * F("suma") + F("peso")) / (2 * F("peso")), output_field=IntegerField()
+        ))
+    )
+
+
+def promedios_ponderados(notas):
+    """Promedio ponderado por (alumno, asignatura) en UNA query agregada. {(alumno_id, asignatura_id): decimas}."""
+    return {
+        (alumno_id, asignatura_id): promedio
+        for alumno_id, asignatura_id, promedio in _agregado_promedios(notas).values_list(
+            "alumno_id", "asignatura_id", "promedio"
+        )
+    }
+
+
+# =========================================================
+# Promedios materializados (PromedioAlumnoAsignatura)
+# =========================================================
+def actualizar_promedios(asignatura_ids, alumno_ids=None):
+    """
+    Recalcula los promedios guardados de esas asignaturas (y solo esos
+    alumnos, si se indican) con una query agregada y un upsert.
+    Se llama dentro de la transacción que escribió las notas.
+    """
+    asignatura_ids = set(asignatura_ids)
+    if not asignatura_ids or (alumno_ids is not None and not alumno_ids):
+        return
+    notas = Nota.objects.filter(asignatura_id__in=asignatura_ids)
+    guardados = PromedioAlumnoAsignatura.objects.filter(asignatura_id__in=asignatura_ids)
+    if alumno_ids is not None:
+        notas = notas.filter(alumno_id__in=alumno_ids)
+        guardados = guardados.filter(alumno_id__in=alumno_ids)
+
+    with transaction.atomic():
+        # Bloquear primero (como ResumenAsistencia): dos guardados del mismo alumno
+        # se serializan y el segundo recalcula viendo las notas del primero
+        if alumno_ids is not None:
+            PromedioAlumnoAsignatura.objects.bulk_create(
+                [
+                    PromedioAlumnoAsignatura(alumno_id=alumno_id, asignatura_id=asignatura_id)
+                    for alumno_id in alumno_ids for asignatura_id in asignatura_ids
+                ],
+                ignore_conflicts=True,
+            )
+        bloqueados = {
+            (p.alumno_id, p.asignatura_id): p.pk for p in guardados.select_for_update().only("pk", "alumno", "asignatura")
+        }
+
+        filas = list(_agregado_promedios(notas))
+        vigentes = {(f["alumno_id"], f["asignatura_id"]) for f in filas}
+        # Alumnos que ya no tienen notas en la asignatura
+        sobrantes = [pk for clave, pk in bloqueados.items() if clave not in vigentes]
+        if sobrantes:
+            PromedioAlumnoAsignatura.objects.filter(pk__in=sobrantes).delete()
+        if filas:
+            ahora = timezone.now()
+            PromedioAlumnoAsignatura.objects.bulk_create(
+                [_promedio_desde_fila(f, ahora) for f in filas],
+                update_conflicts=True,
+                unique_fields=["alumno", "asignatura"],
+                update_fields=["suma", "peso", "cantidad", "decimas", "actualizado"],
+                batch_size=1000,
+            )
+
+
+def _promedio_desde_fila(fila, ahora=None):
+    return PromedioAlumnoAsignatura(
+        alumno_id=fila["alumno_id"],
+        asignatura_id=fila["asignatura_id"],
+        suma=fila["suma"],
+        peso=fila["peso"],
+        cantidad=fila["cantidad"],
+        decimas=fila["promedio"],
+        actualizado=ahora or timezone.now(),
+    )
+
+
+def reconstruir_promedios(alumno_ids=None):
+    """
+    Recalcula PromedioAlumnoAsignatura desde cero con un GROUP BY (alumno, asignatura).
+    Devuelve la cantidad de promedios escritos.
+    """
+    notas = Nota.objects.all()
+    guardados = PromedioAlumnoAsignatura.objects.all()
+    if alumno_ids is not None:
+        notas = notas.filter(alumno_id__in=alumno_ids)
+        guardados = guardados.filter(alumno_id__in=alumno_ids)
+
+    with transaction.atomic():
+        guardados.delete()
+        ahora = timezone.now()
+        creados = PromedioAlumnoAsignatura.objects.bulk_create(
+            [_promedio_desde_fila(f, ahora) for f in _agregado_promedios(notas).iterator(chunk_size=2000)],
+            batch_size=1000,
+        )
+    return len(creados)
+
+
+def verificar_promedios(alumno_ids=None):
+    """
+    Compara los promedios guardados con los recalculados desde Nota.
+    Devuelve una lista de diferencias {"alumno", "asignatura", "guardado", "calculado"}
+    (None donde falta la fila); lista vacía = consistente.
+    """
+    notas = Nota.objects.all()
+    guardados = PromedioAlumnoAsignatura.objects.all()
+    if alumno_ids is not None:
+        notas = notas.filter(alumno_id__in=alumno_ids)
+        guardados = guardados.filter(alumno_id__in=alumno_ids)
+
+    campos = ("suma", "peso", "cantidad", "decimas")
+    calculados = {
+        (f["alumno_id"], f["asignatura_id"]): (f["suma"], f["peso"], f["cantidad"], f["promedio"])
+        for f in _agregado_promedios(notas).iterator(chunk_size=2000)
+    }
+    actuales = {
+        (alumno_id, asignatura_id): valores
+        for alumno_id, asignatura_id, *valores in guardados.values_list(
+            "alumno_id", "asignatura_id", *campos
+        ).iterator(chunk_size=2000)
+    }
+
+    diferencias = []
+    for clave in sorted(calculados.keys() | actuales.keys()):
+        guardado = tuple(actuales[clave]) if clave in actuales else None
+        calculado = calculados.get(clave)
+        if guardado != calculado:
+            diferencias.append({
+                "alumno": clave[0],
+                "asignatura": clave[1],
+                "guardado": dict(zip(campos, guardado)) if guardado else None,
+                "calculado": dict(zip(campos, calculado)) if calculado else None,
+            })
+    return diferencias
+
+
+def promedios_guardados(alumno_ids=None, asignatura_ids=None):
+    """Lectura indexada de los promedios materializados. {(alumno_id, asignatura_id): decimas}."""
+    qs = PromedioAlumnoAsignatura.objects.filter(cantidad__gt=0)
+    if alumno_ids is not None:
+        qs = qs.filter(alumno_id__in=alumno_ids)
+    if asignatura_ids is not None:
+        qs = qs.filter(asignatura_id__in=asignatura_ids)
+    return {
+        (alumno_id, asignatura_id): decimas
+        for alumno_id, asignatura_id, decimas in qs.values_list("alumno_id", "asignatura_id", "decimas")
+    }
+
+
+def promedio_de_promedios(promedios):
+    """Promedio (décimas) de varios promedios de asignatura, con la regla entera; 0 si no hay."""
+    promedios = [p for p in promedios if p]
+    return promedio_decimas(sum(promedios), len(promedios)) if promedios else 0
+
+
+def promedios_alumnos(asignatura, alumno_ids):
+    """Promedio de cada alumno en la asignatura (lectura indexada). {alumno_id: promedio | None}."""
+    promedios = promedios_guardados(alumno_ids=alumno_ids, asignatura_ids=[asignatura.id])
+    return {alumno_id: a_valor(promedios.get((alumno_id, asignatura.id))) for alumno_id in alumno_ids}
+
+
+# =========================================================
+# Sábana de notas (curso completo)
+# =========================================================
+def sabana_curso(curso):
+    """
+    Alumnos del curso × promedios de todas sus asignaturas, más promedio
+    general, % de asistencia y puesto/percentil (ver ranking_curso).
+    Siempre 3 queries (asignaturas, alumnos con su resumen de asistencia,
+    promedios materializados) más las 3 del ranking, sin importar cuántos
+    alumnos o asignaturas tenga el curso.
+    """
+    asignaturas = list(Asignatura.objects.filter(curso=curso).order_by("nombre"))
+    alumnos = list(
+        Alumno.objects.filter(curso=curso)
+        .annotate(
+            asist_presentes=Sum("resumenes_asistencia__presentes", filter=Q(resumenes_asistencia__curso=curso)),
+            asist_total=Sum(
+                F("resumenes_asistencia__presentes")
+                + F("resumenes_asistencia__ausentes")
+                + F("resumenes_asistencia__justificados"),
+                filter=Q(resumenes_asistencia__curso=curso),
+            ),
+        )
+        .order_by("apellidos", "nombres")
+    )
+    promedios = promedios_guardados(
+        alumno_ids=[a.id for a in alumnos], asignatura_ids=[a.id for a in asignaturas]
+    ) if alumnos and asignaturas else {}
+    ranking = ranking_curso(curso)
+
+    filas, generales = [], []
+    for alumno in alumnos:
+        decimas = [promedios.get((alumno.id, asignatura.id), 0) for asignatura in asignaturas]
+        generales.append(promedio_de_promedios(decimas))
+        total = alumno.asist_total or 0
+        filas.append({
+            "alumno": alumno,
+            "celdas": [
+                {"valor": a_valor(d), "posicion": ranking["asignaturas"].get((alumno.id, asignatura.id))}
+                for d, asignatura in zip(decimas, asignaturas)
+            ],
+            "general": a_valor(generales[-1]),
+            "posicion": ranking["general"].get(alumno.id),
+            "asistencia": round(alumno.asist_presentes * 100 / total, 1) if total else None,
+        })
+
+    por_asignatura = [
+        promedio_de_promedios(promedios.get((alumno.id, asignatura.id), 0) for alumno in alumnos)
+        for asignatura in asignaturas
+    ]
+    return {
+        "asignaturas": asignaturas,
+        "filas": filas,
+        "promedios_curso": [a_valor(d) for d in por_asignatura],
+        "general_curso": a_valor(promedio_de_promedios(generales)),
+    }
+
+
+# =========================================================
+# Rankings (funciones de ventana en SQL)
+# =========================================================
+def clave_nivel(nombre_curso):
+    """'7° Básico A' -> '7° básico': el nivel es el nombre del curso sin la letra de sección."""
+    return re.sub(r"\s+[a-z]$", "", nombre_curso.strip().lower())
+
+
+def cursos_del_nivel(curso):
+    """Ids de los cursos del mismo año y nivel (incluido el propio)."""
+    nivel = clave_nivel(curso.nombre)
+    return [
+        curso_id
+        for curso_id, nombre in Curso.objects.filter(año=curso.año).values_list("id", "nombre")
+        if clave_nivel(nombre) == nivel
+    ]
+
+
+def _posiciones(particion_curso, particion_nivel, orden):
+    """RANK (1 = mejor), PERCENT_RANK (0–1, 1 = mejor) y tamaño de cada partición, en el curso y en el nivel."""
+    columnas = {}
+    for sufijo, particion in (("curso", particion_curso), ("nivel", particion_nivel)):
+        columnas[f"puesto_{sufijo}"] = Window(Rank(), partition_by=particion, order_by=orden.desc())
+        columnas[f"percentil_{sufijo}"] = Window(PercentRank(), partition_by=particion, order_by=orden.asc())
+        columnas[f"total_{sufijo}"] = Window(Count("*"), partition_by=particion)
+    return columnas
+
+
+def _posicion(fila):
+    return {
+        "puesto_curso": fila["puesto_curso"],
+        "total_curso": fila["total_curso"],
+        "percentil_curso": round(fila["percentil_curso"] * 100),
+        "puesto_nivel": fila["puesto_nivel"],
+        "total_nivel": fila["total_nivel"],
+        "percentil_nivel": round(fila["percentil_nivel"] * 100),
+    }
+
+
+def ranking_curso(curso):
+    """
+    Puesto y percentil de los alumnos del curso dentro del curso y del nivel,
+    por asignatura y en el promedio general, calculados en la base con
+    RANK() / PERCENT_RANK() sobre los promedios materializados.
+    Las asignaturas del nivel se comparan por nombre. Solo entran los
+    alumnos con notas. 3 queries: cursos del nivel, asignaturas y general.
+    Devuelve {"asignaturas": {(alumno_id, asignatura_id): posicion}, "general": {alumno_id: posicion}}.
+    """
+    nivel = cursos_del_nivel(curso)
+    # Las ventanas se calculan sobre el nivel completo; el curso se elige al leer
+    por_asignatura = (
+        PromedioAlumnoAsignatura.objects
+        .filter(asignatura__curso_id__in=nivel, alumno__curso_id__in=nivel, cantidad__gt=0)
+        .annotate(curso_id=F("asignatura__curso_id"), **_posiciones(
+            [F("asignatura_id")], [F("asignatura__nombre")], F("decimas")
+        ))
+        .values("alumno_id", "asignatura_id", "curso_id",
+                "puesto_curso", "percentil_curso", "total_curso",
+                "puesto_nivel", "percentil_nivel", "total_nivel")
+    )
+    general = (
+        PromedioAlumnoAsignatura.objects
+        .filter(asignatura__curso_id__in=nivel, alumno__curso_id__in=nivel, cantidad__gt=0)
+        .values("alumno_id", "alumno__curso_id")
+        .annotate(general=ExpressionWrapper(
+            (2 * Sum("decimas") + Count("id")) / (2 * Count("id")), output_field=IntegerField()
+        ))
+        .annotate(**_posiciones([F("alumno__curso_id")], None, F("general")))
+        .order_by()
+    )
+    return {
+        "asignaturas": {
+            (fila["alumno_id"], fila["asignatura_id"]): _posicion(fila)
+            for fila in por_asignatura if fila["curso_id"] == curso.id
+        },
+        "general": {
+            fila["alumno_id"]: _posicion(fila)
+            for fila in general if fila["alumno__curso_id"] == curso.id
+        },
+    }
+
+
+# =========================================================
+# Distribución de notas entre cursos (histogramas)
+# =========================================================
+# Límites de los tramos en décimas: 1.0–1.9, 2.0–2.9, ..., 6.0–7.0
+TRAMOS_HISTOGRAMA = (10, 20, 30, 40, 50, 60)
+ETIQUETAS_TRAMOS = ("1.0–1.9", "2.0–2.9", "3.0–3.9", "4.0–4.9", "5.0–5.9", "6.0–7.0")
+DECIMAS_APROBACION = 40
+
+
+def huella_notas():
+    """Cambia con cualquier nota creada, editada o borrada (1 query agregada)."""
+    agregado = Nota.objects.aggregate(
+        cantidad=Count("id"), suma=Sum("decimas"), ultimo=Max("id"), ultima=Max("ultima_actualizacion")
+    )
+    return hashlib.sha1(repr(tuple(agregado.values())).encode()).hexdigest()
+
+
+def _estadisticas(conteos):
+    """
+    Resumen de un histograma por décima (conteos[i] = notas con 10 + i décimas):
+    cantidad, promedio, mediana, % de reprobación (< 4.0) y los tramos.
+    """
+    total = int(conteos.sum())
+    if not total:
+        return None
+    valores = np.arange(Nota.DECIMAS_MINIMA, Nota.DECIMAS_MAXIMA + 1, dtype=np.int64)
+    acumulado = np.cumsum(conteos)
+    # La k-ésima nota (desde 0) es el primer valor cuyo acumulado supera k
+    bajo, alto = valores[np.searchsorted(acumulado, [(total - 1) // 2, total // 2], side="right")]
+    tramos = np.add.reduceat(conteos, np.array(TRAMOS_HISTOGRAMA) - Nota.DECIMAS_MINIMA)
+    mayor = int(tramos.max())
+    reprobadas = int(conteos[:DECIMAS_APROBACION - Nota.DECIMAS_MINIMA].sum())
+    return {
+        "cantidad": total,
+        "promedio": a_valor(promedio_decimas(int((valores * conteos).sum()), total)),
+        "mediana": a_valor(promedio_decimas(int(bajo + alto), 2)),
+        "reprobacion": round(reprobadas * 100 / total, 1),
+        "tramos": [
+            {
+                "etiqueta": etiqueta,
+                "cantidad": int(c),
+                "porcentaje": round(int(c) * 100 / total, 1),
+                "alto": round(int(c) * 100 / mayor),
+            }
+            for etiqueta, c in zip(ETIQUETAS_TRAMOS, tramos)
+        ],
+    }
+
+
+def distribucion_notas():
+    """
+    Histogramas de todas las notas por asignatura (por nombre) y nivel,
+    con el detalle de cada curso del nivel. Una query agrupada por
+    (asignatura, curso, décimas); lo demás se calcula con NumPy.
+    Brecha: diferencia entre el mejor y el peor curso del nivel en
+    promedio y en % de reprobación.
+    """
+    registros = list(
+        Nota.objects.order_by()
+        .values("asignatura__nombre", "asignatura__curso_id", "asignatura__curso__nombre",
+                "asignatura__curso__año", "decimas")
+        .annotate(cantidad=Count("id"))
+        .values_list("asignatura__nombre", "asignatura__curso_id", "asignatura__curso__nombre",
+                     "asignatura__curso__año", "decimas", "cantidad")
+    )
+
+    # Una fila del arreglo por (asignatura, curso); una columna por décima
+    secciones = {}
+    for nombre, curso_id, curso_nombre, año, _, _ in registros:
+        secciones.setdefault((nombre, curso_id), (len(secciones), curso_nombre, año))
+    conteos = np.zeros((len(secciones), Nota.DECIMAS_MAXIMA - Nota.DECIMAS_MINIMA + 1), dtype=np.int64)
+    if registros:
+        filas = np.fromiter((secciones[(r[0], r[1])][0] for r in registros), dtype=np.intp, count=len(registros))
+        columnas = np.fromiter((r[4] - Nota.DECIMAS_MINIMA for r in registros), dtype=np.intp, count=len(registros))
+        np.add.at(conteos, (filas, columnas), np.fromiter((r[5] for r in registros), dtype=np.int64, count=len(registros)))
+
+    grupos = {}
+    for (nombre, _), (fila, curso_nombre, año) in secciones.items():
+        clave = (año, clave_nivel(curso_nombre), nombre)
+        grupo = grupos.setdefault(clave, {
+            "año": año,
+            # Nombre del curso sin la letra de sección, con sus mayúsculas
+            "nivel": re.sub(r"\s+[A-Za-z]$", "", curso_nombre.strip()),
+            "asignatura": nombre,
+            "filas": [],
+            "secciones": [],
+        })
+        grupo["filas"].append(fila)
+        grupo["secciones"].append({"curso": curso_nombre, **_estadisticas(conteos[fila])})
+
+    resultado = []
+    for clave in sorted(grupos):
+        grupo = grupos[clave]
+        grupo["total"] = _estadisticas(conteos[grupo.pop("filas")].sum(axis=0))
+        grupo["secciones"].sort(key=lambda s: s["curso"])
+        promedios = [s["promedio"] for s in grupo["secciones"]]
+        reprobacion = [s["reprobacion"] for s in grupo["secciones"]]
+        grupo["brecha_promedio"] = round(max(promedios) - min(promedios), 1)
+        grupo["brecha_reprobacion"] = round(max(reprobacion) - min(reprobacion), 1)
+        resultado.append(grupo)
+    return resultado
+
+
+def distribucion_notas_cacheada(segundos=3600):
+    """
+    distribucion_notas guardada en caché bajo la huella de las notas:
+    cualquier cambio de nota genera otra clave y la entrada anterior deja de usarse.
+    """
+    return cache.get_or_set(f"distribucion_notas:{huella_notas()}", distribucion_notas, segundos)
+
+
+# =========================================================
+# Datos del informe PDF (curso completo en bloque)
+# =========================================================
+def datos_informes(curso, alumnos=None):
+    """
+    Datos para reportes_pdf.generar_informe_pdf de los alumnos indicados
+    (por defecto todo el curso, en orden de lista), leídos en bloque:
+    notas, promedios, ranking, asistencia y anotaciones con un número fijo
+    de queries, sin importar cuántos alumnos sean.
+    Devuelve una lista de dicts de tipos simples (se pueden enviar a otro proceso).
+    """
+    if alumnos is None:
+        alumnos = Alumno.objects.filter(curso=curso).order_by("apellidos", "nombres")
+    alumnos = list(alumnos)
+    ids = [a.id for a in alumnos]
+
+    matriz = MatrizNotas.cargar(alumnos, Asignatura.objects.filter(curso=curso).order_by("nombre"))
+    promedios = promedios_guardados(alumno_ids=ids, asignatura_ids=[a.id for a in matriz.asignaturas])
+    ranking = ranking_curso(curso)
+    asistencia = {
+        fila["alumno_id"]: fila
+        for fila in ResumenAsistencia.objects.filter(curso=curso, alumno_id__in=ids)
+        .values("alumno_id")
+        .annotate(
+            asistidos=Sum("presentes"), registrados=Sum(F("presentes") + F("ausentes") + F("justificados"))
+        )
+    }
+    anotaciones = defaultdict(list)
+    for anotacion in (
+        Anotacion.objects.filter(alumno_id__in=ids).select_related("profesor").order_by("-fecha", "-id")
+    ):
+        anotaciones[anotacion.alumno_id].append((
+            anotacion.fecha.strftime("%d/%m/%Y"),
+            anotacion.profesor.get_full_name() or anotacion.profesor.username,
+            anotacion.texto,
+        ))
+
+    profesor_jefe = "Sin asignar"
+    if curso.profesor_jefe:
+        profesor_jefe = curso.profesor_jefe.get_full_name().strip() or curso.profesor_jefe.username
+    generado = timezone.localtime().strftime("%d/%m/%Y %H:%M")
+    fecha = timezone.now().strftime("%d/%m/%Y")
+
+    informes = []
+    for i, alumno in enumerate(alumnos):
+        decimas = [promedios.get((alumno.id, asignatura.id), 0) for asignatura in matriz.asignaturas]
+        presencia = asistencia.get(alumno.id)
+        informes.append({
+            "rut": alumno.rut,
+            "alumno": f"{alumno.apellidos}, {alumno.nombres}",
+            "apellidos": alumno.apellidos,
+            "curso": f"{curso.nombre} - {curso.año}",
+            "profesor_jefe": profesor_jefe,
+            "columnas": matriz.decimas.shape[2],
+            "asignaturas": [
+                {
+                    "nombre": asignatura.nombre,
+                    "notas": [int(d) for d in matriz.decimas[i, j, :len(matriz.evaluaciones[j])]],
+                    "promedio": decimas[j],
+                    "posicion": ranking["asignaturas"].get((alumno.id, asignatura.id)),
+                }
+                for j, asignatura in enumerate(matriz.asignaturas)
+            ],
+            "promedio_general": promedio_de_promedios(decimas),
+            "asistencia": (
+                round(presencia["asistidos"] / presencia["registrados"] * 100, 1)
+                if presencia and presencia["registrados"] else 0.0
+            ),
+            "posicion": ranking["general"].get(alumno.id),
+            "anotaciones": anotaciones[alumno.id],
+            "generado": generado,
+            "fecha": fecha,
+        })
+    return informes
+
+
+# =========================================================
+# Evaluaciones
+# =========================================================
+def crear_evaluacion(asignatura, nombre, fecha=None, ponderacion=1):
+    """Agrega una evaluación al final del libro (número siguiente al último)."""
+    with transaction.atomic():
+        # Bloquea la asignatura para que dos altas simultáneas no tomen el mismo número
+        Asignatura.objects.select_for_update().filter(pk=asignatura.pk).exists()
+        ultimo = asignatura.evaluaciones.aggregate(ultimo=Max("numero"))["ultimo"] or 0
+        return Evaluacion.objects.create(
+            asignatura=asignatura,
+            numero=ultimo + 1,
+            nombre=nombre,
+            fecha=fecha,
+            ponderacion=ponderacion,
+        )
+
+
+# =========================================================
+# Lectura del formulario
+# =========================================================
+def leer_celdas_libro(datos, alumno_ids, evaluacion_ids):
+    """
+    Extrae las celdas nota_{alumno_id}_{evaluacion_id} del POST.
+    Solo acepta alumnos del curso y evaluaciones de la asignatura; los valores
+    vacíos, no numéricos o fuera de 1.0–7.0 se ignoran (igual que antes).
+    Devuelve {(alumno_id, evaluacion_id): decimas}.
+    """
+    alumno_ids = set(alumno_ids)
+    evaluacion_ids = set(evaluacion_ids)
+    celdas = {}
+    for clave, valor in datos.items():
+        if not clave.startswith("nota_"):
+            continue
+        partes = clave.split("_")
+        if len(partes) != 3:
+            continue
+        try:
+            alumno_id, evaluacion_id = int(partes[1]), int(partes[2])
+            nota = float(valor.strip().replace(",", "."))
+        except ValueError:
+            continue
+        if alumno_id not in alumno_ids or evaluacion_id not in evaluacion_ids:
+            continue
+        if not (NOTA_MINIMA <= nota <= NOTA_MAXIMA):
+            continue
+        celdas[(alumno_id, evaluacion_id)] = Nota.a_decimas(nota)
+    return celdas
+
+
+# =========================================================
+# Guardado por diferencias
+# =========================================================
+def guardar_libro_notas(asignatura, celdas, profesor):
+    """
+    Guarda solo las celdas que cambiaron: 1 lectura de la matriz actual,
+    1 bulk_create para las nuevas y 1 bulk_update para las modificadas,
+    todo en una transacción. Las notas sin cambios no se tocan
+    (conservan su ultima_actualizacion y su profesor).
+    Devuelve {"creadas", "actualizadas", "sin_cambios"}.
+    """
+    resultado = {"creadas": 0, "actualizadas": 0, "sin_cambios": 0}
+    if not celdas:
+        return resultado
+
+    with transaction.atomic():
+        actuales = {
+            (n.alumno_id, n.evaluacion_id): n
+            for n in Nota.objects.select_for_update().filter(
+                asignatura=asignatura,
+                alumno_id__in={alumno_id for alumno_id, _ in celdas},
+            )
+        }
+
+        nuevas, modificadas, historial = [], [], []
+        ahora = timezone.now()
+        for (alumno_id, evaluacion_id), decimas in celdas.items():
+            nota = actuales.get((alumno_id, evaluacion_id))
+            if nota is None:
+                nuevas.append(Nota(
+                    alumno_id=alumno_id,
+                    asignatura=asignatura,
+                    evaluacion_id=evaluacion_id,
+                    decimas=decimas,
+                    profesor=profesor,
+                ))
+            elif nota.decimas != decimas:
+                historial.append(entrada_historial(nota, nota.decimas, decimas, profesor, HistorialNota.ORIGEN_LIBRO))
+                nota.decimas = decimas
+                nota.profesor = profesor
+                # bulk_update no aplica auto_now
+                nota.ultima_actualizacion = ahora
+                modificadas.append(nota)
+            else:
+                resultado["sin_cambios"] += 1
+
+        if nuevas:
+            Nota.objects.bulk_create(nuevas)
+            historial += [
+                entrada_historial(n, None, n.decimas, profesor, HistorialNota.ORIGEN_LIBRO) for n in nuevas
+            ]
+        if modificadas:
+            Nota.objects.bulk_update(modificadas, ["decimas", "profesor", "ultima_actualizacion"])
+        if historial:
+            HistorialNota.objects.bulk_create(historial)
+        actualizar_promedios(
+            [asignatura.id], {n.alumno_id for n in nuevas} | {n.alumno_id for n in modificadas}
+        )
+
+    resultado["creadas"] = len(nuevas)
+    resultado["actualizadas"] = len(modificadas)
+    return resultado
+
+
+# =========================================================
+# Autoguardado por celda (concurrencia optimista)
+# =========================================================
+def guardar_celdas_notas(asignatura, cambios, profesor):
+    """
+    Escribe unas pocas celdas comprobando su versión.
+    cambios: lista de (alumno_id, evaluacion_id, decimas, version); version es la
+    ultima_actualizacion que vio el cliente (None si la celda estaba vacía).
+    Si alguna celda cambió entretanto no se escribe nada y se lanza
+    ConflictoNotas con el valor vigente de cada celda en conflicto.
+    Devuelve ({(alumno_id, evaluacion_id): nota} con las celdas ya guardadas, cantidad de escrituras).
+    """
+    # Si una celda viene repetida, gana la última
+    cambios = {
+        (alumno_id, evaluacion_id): (decimas, version)
+        for alumno_id, evaluacion_id, decimas, version in cambios
+    }
+    claves = set(cambios)
+    try:
+        with transaction.atomic():
+            actuales = {
+                (n.alumno_id, n.evaluacion_id): n
+                for n in Nota.objects.select_for_update(of=("self",)).select_related("profesor").filter(
+                    asignatura=asignatura,
+                    alumno_id__in={alumno_id for alumno_id, _ in claves},
+                    evaluacion_id__in={evaluacion_id for _, evaluacion_id in claves},
+                )
+            }
+
+            conflictos = [
+                _conflicto(alumno_id, evaluacion_id, actuales.get((alumno_id, evaluacion_id)))
+                for (alumno_id, evaluacion_id), (_, version) in sorted(cambios.items())
+                if version_nota(actuales.get((alumno_id, evaluacion_id))) != version
+            ]
+            if conflictos:
+                raise ConflictoNotas(conflictos)
+
+            nuevas, modificadas, historial = [], [], []
+            ahora = timezone.now()
+            for (alumno_id, evaluacion_id), (decimas, _) in cambios.items():
+                nota = actuales.get((alumno_id, evaluacion_id))
+                if nota is None:
+                    nota = Nota(
+                        alumno_id=alumno_id,
+                        asignatura=asignatura,
+                        evaluacion_id=evaluacion_id,
+                        decimas=decimas,
+                        profesor=profesor,
+                    )
+                    nuevas.append(nota)
+                    actuales[(alumno_id, evaluacion_id)] = nota
+                elif nota.decimas != decimas:
+                    historial.append(entrada_historial(
+                        nota, nota.decimas, decimas, profesor, HistorialNota.ORIGEN_AUTOGUARDADO
+                    ))
+                    nota.decimas = decimas
+                    nota.profesor = profesor
+                    nota.ultima_actualizacion = ahora
+                    modificadas.append(nota)
+
+            if nuevas:
+                Nota.objects.bulk_create(nuevas)
+                historial += [
+                    entrada_historial(n, None, n.decimas, profesor, HistorialNota.ORIGEN_AUTOGUARDADO)
+                    for n in nuevas
+                ]
+            if modificadas:
+                Nota.objects.bulk_update(modificadas, ["decimas", "profesor", "ultima_actualizacion"])
+            if historial:
+                HistorialNota.objects.bulk_create(historial)
+            actualizar_promedios(
+                [asignatura.id], {n.alumno_id for n in nuevas} | {n.alumno_id for n in modificadas}
+            )
+    except IntegrityError:
+        # Otra pestaña creó la misma celda entre la lectura y el INSERT
+        actuales = {
+            (n.alumno_id, n.evaluacion_id): n
+            for n in Nota.objects.select_related("profesor").filter(
+                asignatura=asignatura,
+                alumno_id__in={alumno_id for alumno_id, _ in claves},
+                evaluacion_id__in={evaluacion_id for _, evaluacion_id in claves},
+            )
+        }
+        raise ConflictoNotas([
+            _conflicto(alumno_id, evaluacion_id, actuales.get((alumno_id, evaluacion_id)))
+            for alumno_id, evaluacion_id in sorted(claves)
+        ])
+
+    return {clave: actuales[clave] for clave in claves}, len(nuevas) + len(modificadas)
+
+
+# =========================================================
+# Importación desde planilla (vista previa + upsert masivo)
+# =========================================================
+def comparar_importacion(asignatura, celdas):
+    """
+    Vista previa de una importación contra las notas actuales (1 query).
+    celdas: {(alumno_id, evaluacion_id): decimas} ya validadas.
+    Devuelve {"cambios": [[alumno_id, evaluacion_id, decimas_anteriores | None, decimas_nuevas], ...],
+              "sin_cambios": n}; cambios es serializable (se guarda en la sesión).
+    """
+    actuales = {
+        (alumno_id, evaluacion_id): decimas
+        for alumno_id, evaluacion_id, decimas in Nota.objects.filter(
+            asignatura=asignatura,
+            alumno_id__in={alumno_id for alumno_id, _ in celdas},
+            evaluacion_id__in={evaluacion_id for _, evaluacion_id in celdas},
+        ).values_list("alumno_id", "evaluacion_id", "decimas")
+    }
+    cambios = [
+        [alumno_id, evaluacion_id, actuales.get((alumno_id, evaluacion_id)), decimas]
+        for (alumno_id, evaluacion_id), decimas in sorted(celdas.items())
+        if actuales.get((alumno_id, evaluacion_id)) != decimas
+    ]
+    return {"cambios": cambios, "sin_cambios": len(celdas) - len(cambios)}
+
+
+def aplicar_importacion(asignatura, cambios, profesor):
+    """
+    Aplica los cambios de comparar_importacion en una transacción, con un
+    solo INSERT ... ON CONFLICT (alumno, evaluacion) DO UPDATE.
+    Si alguna celda cambió desde la vista previa no se escribe nada y se
+    lanza ConflictoNotas. Devuelve la cantidad de notas escritas.
+    """
+    if not cambios:
+        return 0
+    claves = {(alumno_id, evaluacion_id) for alumno_id, evaluacion_id, _, _ in cambios}
+    with transaction.atomic():
+        actuales = {
+            (n.alumno_id, n.evaluacion_id): n
+            for n in Nota.objects.select_for_update(of=("self",)).select_related("profesor").filter(
+                asignatura=asignatura,
+                alumno_id__in={alumno_id for alumno_id, _ in claves},
+                evaluacion_id__in={evaluacion_id for _, evaluacion_id in claves},
+            )
+        }
+        conflictos = [
+            _conflicto(alumno_id, evaluacion_id, actuales.get((alumno_id, evaluacion_id)))
+            for alumno_id, evaluacion_id, anterior, _ in cambios
+            if getattr(actuales.get((alumno_id, evaluacion_id)), "decimas", None) != anterior
+        ]
+        if conflictos:
+            raise ConflictoNotas(conflictos)
+
+        # ultima_actualizacion (auto_now) se fija en el INSERT y también en el UPDATE
+        notas = Nota.objects.bulk_create(
+            [
+                Nota(
+                    alumno_id=alumno_id,
+                    asignatura=asignatura,
+                    evaluacion_id=evaluacion_id,
+                    decimas=decimas,
+                    profesor=profesor,
+                )
+                for alumno_id, evaluacion_id, _, decimas in cambios
+            ],
+            update_conflicts=True,
+            unique_fields=["alumno", "evaluacion"],
+            update_fields=["decimas", "profesor", "ultima_actualizacion"],
+        )
+        HistorialNota.objects.bulk_create([
+            entrada_historial(nota, anterior, nota.decimas, profesor, HistorialNota.ORIGEN_IMPORTACION)
+            for nota, (_, _, anterior, _) in zip(notas, cambios)
+        ])
+        actualizar_promedios([asignatura.id], {alumno_id for alumno_id, _ in claves})
+    return len(cambios)
+
+
+def _conflicto(alumno_id, evaluacion_id, nota):
+    return {
+        "alumno": alumno_id,
+        "evaluacion": evaluacion_id,
+        "valor": nota.valor if nota is not None else None,
+        "version": version_nota(nota),
+        "profesor": (nota.profesor.get_full_name() or nota.profesor.username) if nota is not None else None,
+    }
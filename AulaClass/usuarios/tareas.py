@@ -0,0 +1,314 @@
+# =========================================================
+# Cola de tareas en segundo plano (tabla Tarea)
+# =========================================================
+"""
+Trabajos pesados (PDF, eliminaciones en cascada) que una vista encola y
+`manage.py procesar_tareas` ejecuta fuera de la petición. Sin Redis: la
+cola es la tabla Tarea.
+
+- Reserva: un trabajador toma una tarea con un UPDATE condicional sobre su
+  estado; si dos lo intentan a la vez, solo a uno le afecta la fila. La
+  reserva vence a los RESERVA_TAREA; cada avance la renueva, y en los
+  pasos largos (Avance.renovando) la renueva un hilo. Si el trabajador
+  muere, otro la retoma al vencer.
+- Reintentos: si la tarea falla y le quedan intentos vuelve a pendiente con
+  espera exponencial; si no, queda fallida con el error.
+- Resultado: una tarea puede devolver (nombre, bytes); se guarda en
+  TAREAS_DIR y se descarga desde la vista de la tarea.
+"""
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Alumno, Asistencia, Curso, HistorialNota, Nota, Tarea
+from .reportes_pdf import abrir_informe, generar_historial_pdf
+from .servicios_notas import datos_informes
+
+logger = logging.getLogger(__name__)
+
+RESERVA_TAREA = timedelta(minutes=5)
+# Espera antes del reintento n: REINTENTO_BASE · 2^(n-1)
+REINTENTO_BASE = timedelta(seconds=30)
+# Filas por lote al borrar en cascada
+LOTE_ELIMINACION = 2000
+
+_TIPOS = {}
+
+
+def tipo_tarea(nombre):
+    """Registra la función que ejecuta las tareas de ese tipo: funcion(parametros, avance)."""
+    def registrar(funcion):
+        _TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def tareas_asincronas():
+    """Si las vistas deben encolar (hay un trabajador corriendo) o hacer el trabajo en la petición."""
+    return getattr(settings, "TAREAS_ASINCRONAS", False)
+
+
+def encolar(tipo, usuario=None, **parametros):
+    """
+    Crea la tarea pendiente; la vista puede responder de inmediato. Si el
+    mismo usuario ya tiene una tarea igual sin terminar (p. ej. hizo clic
+    dos veces), se devuelve esa en vez de repetir el trabajo.
+    """
+    if tipo not in _TIPOS:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    usuario = usuario if getattr(usuario, "pk", None) else None
+    existente = (
+        Tarea.objects.filter(
+            tipo=tipo, usuario=usuario, parametros=parametros,
+            estado__in=[Tarea.PENDIENTE, Tarea.EN_PROCESO],
+        )
+        .order_by("id")
+        .first()
+    )
+    if existente is not None:
+        return existente
+    return Tarea.objects.create(tipo=tipo, usuario=usuario, parametros=parametros, mensaje="En cola")
+
+
+# =========================================================
+# Reserva y ejecución
+# =========================================================
+def _disponibles(ahora):
+    # Pendientes cuya espera ya pasó, o en proceso con la reserva vencida
+    return Q(estado=Tarea.PENDIENTE, disponible_desde__lte=ahora) | Q(
+        estado=Tarea.EN_PROCESO, reservada_hasta__lt=ahora
+    )
+
+
+def reclamar_tarea(trabajador):
+    """Toma la próxima tarea disponible para este trabajador, o None si no hay."""
+    ahora = timezone.now()
+    # Reservas vencidas que ya usaron todos sus intentos: no se retoman
+    Tarea.objects.filter(
+        estado=Tarea.EN_PROCESO, reservada_hasta__lt=ahora, intentos__gte=F("max_intentos")
+    ).update(
+        estado=Tarea.FALLIDA, error="El trabajador dejó de responder.", mensaje="Fallida",
+        terminada=ahora, reservada_hasta=None,
+    )
+
+    candidatas = (
+        Tarea.objects.filter(_disponibles(ahora))
+        .order_by("disponible_desde", "id")
+        .values_list("id", flat=True)[:20]
+    )
+    for tarea_id in list(candidatas):
+        # UPDATE ... WHERE id = ? AND (disponible): lo gana un solo trabajador
+        tomada = Tarea.objects.filter(_disponibles(ahora), id=tarea_id).update(
+            estado=Tarea.EN_PROCESO,
+            trabajador=trabajador,
+            reservada_hasta=ahora + RESERVA_TAREA,
+            intentos=F("intentos") + 1,
+            iniciada=ahora,
+            progreso=0,
+            mensaje="Iniciando",
+        )
+        if tomada:
+            return Tarea.objects.get(id=tarea_id)
+    return None
+
+
+class Avance:
+    """Se pasa a cada tarea para informar progreso; de paso renueva la reserva."""
+    def __init__(self, tarea):
+        self.tarea = tarea
+
+    def _propia(self):
+        return Tarea.objects.filter(id=self.tarea.id, trabajador=self.tarea.trabajador)
+
+    def __call__(self, porcentaje, mensaje=""):
+        self._propia().update(
+            progreso=max(0, min(99, int(porcentaje))),
+            mensaje=mensaje[:200],
+            reservada_hasta=timezone.now() + RESERVA_TAREA,
+        )
+
+    @contextmanager
+    def renovando(self):
+        """
+        Para pasos largos sin puntos de avance (renderizar un PDF): un hilo
+        renueva la reserva cada tercio de RESERVA_TAREA mientras dura el
+        bloque, así otro trabajador no la retoma mientras esta sigue viva.
+        """
+        fin = threading.Event()
+
+        def latido():
+            try:
+                while not fin.wait(RESERVA_TAREA.total_seconds() / 3):
+                    self._propia().update(reservada_hasta=timezone.now() + RESERVA_TAREA)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=latido, name=f"reserva-tarea-{self.tarea.id}", daemon=True)
+        hilo.start()
+        try:
+            yield
+        finally:
+            fin.set()
+            hilo.join()
+
+
+def ejecutar_tarea(tarea):
+    """Ejecuta una tarea ya reservada y deja su estado final (o pendiente para reintento)."""
+    # Solo actualiza si la reserva sigue siendo de este trabajador
+    propia = Tarea.objects.filter(id=tarea.id, trabajador=tarea.trabajador, estado=Tarea.EN_PROCESO)
+    try:
+        resultado = _TIPOS[tarea.tipo](tarea.parametros, Avance(tarea))
+        campos = {}
+        if resultado is not None:
+            nombre, datos = resultado
+            campos = {"archivo": _guardar_resultado(tarea, nombre, datos), "nombre_archivo": nombre}
+    except Exception as e:
+        logger.exception("Falló la tarea %s", tarea)
+        error = f"{type(e).__name__}: {e}"[:2000]
+        ahora = timezone.now()
+        if tarea.intentos < tarea.max_intentos:
+            propia.update(
+                estado=Tarea.PENDIENTE,
+                error=error,
+                disponible_desde=ahora + REINTENTO_BASE * 2 ** (tarea.intentos - 1),
+                reservada_hasta=None,
+                mensaje=f"Reintento {tarea.intentos + 1} de {tarea.max_intentos} en espera",
+            )
+        else:
+            propia.update(
+                estado=Tarea.FALLIDA, error=error, terminada=ahora, reservada_hasta=None, mensaje="Fallida"
+            )
+        return False
+
+    propia.update(
+        estado=Tarea.COMPLETADA, progreso=100, mensaje="Lista", error="",
+        terminada=timezone.now(), reservada_hasta=None, **campos,
+    )
+    return True
+
+
+def _guardar_resultado(tarea, nombre, datos):
+    """Escritura atómica en TAREAS_DIR; devuelve el nombre del archivo dentro del directorio."""
+    directorio = Path(settings.TAREAS_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    destino = f"{tarea.id}_{Path(nombre).name}"
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(datos)
+        os.replace(temporal, directorio / destino)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    return destino
+
+
+def ruta_resultado(tarea):
+    return Path(settings.TAREAS_DIR) / tarea.archivo
+
+
+def purgar_tareas(dias=7):
+    """Borra las tareas terminadas hace más de `dias` días y sus archivos. Devuelve cuántas."""
+    limite = timezone.now() - timedelta(days=dias)
+    viejas = Tarea.objects.filter(estado__in=[Tarea.COMPLETADA, Tarea.FALLIDA], terminada__lt=limite)
+    for archivo in viejas.exclude(archivo="").values_list("archivo", flat=True):
+        try:
+            os.remove(Path(settings.TAREAS_DIR) / archivo)
+        except OSError:
+            pass
+    return viejas.delete()[0]
+
+
+# =========================================================
+# Tipos de tarea
+# =========================================================
+@tipo_tarea("informe_alumno")
+def _informe_alumno(parametros, avance):
+    alumno = Alumno.objects.select_related("curso__profesor_jefe").get(id=parametros["alumno_id"])
+    avance(20, "Leyendo notas, asistencia y anotaciones")
+    datos = datos_informes(alumno.curso, alumnos=[alumno])[0]
+    avance(50, "Generando PDF")
+    with avance.renovando(), abrir_informe(datos) as archivo:
+        return f"Informe_{alumno.rut}.pdf", archivo.read()
+
+
+def historial_filtrado(accion=None, usuario_id=None, modelo=None):
+    """LogEntry del historial de acciones con los filtros de la pantalla."""
+    logs = LogEntry.objects.select_related("user", "content_type").order_by("-action_time")
+    if accion: logs = logs.filter(action_flag=int(accion))
+    if usuario_id: logs = logs.filter(user_id=usuario_id)
+    if modelo: logs = logs.filter(content_type__model=modelo.lower())
+    return logs
+
+
+def filas_historial(logs):
+    """Filas para reportes_pdf.generar_historial_pdf."""
+    return [
+        (
+            timezone.localtime(log.action_time).strftime("%d/%m/%Y %H:%M"),
+            log.user.get_full_name() or log.user.username,
+            log.action_flag,
+            log.content_type.model.capitalize(),
+            log.object_repr,
+            log.change_message,
+        )
+        for log in logs.iterator(chunk_size=2000)
+    ]
+
+
+@tipo_tarea("historial_pdf")
+def _historial_pdf(parametros, avance):
+    avance(10, "Leyendo historial")
+    with avance.renovando():
+        filas = filas_historial(historial_filtrado(**parametros))
+    avance(40, f"Generando PDF ({len(filas)} registros)")
+    with avance.renovando():
+        return "Historial_AulaClass.pdf", generar_historial_pdf(filas)
+
+
+def _borrar_por_lotes(qs, avance, desde, hasta, mensaje):
+    """Borra qs en lotes de LOTE_ELIMINACION filas (transacciones cortas), informando avance entre desde y hasta."""
+    total = qs.count()
+    borradas = 0
+    while True:
+        ids = list(qs.values_list("id", flat=True)[:LOTE_ELIMINACION])
+        if not ids:
+            return
+        with transaction.atomic():
+            qs.model.objects.filter(id__in=ids).delete()
+        borradas += len(ids)
+        avance(desde + (hasta - desde) * borradas / max(total, 1), f"{mensaje} ({borradas} de {total})")
+
+
+@tipo_tarea("eliminar_curso")
+def _eliminar_curso(parametros, avance):
+    """
+    Eliminación en cascada de un curso por partes: primero las tablas
+    grandes (asistencia, historial y notas) en lotes, luego el curso con lo
+    que queda, en una transacción.
+    """
+    curso = Curso.objects.filter(id=parametros["curso_id"]).first()
+    if curso is None:
+        return None
+    _borrar_por_lotes(Asistencia.objects.filter(curso=curso), avance, 0, 50, "Borrando asistencia")
+    _borrar_por_lotes(
+        HistorialNota.objects.filter(asignatura__curso=curso), avance, 50, 65, "Borrando historial de notas"
+    )
+    _borrar_por_lotes(Nota.objects.filter(asignatura__curso=curso), avance, 65, 90, "Borrando notas")
+    avance(90, "Borrando el curso")
+    with transaction.atomic():
+        curso.delete()
+    return None
@@ -29,8 +29,20 @@ urlpatterns = [
     # =============================
     path('curso/<int:curso_id>/', curso, name='curso'),
     path('asistencia/<int:curso_id>/', asistencia, name='asistencia'),
+    path('asistencia/<int:curso_id>/mensual/', views.asistencia_mensual, name='asistencia_mensual'),
+    path('asistencia/exportar/', views.exportar_asistencia, name='exportar_asistencia'),
+    path('asistencia/sincronizar/', views.asistencia_sincronizar, name='asistencia_sincronizar'),
+    path('inspectoria/avance/', views.avance_asistencia, name='avance_asistencia'),
+    path('inspectoria/avance/json/', views.avance_asistencia_json, name='avance_asistencia_json'),
+    path('inspectoria/panel/', views.panel_inspectoria, name='panel_inspectoria'),
+    path('inspectoria/panel/stream/', views.panel_inspectoria_stream, name='panel_inspectoria_stream'),
     path('curso/<int:curso_id>/notas/', seleccionar_asignatura, name='notas'),
+    path('curso/<int:curso_id>/notas/sabana/', views.sabana_notas, name='sabana_notas'),
+    path('curso/<int:curso_id>/informes/', views.informes_curso_zip, name='informes_curso_zip'),
     path('curso/<int:curso_id>/asignatura/<int:asignatura_id>/notas/', libro_notas, name='libro_notas'),
+    path('curso/<int:curso_id>/asignatura/<int:asignatura_id>/notas/celdas/', views.autoguardar_notas, name='autoguardar_notas'),
+    path('curso/<int:curso_id>/asignatura/<int:asignatura_id>/evaluaciones/agregar/', views.agregar_evaluacion, name='agregar_evaluacion'),
+    path('curso/<int:curso_id>/asignatura/<int:asignatura_id>/notas/importar/', views.importar_notas, name='importar_notas'),
     path("cambiar-password/<int:user_id>/", views.cambiar_password, name="cambiar_password"),
 
 
@@ -44,9 +56,13 @@ urlpatterns = [
     # Reportes
     # =============================
     path('reportes/', reportes, name='reportes'),
+    path('reportes/distribucion-notas/', views.distribucion_notas, name='distribucion_notas'),
     path('historial/', views.historial_acciones_admin, name='historial_admin'),
     path("historial/eliminar/<int:log_id>/", views.eliminar_log, name="eliminar_log"),
     path("historial/eliminar_todos/", views.eliminar_todos_logs, name="eliminar_todos_logs"),
+    path('tareas/<int:tarea_id>/', views.tarea_estado, name='tarea_estado'),
+    path('tareas/<int:tarea_id>/estado/', views.tarea_estado_json, name='tarea_estado_json'),
+    path('tareas/<int:tarea_id>/descargar/', views.tarea_descargar, name='tarea_descargar'),
 
 
     # =============================
@@ -1,27 +1,35 @@
 # =========================================================
 # Importaciones
 # =========================================================
+import asyncio
+import calendar
+import json
 import re
-from io import BytesIO
+import time
 from collections import Counter
 from datetime import date
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import login as auth_login
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
 from django.db.models import Q, Count, Avg
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods, require_POST
 from django.core.paginator import Paginator
 from django.urls import reverse, reverse_lazy
+from django.utils.text import slugify
 from django.db.models import Q, Prefetch
 
 #  Para registrar acciones
@@ -29,14 +37,40 @@ from django.contrib.admin.models import LogEntry, ADDITION, CHANGE, DELETION
 from django.contrib.contenttypes.models import ContentType
 
 # Modelos
-from .models import Alumno, Curso, Asignatura, Nota, Asistencia, Anotacion, Usuario
+from .models import (
+    Alumno, Curso, Asignatura, Nota, Asistencia, Anotacion, PromedioAlumnoAsignatura, Tarea, Usuario,
+    VersionAsistenciaDia
+)
 from django import forms
 
+# Servicios
+from .asistencia_compacta import resumen_asistencia_compacta
+from .exportacion import (
+    CONTENT_TYPE_XLSX, filas_asistencia, flujo_csv, flujo_xlsx, flujo_zip, respuesta_en_flujo
+)
+from .condicional import huella_condicional, version_anotaciones_alumno, version_libro_notas
+from .importacion_notas import ErrorImportacion, leer_planilla, validar_planilla
+from .cola_asistencia import guardar_asistencia, sincronizar_asistencia
+from .reportes_pdf import abrir_informe, abrir_informe_cacheado, generar_historial_pdf, informes_con_cache
+from .tareas import encolar, filas_historial, historial_filtrado, ruta_resultado, tareas_asincronas
+from .matriz_notas import MatrizNotas, a_valor
+from .servicios_notas import (
+    MAX_CELDAS_AUTOGUARDADO, ConflictoNotas, aplicar_importacion, comparar_importacion,
+    crear_evaluacion, datos_informes, distribucion_notas_cacheada, guardar_celdas_notas,
+    guardar_libro_notas, leer_celdas_libro, promedio_de_promedios, promedios_alumnos, promedios_guardados,
+    sabana_curso, version_nota
+)
+from .servicios_asistencia import (
+    ESTADOS_VALIDOS, MAX_REGISTROS_SINCRONIZACION,
+    avance_asistencia_cacheado, construir_grilla_mensual, panel_ausencias,
+    totales_asistencia
+)
+
 # Formularios
 from .forms import (
     RegistroForm, LoginForm,
     CursoForm, AsignaturaForm, CursoAsignaturasForm, AsignarProfesorJefeForm,
-    CursoEditForm, AlumnoForm, AsignarAsignaturasForm
+    CursoEditForm, AlumnoForm, AsignarAsignaturasForm, EvaluacionForm, ImportarNotasForm
 )
 
 # =========================================================
@@ -47,6 +81,10 @@ def es_utp(user):
     #  Permite tanto al rol UTP como al superusuario
     return (hasattr(user, 'role') and user.role == 'utp') or user.is_superuser
 
+def es_inspectoria(user):
+    #  Inspector, UTP o superusuario
+    return getattr(user, 'role', None) in (Usuario.ROLE_INSPECTOR, Usuario.ROLE_UTP) or user.is_superuser
+
 # =========================================================
 # Helper de orden por grado (1º→8º Básico, luego Medio, etc.)
 # =========================================================
@@ -187,6 +225,20 @@ def anotaciones(request):
 def reportes(request):
     return render(request, "reportes.html")
 
+
+@login_required
+@user_passes_test(es_utp)
+def distribucion_notas(request):
+    """Histogramas de notas por asignatura y nivel, comparando los cursos de cada nivel."""
+    grupos = distribucion_notas_cacheada()
+    años = sorted({g["año"] for g in grupos}, reverse=True)
+    año = request.GET.get("año") or (años[0] if años else "")
+    grupos = sorted(
+        (g for g in grupos if g["año"] == año),
+        key=lambda g: (_clave_grado(g["nivel"]), g["asignatura"]),
+    )
+    return render(request, "distribucion_notas.html", {"grupos": grupos, "años": años, "año": año})
+
 # =========================================================
 # Autenticación (Login / Registro)
 # =========================================================
@@ -391,6 +443,11 @@ def curso_eliminar(request, pk):
 
     if request.method in ["POST", "GET"]:
         registrar_accion(request.user, curso, DELETION, "Curso eliminado desde vista personalizada")
+        if tareas_asincronas():
+            # La cascada (asistencia, notas, historial) se borra por lotes en segundo plano
+            tarea = encolar("eliminar_curso", request.user, curso_id=curso.id)
+            messages.info(request, f"El curso «{curso.nombre}» se está eliminando en segundo plano.")
+            return redirect("usuarios:tarea_estado", tarea_id=tarea.id)
         curso.delete()
         messages.success(request, f"Curso «{curso.nombre}» eliminado correctamente.")
 
@@ -647,8 +704,8 @@ def redondear_personalizado(valor):
     """
     if valor is None:
         return None
-    # Truco matemático para redondeo .5 hacia arriba en Python
-    return int(valor * 10 + 0.5) / 10.0
+    # Misma regla que los promedios de MatrizNotas (décimas exactas)
+    return Nota.a_decimas(valor) / 10
 
 
 def formatear_punto_1_decimal(valor):
@@ -669,282 +726,43 @@ def formatear_punto_1_decimal(valor):
 
 @login_required
 def reporte_alumno(request, alumno_id):
-    import io
-    from django.db.models import Avg, Q
-    from django.utils import timezone
-    from django.http import HttpResponse
-    from django.shortcuts import get_object_or_404
-    
-    # Importaciones de Modelos
-    from .models import Alumno, Asignatura, Nota, Asistencia, Anotacion
-
-    # ReportLab Imports
-    from reportlab.lib.pagesizes import landscape, A4
-    from reportlab.lib import colors
-    from reportlab.lib.units import mm
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-
-    # 1. OBTENER DATOS PRINCIPALES
     alumno = get_object_or_404(Alumno, id=alumno_id)
-    curso = alumno.curso
-
-    # --- Helper interno para formato (X.Y) ---
-    def formatear_nota(valor):
-        if valor is None: return ""
-        val = round(valor, 1)
-        return f"{val:.1f}" # Fuerza el punto decimal (ej: 6.0)
-
-    # 2. PROCESAR NOTAS
-    asignaturas_qs = Asignatura.objects.filter(curso=curso).order_by('nombre')
-    
-    table_data_notas = []
-    
-    # Estilos de párrafo para celdas
-    style_center = ParagraphStyle('center', alignment=TA_CENTER, fontName='Helvetica', fontSize=9)
-    style_left_bold = ParagraphStyle('left', alignment=TA_LEFT, fontName='Helvetica-Bold', fontSize=9)
-
-    suma_promedios = 0
-    count_promedios = 0
-
-    for asig in asignaturas_qs:
-        notas = Nota.objects.filter(alumno=alumno, asignatura=asig).order_by('numero')
-        notas_map = {n.numero: n.valor for n in notas}
-        
-        row = [Paragraph(asig.nombre.upper(), style_left_bold)]
-        
-        suma_notas = 0
-        count_notas = 0
-        
-        # Iterar columnas 1 a 10
-        for i in range(1, 11):
-            val = notas_map.get(i)
-            if val is not None:
-                suma_notas += val
-                count_notas += 1
-                txt_val = formatear_nota(val)
-                # Rojo si es menor a 4.0
-                if val < 4.0:
-                    txt = f"<font color='#dc2626'><b>{txt_val}</b></font>"
-                else:
-                    txt = f"<font color='#1f2937'>{txt_val}</font>"
-                row.append(Paragraph(txt, style_center))
-            else:
-                row.append(Paragraph("-", style_center))
-        
-        # Calcular Promedio Asignatura
-        promedio = None
-        if count_notas > 0:
-            promedio = round(suma_notas / count_notas, 1)
-            suma_promedios += promedio
-            count_promedios += 1
-            txt_prom = formatear_nota(promedio)
-            
-            if promedio < 4.0:
-                txt = f"<font color='#dc2626'><b>{txt_prom}</b></font>"
-            else:
-                txt = f"<font color='#1f2937'><b>{txt_prom}</b></font>"
-            row.append(Paragraph(txt, style_center))
-        else:
-            row.append(Paragraph("-", style_center))
-            
-        table_data_notas.append(row)
-
-    # 3. CÁLCULOS FINALES (Sincronizado con Vista Web)
-    # =========================================================
-    
-    # A. Promedio General
-    promedio_general = 0.0
-    if count_promedios > 0:
-        promedio_general = round(suma_promedios / count_promedios, 1)
-
-    # B. Asistencia (CORRECCIÓN )
-    # Definimos estados válidos para ignorar basura o scripts de prueba
-    estados_validos = ['Presente', 'Ausente', 'Justificado', 'Atraso']
-    
-    # Denominador: Total de días realmente registrados (ignora nulos/vacíos)
-    asist_total = Asistencia.objects.filter(
-        alumno=alumno, 
-        curso=curso,
-        estado__in=estados_validos
-    ).count()
-
-    # Numerador: Sumamos Presentes y Atrasos (Normalizando mayúsculas/minúsculas)
-    asist_efectiva = Asistencia.objects.filter(
-        alumno=alumno, 
-        curso=curso,
-        estado__in=estados_validos
-    ).filter(
-        Q(estado__iexact='Presente') | Q(estado__iexact='Atraso')
-    ).count()
-    
-    porc_asistencia = 0.0
-    if asist_total > 0:
-        porc_asistencia = round((asist_efectiva / asist_total) * 100, 1)
-
-    # =========================================================
-    # 4. CONSTRUCCIÓN DEL PDF (ReportLab)
-    # =========================================================
-    buffer = io.BytesIO()
-    
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(A4),
-        leftMargin=15 * mm,
-        rightMargin=15 * mm,
-        topMargin=15 * mm,
-        bottomMargin=15 * mm,
-        title=f"Informe_{alumno.rut}"
+    # Mismos datos y mismo render que los informes del curso completo (informes_curso_zip)
+    datos = datos_informes(alumno.curso, alumnos=[alumno])[0]
+    # Se reutiliza el PDF guardado si nada de lo que muestra cambió; se envía desde el archivo
+    archivo = abrir_informe_cacheado(datos)
+    if archivo is None:
+        if tareas_asincronas():
+            # Hay que renderizarlo: lo hace el trabajador y la página de la tarea lo descarga
+            tarea = encolar("informe_alumno", request.user, alumno_id=alumno.id)
+            return redirect("usuarios:tarea_estado", tarea_id=tarea.id)
+        archivo = abrir_informe(datos)
+    return FileResponse(
+        archivo, as_attachment=True, filename=f"Informe_{alumno.rut}.pdf", content_type="application/pdf",
     )
 
-    story = []
-    styles = getSampleStyleSheet()
-
-    # A. ENCABEZADO
-    header_data = [
-        [
-            Paragraph("<b>INFORME PARCIAL DE NOTAS</b>", 
-                      ParagraphStyle('TitleInv', parent=styles['Heading1'], textColor=colors.white, fontSize=16)),
-            Paragraph(f"Generado: {timezone.localtime().strftime('%d/%m/%Y %H:%M')}", 
-                      ParagraphStyle('DateInv', parent=styles['Normal'], textColor=colors.white, alignment=TA_RIGHT))
-        ]
-    ]
-    t_header = Table(header_data, colWidths=[200*mm, 67*mm])
-    t_header.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,-1), colors.HexColor("#4f46e5")), # Azul Primario 
-        ('TOPPADDING', (0,0), (-1,-1), 10),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 10),
-        ('LEFTPADDING', (0,0), (-1,-1), 15),
-        ('RIGHTPADDING', (0,0), (-1,-1), 15),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-    ]))
-    story.append(t_header)
-    story.append(Spacer(1, 10*mm))
-
-    # B. DATOS ALUMNO
-    prof_jefe_str = "Sin asignar"
-    if curso.profesor_jefe:
-        nombre_completo = curso.profesor_jefe.get_full_name()
-        if nombre_completo and nombre_completo.strip():
-            prof_jefe_str = nombre_completo
-        else:
-            prof_jefe_str = curso.profesor_jefe.username
 
-    info_data = [
-        [f"ALUMNO: {alumno.apellidos}, {alumno.nombres}", f"RUT: {alumno.rut}"],
-        [f"CURSO: {curso.nombre} - {curso.año}", f"PROF. JEFE: {prof_jefe_str}"]
-    ]
-    
-    t_info = Table(info_data, colWidths=[133*mm, 134*mm])
-    t_info.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,-1), colors.HexColor("#f3f4f6")),
-        ('TEXTCOLOR', (0,0), (-1,-1), colors.HexColor("#374151")),
-        ('FONTNAME', (0,0), (-1,-1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,-1), 10),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 8),
-        ('TOPPADDING', (0,0), (-1,-1), 8),
-        ('LEFTPADDING', (0,0), (-1,-1), 12),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.white), 
-    ]))
-    story.append(t_info)
-    story.append(Spacer(1, 8*mm))
-
-    # C. TABLA NOTAS
-    headers = [Paragraph("ASIGNATURA", style_center)]
-    for i in range(1, 11):
-        headers.append(Paragraph(f"N{i}", style_center))
-    headers.append(Paragraph("PROM", style_center))
-    
-    final_table_data = [headers] + table_data_notas
-    col_widths = [77*mm] + [17*mm]*10 + [20*mm]
-    
-    t_notas = Table(final_table_data, colWidths=col_widths, repeatRows=1)
-    t_notas.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#1f2937")), # Cabecera oscura
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e5e7eb")),
-        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.HexColor("#f9fafb")]),
-        ('FONTSIZE', (0,0), (-1,-1), 9),
-        ('TOPPADDING', (0,0), (-1,-1), 6),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-        ('BACKGROUND', (-1,1), (-1,-1), colors.HexColor("#eff6ff")), # Columna Promedios Azul suave
-        ('BOX', (-1,0), (-1,-1), 1, colors.HexColor("#bfdbfe")),
-    ]))
-    story.append(t_notas)
-    story.append(Spacer(1, 10*mm))
-
-    # D. RESUMEN
-    color_prom = "#dc2626" if promedio_general < 4.0 else "#059669"
-    color_asist = "#dc2626" if porc_asistencia < 85.0 else "#2563eb"
-    
-    resumen_data = [
-        [Paragraph("PROMEDIO GENERAL", style_center), Paragraph("PORCENTAJE ASISTENCIA", style_center)],
-        [
-            Paragraph(f"<b><font size=14 color='{color_prom}'>{formatear_nota(promedio_general)}</font></b>", style_center),
-            Paragraph(f"<b><font size=14 color='{color_asist}'>{formatear_nota(porc_asistencia)}%</font></b>", style_center)
-        ]
-    ]
-    t_resumen = Table(resumen_data, colWidths=[60*mm, 60*mm])
-    t_resumen.setStyle(TableStyle([
-        ('BOX', (0,0), (0,-1), 2, colors.HexColor("#e5e7eb")), 
-        ('BOX', (1,0), (1,-1), 2, colors.HexColor("#e5e7eb")), 
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#f3f4f6")),
-        ('TOPPADDING', (0,0), (-1,-1), 10),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 10),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-    ]))
-    t_resumen.hAlign = 'RIGHT'
-    story.append(t_resumen)
-    story.append(Spacer(1, 10*mm))
-
-    # E. ANOTACIONES
-    anotaciones = Anotacion.objects.filter(alumno=alumno).order_by("-fecha")
-    story.append(Paragraph("OBSERVACIONES / ANOTACIONES", styles['Heading3']))
-    story.append(Spacer(1, 2*mm))
-    
-    if anotaciones:
-        for anot in anotaciones:
-            prof_name = anot.profesor.get_full_name() or anot.profesor.username
-            txt = f"<b>{anot.fecha.strftime('%d/%m/%Y')} - {prof_name}:</b> {anot.texto}"
-            story.append(Paragraph(txt, ParagraphStyle('anot', parent=styles['Normal'], fontSize=9, leading=12)))
-            story.append(Spacer(1, 2*mm))
-    else:
-        story.append(Paragraph("<i>No se registran anotaciones a la fecha.</i>", styles['Normal']))
-
-    # F. FIRMAS
-    story.append(Spacer(1, 25*mm))
-    firma_data = [
-        ["__________________________", "__________________________"],
-        ["Firma Apoderado", "Firma Profesor Jefe / Dirección"]
-    ]
-    t_firmas = Table(firma_data, colWidths=[90*mm, 90*mm])
-    t_firmas.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('fontName', (0,0), (-1,-1), 'Helvetica'),
-        ('fontSize', (0,0), (-1,-1), 10),
-    ]))
-    story.append(t_firmas)
-    
-    # PIE DE PÁGINA
-    story.append(Spacer(1, 10*mm))
-    footer = Paragraph(
-        f"<font color='#9ca3af' size=8>Documento oficial AulaClass | {alumno.rut} | {timezone.now().strftime('%d/%m/%Y')}</font>", 
-        style_center
+@login_required
+def informes_curso_zip(request, curso_id):
+    """
+    Informes de todos los alumnos del curso en un ZIP. Los datos se leen en
+    bloque antes de responder; los PDF se renderizan en un pool de procesos
+    y cada uno se envía apenas está listo, mientras los demás se generan.
+    Los que ya están en la caché de informes no se vuelven a renderizar.
+    """
+    curso = get_object_or_404(Curso.objects.select_related("profesor_jefe"), id=curso_id)
+    if not _puede_ver_sabana(request.user, curso):
+        messages.error(request, "Acceso denegado: Solo UTP o el profesor jefe pueden descargar los informes del curso.")
+        return redirect("usuarios:notas", curso_id=curso.id)
+
+    informes = datos_informes(curso)
+    archivos = (
+        (f"{numero:02d}_{slugify(datos['apellidos'])}_{datos['rut']}.pdf", pdf)
+        for numero, (datos, pdf) in enumerate(informes_con_cache(informes), start=1)
+    )
+    return respuesta_en_flujo(
+        request, flujo_zip(archivos), "application/zip", f"Informes_{slugify(curso.nombre)}_{curso.año}.zip"
     )
-    story.append(footer)
-
-    # GENERAR
-    doc.build(story)
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Informe_{alumno.rut}.pdf"'
-    return response
 
 
 
@@ -952,11 +770,20 @@ def reporte_alumno(request, alumno_id):
 # =========================================================
 # Guardar Asistencia (CON REGISTRO)
 # =========================================================
+DIAS_HISTORICO_POR_PAGINA = 10
+
+
+def _parse_fecha(valor):
+    """Convierte 'YYYY-MM-DD' a date; devuelve None si viene vacío o inválido."""
+    try:
+        return date.fromisoformat(valor) if valor else None
+    except ValueError:
+        return None
+
+
 @login_required
 def asistencia(request, curso_id):
     from datetime import date
-    from itertools import groupby
-    from operator import attrgetter
 
     curso = get_object_or_404(Curso, id=curso_id)
     alumnos = Alumno.objects.filter(curso=curso).order_by('apellidos', 'nombres')
@@ -969,32 +796,38 @@ def asistencia(request, curso_id):
         if request.method == 'POST':
             fecha_str = request.POST.get('fecha')
             fecha = date.fromisoformat(fecha_str) if fecha_str else date.today()
-            cambios = 0
-
-            for alumno in alumnos:
-                estado = request.POST.get(f"estado_{alumno.id}")
-                if estado:
-                    Asistencia.objects.update_or_create(
-                        alumno=alumno,
-                        curso=curso,
-                        fecha=fecha,
-                        defaults={'estado': estado},
-                    )
-                    cambios += 1
-
-            messages.success(request, f"Asistencia guardada correctamente ({cambios} registros).")
+
+            # Solo ids del curso (no se consulta el objeto completo)
+            estados = {}
+            for alumno_id in alumnos.values_list('id', flat=True):
+                estado = request.POST.get(f"estado_{alumno_id}")
+                if estado in ESTADOS_VALIDOS:
+                    estados[alumno_id] = estado
+
+            # Upsert masivo en una transacción; con SQLite pasa por la cola de escritura
+            resultado = guardar_asistencia(curso, fecha, estados)
+
+            messages.success(
+                request,
+                f"Asistencia guardada correctamente: {resultado['creados']} nuevos, "
+                f"{resultado['actualizados']} actualizados, {resultado['sin_cambios']} sin cambios."
+            )
             return redirect(f"{reverse('usuarios:asistencia', args=[curso.id])}?page=1&fecha={fecha.isoformat()}")
 
         # GET → cargar asistencia de la fecha o de hoy
         fecha_filtrada = request.GET.get('fecha') or date.today().isoformat()
-        asistencias = Asistencia.objects.filter(curso=curso, fecha=fecha_filtrada)
-        estados = {a.alumno.id: a.estado for a in asistencias}
+        estados = dict(
+            Asistencia.objects
+            .filter(curso=curso, fecha=fecha_filtrada)
+            .values_list('alumno_id', 'estado')
+        )
 
         return render(request, 'asistencia.html', {
             'curso': curso,
             'alumnos': alumnos,
             'estados': estados,
             'fecha_filtrada': fecha_filtrada,
+            'max_registros_sync': MAX_REGISTROS_SINCRONIZACION,
             'page': '1',
         })
 
@@ -1002,39 +835,286 @@ def asistencia(request, curso_id):
     # PAGE 2 - Histórico
     # ================================
     elif page == "2":
-        fecha_filtrada = request.GET.get('fecha')
+        fecha_filtrada = _parse_fecha(request.GET.get('fecha'))
+        antes = _parse_fecha(request.GET.get('antes'))
+        despues = _parse_fecha(request.GET.get('despues'))
 
-        asistencias_qs = (
+        # 1 query: totales por día calculados con GROUP BY fecha
+        resumen_qs = (
             Asistencia.objects
             .filter(curso=curso)
-            .select_related('alumno')
-            .order_by('-fecha', 'alumno__apellidos')
+            .values('fecha')
+            .annotate(
+                total=Count('id'),
+                presentes=Count('id', filter=Q(estado='Presente')),
+            )
         )
-
         if fecha_filtrada:
-            asistencias_qs = asistencias_qs.filter(fecha=fecha_filtrada)
+            resumen_qs = resumen_qs.filter(fecha=fecha_filtrada)
+
+        # Paginación por cursor de fecha (keyset): no usa OFFSET ni cuenta el total
+        if despues:
+            dias = list(resumen_qs.filter(fecha__gt=despues).order_by('fecha')[:DIAS_HISTORICO_POR_PAGINA + 1])
+            hay_mas_recientes = len(dias) > DIAS_HISTORICO_POR_PAGINA
+            dias = dias[:DIAS_HISTORICO_POR_PAGINA][::-1]
+            hay_anteriores = True
+        else:
+            if antes:
+                resumen_qs = resumen_qs.filter(fecha__lt=antes)
+            dias = list(resumen_qs.order_by('-fecha')[:DIAS_HISTORICO_POR_PAGINA + 1])
+            hay_anteriores = len(dias) > DIAS_HISTORICO_POR_PAGINA
+            dias = dias[:DIAS_HISTORICO_POR_PAGINA]
+            hay_mas_recientes = antes is not None
+
+        # 1 query: detalle por alumno solo de los días de esta página
+        registros_por_dia = {}
+        if dias:
+            detalle_qs = (
+                Asistencia.objects
+                .filter(curso=curso, fecha__in=[d['fecha'] for d in dias])
+                .select_related('alumno')
+                .order_by('alumno__apellidos', 'alumno__nombres')
+            )
+            for registro in detalle_qs:
+                registros_por_dia.setdefault(registro.fecha, []).append(registro)
 
         asistencia_por_dia = []
-        for fecha, registros in groupby(asistencias_qs, key=attrgetter('fecha')):
-            registros = list(registros)
-            total = len(registros)
-            presentes = sum(1 for a in registros if a.estado.lower() == "presente")
-            porcentaje = round((presentes / total) * 100, 1) if total > 0 else 0
+        for dia in dias:
+            total = dia['total']
+            presentes = dia['presentes']
             asistencia_por_dia.append({
-                'fecha': fecha,
-                'registros': registros,
+                'fecha': dia['fecha'],
+                'registros': registros_por_dia.get(dia['fecha'], []),
                 'total': total,
                 'presentes': presentes,
-                'porcentaje': porcentaje,
+                'porcentaje': round((presentes / total) * 100, 1) if total > 0 else 0,
             })
 
         return render(request, 'asistencia_historico.html', {
             'curso': curso,
             'asistencia_por_dia': asistencia_por_dia,
-            'fecha_filtrada': fecha_filtrada,
+            'fecha_filtrada': fecha_filtrada.isoformat() if fecha_filtrada else None,
+            'cursor_anteriores': dias[-1]['fecha'].isoformat() if dias and hay_anteriores else None,
+            'cursor_recientes': dias[0]['fecha'].isoformat() if dias and hay_mas_recientes else None,
             'page': '2',
         })
 
+# =========================================================
+# Planilla mensual de asistencia (alumnos × días)
+# =========================================================
+@login_required
+def asistencia_mensual(request, curso_id):
+    curso = get_object_or_404(Curso.objects.select_related("profesor_jefe"), id=curso_id)
+
+    # ?mes=YYYY-MM (por defecto, el mes actual)
+    hoy = timezone.localdate()
+    try:
+        anio, mes = (int(x) for x in request.GET.get("mes", "").split("-"))
+        date(anio, mes, 1)
+    except ValueError:
+        anio, mes = hoy.year, hoy.month
+
+    grilla = construir_grilla_mensual(curso, anio, mes)
+
+    # En los extremos del calendario (0001-01, 9999-12) no hay mes anterior/siguiente
+    mes_anterior = mes_siguiente = None
+    if (anio, mes) > (date.min.year, 1):
+        mes_anterior = date(anio - 1, 12, 1) if mes == 1 else date(anio, mes - 1, 1)
+    if (anio, mes) < (date.max.year, 12):
+        mes_siguiente = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+
+    return render(request, "asistencia_mensual.html", {
+        "curso": curso,
+        "grilla": grilla,
+        "mes_actual": date(anio, mes, 1),
+        "fin_mes": date(anio, mes, calendar.monthrange(anio, mes)[1]),
+        "mes_anterior": mes_anterior.strftime("%Y-%m") if mes_anterior else None,
+        "mes_siguiente": mes_siguiente.strftime("%Y-%m") if mes_siguiente else None,
+    })
+
+
+# =========================================================
+# Exportación de asistencia (CSV / XLSX)
+# =========================================================
+MAX_DIAS_EXPORTACION = 366
+
+
+@login_required
+def exportar_asistencia(request):
+    """
+    ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&formato=csv|xlsx[&curso=ID]
+    Sin curso exporta todo el colegio (solo inspectoría / UTP).
+    """
+    desde = _parse_fecha(request.GET.get("desde"))
+    hasta = _parse_fecha(request.GET.get("hasta"))
+    formato = request.GET.get("formato", "csv")
+    curso_id = request.GET.get("curso")
+
+    curso = None
+    if curso_id:
+        curso = get_object_or_404(Curso, id=curso_id)
+    elif not es_inspectoria(request.user):
+        return HttpResponseForbidden("Solo inspectoría o UTP pueden exportar el colegio completo.")
+
+    if not desde or not hasta or desde > hasta:
+        return HttpResponse("Rango de fechas inválido.", status=400)
+    if (hasta - desde).days >= MAX_DIAS_EXPORTACION:
+        return HttpResponse(f"El rango no puede superar {MAX_DIAS_EXPORTACION} días.", status=400)
+    if formato not in ("csv", "xlsx"):
+        return HttpResponse("Formato no soportado.", status=400)
+
+    nombre = f"asistencia_{slugify(f'{curso.año} {curso.nombre}') if curso else 'colegio'}_{desde}_{hasta}"
+    filas = filas_asistencia(desde, hasta, curso)
+    if formato == "xlsx":
+        return respuesta_en_flujo(request, flujo_xlsx(filas), CONTENT_TYPE_XLSX, f"{nombre}.xlsx")
+    return respuesta_en_flujo(request, flujo_csv(filas), "text/csv; charset=utf-8", f"{nombre}.csv")
+
+
+# =========================================================
+# Sincronización de asistencia por lotes (JSON)
+# =========================================================
+@login_required
+@require_POST
+def asistencia_sincronizar(request):
+    """
+    Recibe un lote JSON (CSRF en el header X-CSRFToken):
+      {"token": "...", "registros": [{"curso": 1, "alumno": 5, "fecha": "2025-03-10", "estado": "Presente"}, ...]}
+    El token lo genera el cliente: reenviar el mismo lote no lo aplica dos veces.
+    """
+    try:
+        datos = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"error": "El cuerpo no es JSON válido."}, status=400)
+    if not isinstance(datos, dict):
+        return JsonResponse({"error": "Se esperaba un objeto JSON."}, status=400)
+
+    token = datos.get("token")
+    registros = datos.get("registros")
+    if not isinstance(token, str) or not 8 <= len(token) <= 64:
+        return JsonResponse({"error": "Token inválido (entre 8 y 64 caracteres)."}, status=400)
+    if not isinstance(registros, list):
+        return JsonResponse({"error": "'registros' debe ser una lista."}, status=400)
+    if len(registros) > MAX_REGISTROS_SINCRONIZACION:
+        return JsonResponse(
+            {"error": f"Máximo {MAX_REGISTROS_SINCRONIZACION} registros por lote."}, status=413
+        )
+
+    try:
+        # Con SQLite pasa por la misma cola de escritura que el formulario
+        respuesta, repetido = sincronizar_asistencia(request.user, token, registros)
+    except PermissionDenied as e:
+        return JsonResponse({"error": str(e)}, status=403)
+
+    return JsonResponse({**respuesta, "repetido": repetido})
+
+
+# =========================================================
+# Avance de asistencia del día (todos los cursos)
+# =========================================================
+def _avance_del_dia(request):
+    fecha = _parse_fecha(request.GET.get("fecha")) or timezone.localdate()
+    cursos = sorted(
+        avance_asistencia_cacheado(fecha), key=lambda c: (c["año"], _clave_grado(c["nombre"]))
+    )
+    conteo = Counter(c["estado"] for c in cursos)
+    return fecha, cursos, conteo
+
+
+@login_required
+@user_passes_test(es_inspectoria)
+def avance_asistencia(request):
+    fecha, cursos, conteo = _avance_del_dia(request)
+    return render(request, "avance_asistencia.html", {
+        "fecha": fecha,
+        "cursos": cursos,
+        "completos": conteo["completo"],
+        "parciales": conteo["parcial"],
+        "faltantes": conteo["faltante"],
+    })
+
+
+@login_required
+@user_passes_test(es_inspectoria)
+def avance_asistencia_json(request):
+    fecha, cursos, conteo = _avance_del_dia(request)
+    return JsonResponse({
+        "fecha": fecha.isoformat(),
+        "completos": conteo["completo"],
+        "parciales": conteo["parcial"],
+        "faltantes": conteo["faltante"],
+        "cursos": cursos,
+    })
+
+
+# =========================================================
+# Panel en vivo de inspectoría (Server-Sent Events)
+# =========================================================
+INTERVALO_PANEL = 2            # segundos entre consultas a la versión del día
+LATIDO_PANEL = 15              # comentario keep-alive para proxies
+DURACION_STREAM_PANEL = 300    # luego EventSource reconecta solo
+
+
+@login_required
+@user_passes_test(es_inspectoria)
+def panel_inspectoria(request):
+    return render(request, "panel_inspectoria.html", {"hoy": timezone.localdate()})
+
+
+async def _version_dia(fecha):
+    # 1 fila por índice único: es lo único que se consulta mientras nada cambia
+    return await (
+        VersionAsistenciaDia.objects.filter(fecha=fecha).values_list("version", flat=True).afirst()
+    ) or 0
+
+
+def _panel_cacheado(fecha, version):
+    # Todos los inspectores conectados comparten la misma foto por versión
+    return cache.get_or_set(
+        f"panel_ausencias:{fecha.isoformat()}:{version}",
+        lambda: panel_ausencias(fecha, version),
+        600,
+    )
+
+
+def _evento_panel(panel):
+    return f"id: {panel['version']}\nevent: panel\ndata: {json.dumps(panel)}\n\n"
+
+
+async def _eventos_panel(fecha):
+    yield f"retry: {INTERVALO_PANEL * 1000}\n\n"
+    enviada = None
+    inicio = ultimo_envio = time.monotonic()
+    while time.monotonic() - inicio < DURACION_STREAM_PANEL:
+        version = await _version_dia(fecha)
+        if version != enviada:
+            panel = await sync_to_async(_panel_cacheado)(fecha, version)
+            yield _evento_panel(panel)
+            enviada = version
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= LATIDO_PANEL:
+            yield ": latido\n\n"
+            ultimo_envio = time.monotonic()
+        await asyncio.sleep(INTERVALO_PANEL)
+
+
+@login_required
+@user_passes_test(es_inspectoria)
+async def panel_inspectoria_stream(request):
+    fecha = timezone.localdate()
+    if isinstance(request, ASGIRequest):
+        contenido = _eventos_panel(fecha)
+    else:
+        # Bajo WSGI un stream abierto ocuparía un worker completo:
+        # se envía una sola foto y el navegador vuelve a pedir en unos segundos
+        panel = await sync_to_async(_panel_cacheado)(fecha, await _version_dia(fecha))
+        contenido = [f"retry: {INTERVALO_PANEL * 5000}\n\n", _evento_panel(panel)]
+
+    respuesta = StreamingHttpResponse(contenido, content_type="text/event-stream")
+    respuesta["Cache-Control"] = "no-cache"
+    respuesta["X-Accel-Buffering"] = "no"
+    return respuesta
+
+
 # =========================================================
 # Notas (CON REGISTRO)
 # =========================================================
@@ -1065,12 +1145,49 @@ def seleccionar_asignatura(request, curso_id):
     context = {
         "curso": curso,
         "asignaturas": asignaturas,
+        "puede_ver_sabana": _puede_ver_sabana(request.user, curso),
     }
     return render(request, "seleccionar_asignatura.html", context)
 
 
 
+def _puede_editar_notas(user, curso, asignatura):
+    # Roles administrativos siempre pueden
+    es_admin_utp = user.role in ["utp", "admin"] or user.is_superuser
+
+    # Profesor Jefe del CURSO actual (acceso total al curso)
+    es_profe_jefe = (curso.profesor_jefe_id == user.id)
+
+    # Docente de la ASIGNATURA específica
+    es_profe_asignatura = (asignatura.profesor_id == user.id)
+
+    return es_admin_utp or es_profe_jefe or es_profe_asignatura
+
+
+def _puede_ver_sabana(user, curso):
+    # La sábana muestra todas las asignaturas: UTP/admin o profesor jefe del curso
+    es_admin_utp = getattr(user, "role", None) in ["utp", "admin"] or user.is_superuser
+    return es_admin_utp or curso.profesor_jefe_id == user.id
+
+
+@login_required
+def sabana_notas(request, curso_id):
+    """Sábana de notas: promedio de cada alumno en todas las asignaturas del curso."""
+    curso = get_object_or_404(Curso, id=curso_id)
+    if not _puede_ver_sabana(request.user, curso):
+        messages.error(request, "Acceso denegado: Solo UTP o el profesor jefe pueden ver la sábana de notas.")
+        return redirect("usuarios:notas", curso_id=curso.id)
+
+    sabana = sabana_curso(curso)
+    return render(request, "sabana_notas.html", {"curso": curso, **sabana})
+
+
+_etag_libro_notas, _modificado_libro_notas = huella_condicional(version_libro_notas)
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_libro_notas, last_modified_func=_modificado_libro_notas)
 def libro_notas(request, curso_id, asignatura_id):
     # ===========================
     # 1. Carga de Datos Base
@@ -1080,23 +1197,12 @@ def libro_notas(request, curso_id, asignatura_id):
     
     # Optimizacion: Traer alumnos ordenados
     alumnos = Alumno.objects.filter(curso=curso).order_by("apellidos", "nombres")
-    columnas_notas = range(1, 11) # 10 notas máximo según estándar AulaClass
 
     # ===========================
     # 2. Lógica de Permisos (AulaClass Core)
     # ===========================
     user = request.user
-    
-    # Roles administrativos siempre pueden
-    es_admin_utp = user.role in ["utp", "admin"] or user.is_superuser
-    
-    # Profesor Jefe del CURSO actual (acceso total al curso)
-    es_profe_jefe = (curso.profesor_jefe_id == user.id)
-    
-    # Docente de la ASIGNATURA específica
-    es_profe_asignatura = (asignatura.profesor_id == user.id)
-
-    puede_editar = es_admin_utp or es_profe_jefe or es_profe_asignatura
+    puede_editar = _puede_editar_notas(user, curso, asignatura)
 
     # ===========================
     # 3. Procesamiento POST (Guardado)
@@ -1106,52 +1212,14 @@ def libro_notas(request, curso_id, asignatura_id):
             messages.error(request, "Acceso denegado: No tienes permisos para editar este libro de clases.")
             return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
 
-        cambios_contador = 0
-        detalle_cambios = []
-
-        # Iteramos sobre los datos POST para no hacer loops innecesarios sobre objetos
-        for key, value in request.POST.items():
-            if not key.startswith("nota_"):
-                continue
-            
-            # key formato: nota_{alumno_id}_{numero_nota}
-            parts = key.split("_")
-            if len(parts) != 3: continue
-            
-            alumno_id, num_nota = parts[1], parts[2]
-            raw_val = value.strip().replace(',', '.')
-
-            if not raw_val: 
-                continue # Si viene vacío, lo ignoramos 
-
-            try:
-                val_float = float(raw_val)
-            except ValueError:
-                continue # Valor no numérico ignorado
-
-            # Regla de negocio: Notas entre 1.0 y 7.0
-            if not (1.0 <= val_float <= 7.0):
-                continue
-            
-            val_final = round(val_float, 1)
-
-            # Update or Create optimizado
-            nota_obj, created = Nota.objects.update_or_create(
-                alumno_id=alumno_id,
-                asignatura=asignatura,
-                numero=int(num_nota),
-                defaults={
-                    'valor': val_final,
-                    'profesor': user, # Registramos quién hizo el cambio real
-                    'evaluacion': f"Evaluación {num_nota}"
-                }
-            )
-
-            # Solo contamos si realmente fue una operación de escritura
-            # (Django update_or_create siempre retorna objeto, asumimos cambio para log simple)
-            cambios_contador += 1
-            accion = "Creada" if created else "Actualizada"
-            detalle_cambios.append(f"{accion} nota {num_nota} para Alumno ID {alumno_id}: {val_final}")
+        # Solo alumnos del curso y columnas del libro; se guarda por diferencias
+        celdas = leer_celdas_libro(
+            request.POST,
+            alumnos.values_list("id", flat=True),
+            asignatura.evaluaciones.values_list("id", flat=True),
+        )
+        resultado = guardar_libro_notas(asignatura, celdas, user)
+        cambios_contador = resultado["creadas"] + resultado["actualizadas"]
 
         # ===========================
         # 4. Auditoría (LogEntry)
@@ -1163,9 +1231,16 @@ def libro_notas(request, curso_id, asignatura_id):
                 object_id=asignatura.id, # Linkeamos al ID de asignatura por referencia
                 object_repr=f"Notas {curso.nombre} - {asignatura.nombre}",
                 action_flag=CHANGE,
-                change_message=f"Edición masiva: {cambios_contador} notas modificadas."
+                change_message=(
+                    f"Edición masiva: {cambios_contador} notas modificadas "
+                    f"({resultado['creadas']} nuevas, {resultado['actualizadas']} actualizadas)."
+                )
+            )
+            messages.success(
+                request,
+                f"Se guardaron exitosamente {cambios_contador} notas "
+                f"({resultado['creadas']} nuevas, {resultado['actualizadas']} actualizadas)."
             )
-            messages.success(request, f"Se guardaron exitosamente {cambios_contador} notas.")
         else:
             messages.info(request, "No se detectaron cambios válidos para guardar.")
 
@@ -1175,43 +1250,33 @@ def libro_notas(request, curso_id, asignatura_id):
     # 5. Preparación de Datos para Render (GET)
     # ===========================
     
-    # Optimizacion DB: Traer todas las notas de este curso/asignatura en UNA sola query
-    notas_qs = Nota.objects.filter(
-        alumno__curso=curso, 
-        asignatura=asignatura
-    ).values('alumno_id', 'numero', 'valor')
-
-    # Crear mapa de acceso rápido: {(alumno_id, numero): valor}
-    notas_map = {(n['alumno_id'], n['numero']): n['valor'] for n in notas_qs}
+    # Optimizacion DB: matriz alumnos × evaluaciones en UNA sola query,
+    # con la versión de cada celda para el autoguardado (concurrencia optimista)
+    matriz = MatrizNotas.de_curso(curso, [asignatura], con_versiones=True)
+    evaluaciones = matriz.evaluaciones[0] # Columnas del libro, en orden de número
+    # Promedios materializados: 1 lectura indexada por asignatura
+    promedios = promedios_guardados(asignatura_ids=[asignatura.id])
 
     lista_alumnos = []
     
-    for alumno in alumnos:
-        notas_alumno = []
-        suma = 0
-        cantidad = 0
-        
-        for i in columnas_notas:
-            # Acceso O(1) al diccionario
-            val = notas_map.get((alumno.id, i))
-            notas_alumno.append(val) # Puede ser None o float
-            if val is not None:
-                suma += val
-                cantidad += 1
-        
-        promedio = round(suma / cantidad, 1) if cantidad > 0 else None
-        
+    for i, alumno in enumerate(matriz.alumnos):
         lista_alumnos.append({
             'obj': alumno,
-            'notas': notas_alumno, # Lista ordenada index 0 -> Nota 1
-            'promedio': promedio
+            # Una celda por evaluación: (evaluacion, valor | None, versión)
+            'celdas': [
+                {'evaluacion': ev, 'valor': valor, 'version': matriz.versiones.get((alumno.id, ev.id), '')}
+                for ev, valor in zip(evaluaciones, matriz.notas(i, 0))
+            ],
+            'promedio': a_valor(promedios.get((alumno.id, asignatura.id)))
         })
 
     context = {
         "curso": curso,
         "asignatura": asignatura,
         "lista_alumnos": lista_alumnos, # Estructura ya procesada
-        "columnas_notas": columnas_notas,
+        "evaluaciones": evaluaciones,
+        "evaluacion_form": EvaluacionForm() if puede_editar else None,
+        "importar_form": ImportarNotasForm() if puede_editar else None,
         "puede_editar": puede_editar,
         "rango_colores": {"bajo": 4.0, "alto": 7.0} # Para uso en CSS/JS si se requiere
     }
@@ -1219,6 +1284,207 @@ def libro_notas(request, curso_id, asignatura_id):
     return render(request, "notas.html", context)
 
 
+@login_required
+@require_http_methods(["PATCH"])
+def autoguardar_notas(request, curso_id, asignatura_id):
+    """
+    Autoguardado de celdas del libro de notas (JSON, CSRF en X-CSRFToken):
+      {"celdas": [{"alumno": 5, "evaluacion": 12, "valor": "6.5", "version": "<ultima_actualizacion> | null"}]}
+    200: celdas guardadas con su nueva versión y el promedio de cada alumno tocado.
+    409: alguna celda cambió desde que se leyó (otra pestaña u otro docente); no se escribe nada.
+    """
+    curso = get_object_or_404(Curso, id=curso_id)
+    asignatura = get_object_or_404(Asignatura, id=asignatura_id, curso=curso)
+    if not _puede_editar_notas(request.user, curso, asignatura):
+        return JsonResponse({"error": "No tienes permisos para editar este libro de clases."}, status=403)
+
+    try:
+        celdas = json.loads(request.body).get("celdas")
+    except (ValueError, UnicodeDecodeError, AttributeError):
+        return JsonResponse({"error": "El cuerpo no es JSON válido."}, status=400)
+    if not isinstance(celdas, list) or not 0 < len(celdas) <= MAX_CELDAS_AUTOGUARDADO:
+        return JsonResponse(
+            {"error": f"'celdas' debe ser una lista de 1 a {MAX_CELDAS_AUTOGUARDADO} elementos."}, status=400
+        )
+
+    alumno_ids = set(Alumno.objects.filter(curso=curso).values_list("id", flat=True))
+    evaluacion_ids = set(asignatura.evaluaciones.values_list("id", flat=True))
+    cambios = []
+    for indice, celda in enumerate(celdas):
+        try:
+            alumno_id, evaluacion_id = int(celda["alumno"]), int(celda["evaluacion"])
+            decimas = Nota.a_decimas(str(celda["valor"]).strip().replace(",", "."))
+            version = celda.get("version")
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+            return JsonResponse({"error": "Celda con formato inválido.", "indice": indice}, status=400)
+        if alumno_id not in alumno_ids or evaluacion_id not in evaluacion_ids:
+            return JsonResponse({"error": "La celda no pertenece a este libro.", "indice": indice}, status=400)
+        if not (Nota.DECIMAS_MINIMA <= decimas <= Nota.DECIMAS_MAXIMA) or not (version is None or isinstance(version, str)):
+            return JsonResponse({"error": "Nota fuera de rango (1.0 a 7.0).", "indice": indice}, status=400)
+        cambios.append((alumno_id, evaluacion_id, decimas, version))
+
+    try:
+        guardadas, escritas = guardar_celdas_notas(asignatura, cambios, request.user)
+    except ConflictoNotas as e:
+        return JsonResponse({"error": str(e), "conflictos": e.conflictos}, status=409)
+
+    if escritas:
+        LogEntry.objects.log_action(
+            user_id=request.user.id,
+            content_type_id=ContentType.objects.get_for_model(Nota).pk,
+            object_id=asignatura.id,
+            object_repr=f"Notas {curso.nombre} - {asignatura.nombre}",
+            action_flag=CHANGE,
+            change_message=f"Autoguardado: {escritas} notas modificadas."
+        )
+
+    promedios = promedios_alumnos(asignatura, {alumno_id for alumno_id, _ in guardadas})
+    return JsonResponse({
+        "celdas": [
+            {"alumno": alumno_id, "evaluacion": evaluacion_id, "valor": nota.valor, "version": version_nota(nota)}
+            for (alumno_id, evaluacion_id), nota in sorted(guardadas.items())
+        ],
+        "promedios": {str(alumno_id): promedio for alumno_id, promedio in promedios.items()},
+    })
+
+
+@login_required
+@require_POST
+def agregar_evaluacion(request, curso_id, asignatura_id):
+    """Agrega una columna (evaluación) al final del libro de notas."""
+    curso = get_object_or_404(Curso, id=curso_id)
+    asignatura = get_object_or_404(Asignatura, id=asignatura_id, curso=curso)
+    if not _puede_editar_notas(request.user, curso, asignatura):
+        messages.error(request, "Acceso denegado: No tienes permisos para editar este libro de clases.")
+        return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+
+    form = EvaluacionForm(request.POST)
+    if form.is_valid():
+        evaluacion = crear_evaluacion(asignatura, **form.cleaned_data)
+        registrar_accion(
+            request.user, evaluacion, ADDITION,
+            f"Evaluación N{evaluacion.numero} '{evaluacion.nombre}' agregada a {asignatura.nombre}."
+        )
+        messages.success(request, f"Evaluación N{evaluacion.numero} agregada.")
+    else:
+        errores = "; ".join(e for lista in form.errors.values() for e in lista)
+        messages.error(request, f"No se pudo agregar la evaluación: {errores}")
+    return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+
+def _clave_importacion(asignatura):
+    return f"importacion_notas_{asignatura.id}"
+
+
+def _contexto_importacion(curso, asignatura, pendiente):
+    """Filas legibles de la vista previa guardada en la sesión."""
+    alumnos = Alumno.objects.filter(curso=curso).in_bulk()
+    evaluaciones = asignatura.evaluaciones.in_bulk()
+    filas = [
+        {
+            "alumno": alumnos.get(alumno_id),
+            "evaluacion": evaluaciones.get(evaluacion_id),
+            "anterior": a_valor(anterior),
+            "nueva": a_valor(nueva),
+        }
+        for alumno_id, evaluacion_id, anterior, nueva in pendiente["cambios"]
+        if alumno_id in alumnos and evaluacion_id in evaluaciones
+    ]
+    filas.sort(key=lambda f: (f["alumno"].apellidos, f["alumno"].nombres, f["evaluacion"].numero))
+    nuevas = sum(1 for f in filas if f["anterior"] is None)
+    return {
+        "curso": curso,
+        "asignatura": asignatura,
+        "archivo": pendiente["archivo"],
+        "filas": filas,
+        "nuevas": nuevas,
+        "modificadas": len(filas) - nuevas,
+        "sin_cambios": pendiente["sin_cambios"],
+    }
+
+
+@login_required
+def importar_notas(request, curso_id, asignatura_id):
+    """
+    Importación de notas desde CSV/XLSX en dos pasos:
+      1. POST con el archivo: se valida completo y se muestra la vista previa
+         (los cambios quedan en la sesión; no se escribe nada).
+      2. POST accion=confirmar: un solo upsert masivo y un registro de auditoría.
+    """
+    curso = get_object_or_404(Curso, id=curso_id)
+    asignatura = get_object_or_404(Asignatura, id=asignatura_id, curso=curso)
+    if not _puede_editar_notas(request.user, curso, asignatura):
+        messages.error(request, "Acceso denegado: No tienes permisos para editar este libro de clases.")
+        return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+
+    clave = _clave_importacion(asignatura)
+    pendiente = request.session.get(clave)
+    accion = request.POST.get("accion")
+
+    if request.method == "POST" and accion == "cancelar":
+        request.session.pop(clave, None)
+        messages.info(request, "Importación cancelada.")
+        return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+
+    if request.method == "POST" and accion == "confirmar":
+        if not pendiente:
+            messages.error(request, "No hay una importación pendiente. Vuelve a subir la planilla.")
+            return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+        request.session.pop(clave, None)
+        try:
+            escritas = aplicar_importacion(asignatura, pendiente["cambios"], request.user)
+        except ConflictoNotas as e:
+            messages.error(
+                request,
+                f"{e} {len(e.conflictos)} nota(s) cambiaron desde la vista previa; vuelve a subir la planilla."
+            )
+            return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+
+        contexto = _contexto_importacion(curso, asignatura, pendiente)
+        if escritas:
+            LogEntry.objects.log_action(
+                user_id=request.user.id,
+                content_type_id=ContentType.objects.get_for_model(Nota).pk,
+                object_id=asignatura.id,
+                object_repr=f"Notas {curso.nombre} - {asignatura.nombre}",
+                action_flag=CHANGE,
+                change_message=(
+                    f"Importación '{pendiente['archivo']}': {contexto['nuevas']} notas nuevas, "
+                    f"{contexto['modificadas']} modificadas."
+                )
+            )
+        messages.success(request, f"Importación aplicada: {escritas} notas guardadas.")
+        return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+
+    if request.method == "POST":
+        form = ImportarNotasForm(request.POST, request.FILES)
+        archivo = request.FILES.get("archivo")
+        if not form.is_valid():
+            # Extensión o tamaño no válidos: se muestran en la página, no con messages
+            errores = [f"No se pudo leer la planilla: {e}" for lista in form.errors.values() for e in lista]
+        else:
+            archivo = form.cleaned_data["archivo"]
+            try:
+                filas = leer_planilla(archivo.name, archivo.read())
+            except ErrorImportacion as e:
+                errores = [f"No se pudo leer la planilla: {e}"]
+            else:
+                celdas, errores = validar_planilla(
+                    filas, Alumno.objects.filter(curso=curso).only("id", "rut"), asignatura.evaluaciones.all()
+                )
+        if errores:
+            request.session.pop(clave, None)
+            return render(request, "importar_notas.html", {
+                "curso": curso, "asignatura": asignatura,
+                "archivo": archivo.name if archivo else "", "errores": errores,
+            })
+
+        pendiente = {"archivo": archivo.name, **comparar_importacion(asignatura, celdas)}
+        request.session[clave] = pendiente
+
+    if not pendiente:
+        return redirect("usuarios:libro_notas", curso_id=curso.id, asignatura_id=asignatura.id)
+    return render(request, "importar_notas.html", _contexto_importacion(curso, asignatura, pendiente))
+
 # =========================================================
 # Anotaciones (CON REGISTRO)
 # =========================================================
@@ -1242,28 +1508,31 @@ def anotaciones_curso(request, curso_id):
     alumnos = Alumno.objects.filter(curso=curso).order_by('apellidos', 'nombres')
     return render(request, 'anotaciones_lista.html', {'curso': curso, 'alumnos': alumnos})
 
+_etag_anotaciones_alumno, _modificado_anotaciones_alumno = huella_condicional(version_anotaciones_alumno)
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_anotaciones_alumno, last_modified_func=_modificado_anotaciones_alumno)
 def anotaciones_alumno(request, alumno_id):
     alumno = get_object_or_404(Alumno, id=alumno_id)
     curso = alumno.curso
 
-    # Importaciones optimizadas: Q permite condiciones dentro de Count
-    from django.db.models import Avg, Count, Min, Max, Q
-
     # ======================================
     # 1. PROMEDIOS POR ASIGNATURA
     # ======================================
-    qs_prom = (
-        Nota.objects.filter(alumno=alumno)
-        .values("asignatura__nombre", "asignatura_id")
-        .annotate(promedio=Avg("valor"))
+    # Promedios materializados (PromedioAlumnoAsignatura): 1 lectura indexada,
+    # se recorre dos veces (lista y promedio general)
+    qs_prom = list(
+        PromedioAlumnoAsignatura.objects.filter(alumno=alumno, cantidad__gt=0)
+        .select_related("asignatura")
         .order_by("asignatura__nombre")
     )
 
     promedios_asignaturas = [
         {
-            "asignatura__nombre": item["asignatura__nombre"],
-            "promedio": redondear_personalizado(item["promedio"]),
+            "asignatura__nombre": item.asignatura.nombre,
+            "promedio": item.promedio,
         }
         for item in qs_prom
     ]
@@ -1271,51 +1540,28 @@ def anotaciones_alumno(request, alumno_id):
     # ======================================
     # 2. PROMEDIO GENERAL
     # ======================================
-    proms = [p["promedio"] for p in promedios_asignaturas if p["promedio"] is not None]
-
-    if proms:
-        promedio_general_val = sum(proms) / len(proms)
-        promedio = redondear_personalizado(promedio_general_val)
-    else:
-        promedio = 0.0
+    promedio = a_valor(promedio_de_promedios(item.decimas for item in qs_prom)) or 0.0
 
     # ======================================
     # 3. ASISTENCIA (CORREGIDA - SOLUCIÓN BUG 0.6%)
     # ======================================
     
-    # 1. Filtramos PRIMERO para asegurar que el denominador solo tenga datos válidos.
-    # Esto elimina registros vacíos o corruptos que inflaban el total.
-    estados_validos = ['Presente', 'Ausente', 'Justificado', 'Atraso']
-    qs_asistencia = Asistencia.objects.filter(alumno=alumno, estado__in=estados_validos)
-    
-    # 2. Usamos aggregate con FILTER (más rápido y exacto que diccionarios Python)
-    stats = qs_asistencia.aggregate(
-        total_registros=Count('id'),
-        # Presente incluye "Presente" y "Atraso" (Criterio MINEDUC Chile estándar)
-        total_presentes=Count('id', filter=Q(estado__iexact='Presente') | Q(estado__iexact='Atraso')),
-        total_ausentes=Count('id', filter=Q(estado__iexact='Ausente')),
-        total_justificados=Count('id', filter=Q(estado__iexact='Justificado')),
-        inicio=Min('fecha'),
-        fin=Max('fecha')
-    )
-    
-    # Extracción segura de valores (si es None, pasa a 0)
-    total_registros = stats['total_registros'] or 0
-    pres = stats['total_presentes'] or 0
-    aus = stats['total_ausentes'] or 0
-    jus = stats['total_justificados'] or 0
-    
+    # Contadores desnormalizados (ResumenAsistencia): lectura O(1), sin recorrer Asistencia
+    stats = totales_asistencia(alumno)
+
+    pres = stats['presentes']
+    aus = stats['ausentes']
+    jus = stats['justificados']
+    porcentaje_asistencia = stats['porcentaje']
+
     inicio_asistencia = stats['inicio']
     fin_asistencia = stats['fin']
 
-    # 3. Cálculo Matemático Seguro
-    if total_registros > 0:
-        porcentaje_asistencia = round((pres / total_registros) * 100, 1)
-    else:
-        porcentaje_asistencia = 0.0
-    
     # Total visual para la tarjeta
-    total_dias = total_registros
+    total_dias = stats['total']
+
+    # Desglose mensual desde la tabla compacta (sin recorrer registros diarios)
+    asistencia_por_mes = resumen_asistencia_compacta(alumno.id)["meses"]
 
     # ======================================
     # 4. ANOTACIONES
@@ -1359,6 +1605,7 @@ def anotaciones_alumno(request, alumno_id):
             "aus": aus,
             "jus": jus,
             "total_dias": total_dias,
+            "asistencia_por_mes": asistencia_por_mes,
             
             # Rangos
             "inicio_asistencia": inicio_asistencia,
@@ -1446,72 +1693,21 @@ def historial_acciones_admin(request):
     """
     Historial con Paginación, Filtros Limpios y PDF.
     """
-    import io
     from django.core.paginator import Paginator
-    from django.utils import timezone
-    from reportlab.lib.pagesizes import landscape, A4
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import mm
-
-    # 1. Consulta Base
-    logs = LogEntry.objects.select_related("user", "content_type").order_by("-action_time")
 
-    # 2. Filtros
+    # 1. Consulta Base + 2. Filtros
     accion = request.GET.get("accion")
     usuario_id = request.GET.get("usuario")
     modelo = request.GET.get("modelo")
-
-    if accion: logs = logs.filter(action_flag=int(accion))
-    if usuario_id: logs = logs.filter(user_id=usuario_id)
-    if modelo: logs = logs.filter(content_type__model=modelo.lower())
+    logs = historial_filtrado(accion, usuario_id, modelo)
 
     # 3. Exportación PDF (Antes de paginar, para exportar TODO lo filtrado)
     if "pdf" in request.GET:
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(
-            buffer, pagesize=landscape(A4),
-            leftMargin=15*mm, rightMargin=15*mm, topMargin=15*mm, bottomMargin=15*mm,
-            title="Historial_AulaClass"
-        )
-        styles = getSampleStyleSheet()
-        style_normal = ParagraphStyle("normal", fontSize=8, leading=10)
-        style_header = ParagraphStyle("header", parent=styles['Heading2'], alignment=1)
-
-        story = [Paragraph("Historial de Acciones - AulaClass", style_header), Spacer(1, 10)]
-        
-        data = [["Fecha", "Usuario", "Acción", "Modelo", "Objeto", "Detalle"]]
-        for log in logs:
-            if log.action_flag == 1: act = "<font color='#166534'><b>Creación</b></font>"
-            elif log.action_flag == 2: act = "<font color='#1e40af'><b>Edición</b></font>"
-            elif log.action_flag == 3: act = "<font color='#991b1b'><b>Eliminación</b></font>"
-            else: act = "Otro"
-            
-            detalle = (log.change_message or "-").replace("\n", "<br/>")
-            data.append([
-                Paragraph(log.action_time.strftime("%d/%m/%Y %H:%M"), style_normal),
-                Paragraph(log.user.get_full_name() or log.user.username, style_normal),
-                Paragraph(act, style_normal),
-                Paragraph(log.content_type.model.capitalize(), style_normal),
-                Paragraph(log.object_repr, style_normal),
-                Paragraph(f"<font color='#4b5563'>{detalle}</font>", style_normal),
-            ])
-
-        t = Table(data, repeatRows=1, colWidths=[28*mm, 35*mm, 22*mm, 25*mm, 50*mm, 105*mm])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#f3f4f6")),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e5e7eb")),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0,0), (-1,0), 9),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('PADDING', (0,0), (-1,-1), 4),
-        ]))
-        story.append(t)
-        doc.build(story)
-        response = HttpResponse(buffer.getvalue(), content_type="application/pdf")
+        if tareas_asincronas():
+            tarea = encolar("historial_pdf", request.user, accion=accion, usuario_id=usuario_id, modelo=modelo)
+            return redirect("usuarios:tarea_estado", tarea_id=tarea.id)
+        response = HttpResponse(generar_historial_pdf(filas_historial(logs)), content_type="application/pdf")
         response["Content-Disposition"] = 'attachment; filename="Historial_AulaClass.pdf"'
-        buffer.close()
         return response
 
     # 4. PAGINACIÓN (50 registros por página)
@@ -1539,6 +1735,54 @@ def historial_acciones_admin(request):
 
 
 
+# =========================================================
+# Tareas en segundo plano (estado y descarga)
+# =========================================================
+def _tarea_visible(request, tarea_id):
+    tarea = get_object_or_404(Tarea, id=tarea_id)
+    if tarea.usuario_id != request.user.id and not es_utp(request.user):
+        raise PermissionDenied
+    return tarea
+
+
+@login_required
+def tarea_estado(request, tarea_id):
+    """Página que consulta el estado de la tarea y descarga el resultado al terminar."""
+    tarea = _tarea_visible(request, tarea_id)
+    return render(request, "tarea_estado.html", {"tarea": tarea})
+
+
+@login_required
+def tarea_estado_json(request, tarea_id):
+    tarea = _tarea_visible(request, tarea_id)
+    return JsonResponse({
+        "estado": tarea.estado,
+        "estado_display": tarea.get_estado_display(),
+        "progreso": tarea.progreso,
+        "mensaje": tarea.mensaje,
+        "error": tarea.error if tarea.estado == Tarea.FALLIDA else "",
+        "intentos": tarea.intentos,
+        "terminal": tarea.terminal,
+        "descarga": (
+            reverse("usuarios:tarea_descargar", args=[tarea.id])
+            if tarea.estado == Tarea.COMPLETADA and tarea.archivo else None
+        ),
+    })
+
+
+@login_required
+def tarea_descargar(request, tarea_id):
+    tarea = _tarea_visible(request, tarea_id)
+    if tarea.estado != Tarea.COMPLETADA or not tarea.archivo:
+        return redirect("usuarios:tarea_estado", tarea_id=tarea.id)
+    try:
+        archivo = open(ruta_resultado(tarea), "rb")
+    except FileNotFoundError:
+        messages.error(request, "El archivo de esta tarea ya no está disponible.")
+        return redirect("usuarios:tarea_estado", tarea_id=tarea.id)
+    return FileResponse(archivo, as_attachment=True, filename=tarea.nombre_archivo)
+
+
 @user_passes_test(es_utp)
 def eliminar_log(request, log_id):
     """Elimina un registro específico del historial."""